@@ -6,7 +6,7 @@ import logging
 import os
 from os.path import abspath
 from sys import exit
-from typing import List
+from typing import List, Optional
 
 import prometheus_client
 from mysql.connector import connect, MySQLConnection
@@ -14,6 +14,9 @@ from prometheus_client import Info
 
 from covidbot.bot import Bot
 from covidbot.covid_data import CovidData, Visualization
+from covidbot.covid_data.timeseries import TimeSeriesStore
+from covidbot.covid_data.updater.archive import SourceArchive
+from covidbot.database import ConnectionPool, PooledConnection
 from covidbot.interfaces.messenger_interface import MessengerInterface
 from covidbot.metrics import USER_COUNT, AVERAGE_SUBSCRIPTION_COUNT, MonitorMetrics
 from covidbot.user_manager import UserManager
@@ -27,18 +30,50 @@ def parse_config(config_file: str):
     return cfg
 
 
+def get_connection_args(cfg, autocommit=False) -> dict:
+    return dict(database=cfg['DATABASE'].get('DATABASE'),
+                user=cfg['DATABASE'].get('USER'),
+                password=cfg['DATABASE'].get('PASSWORD'),
+                port=cfg['DATABASE'].get('PORT'),
+                host=cfg['DATABASE'].get('HOST', 'localhost'),
+                autocommit=autocommit)
+
+
 def get_connection(cfg, autocommit=False) -> MySQLConnection:
-    connection = connect(database=cfg['DATABASE'].get('DATABASE'),
-                         user=cfg['DATABASE'].get('USER'),
-                         password=cfg['DATABASE'].get('PASSWORD'),
-                         port=cfg['DATABASE'].get('PORT'),
-                         host=cfg['DATABASE'].get('HOST', 'localhost'),
-                         autocommit=autocommit)
+    connection = connect(**get_connection_args(cfg, autocommit=autocommit))
     return connection
 
 
+def get_connection_pool(cfg, autocommit=False) -> ConnectionPool:
+    return ConnectionPool(lambda: get_connection(cfg, autocommit=autocommit),
+                          size=cfg['DATABASE'].getint('POOL_SIZE', fallback=5),
+                          autocommit=autocommit)
+
+
+def get_timeseries_store(cfg) -> Optional[TimeSeriesStore]:
+    directory = cfg['GENERAL'].get('TIMESERIES_DIR')
+    if not directory:
+        return None
+    return TimeSeriesStore(directory)
+
+
+def get_graph_cache_bytes(cfg) -> Optional[int]:
+    size = cfg['GENERAL'].getint('GRAPH_CACHE_MB')
+    if size is None:
+        return None
+    return size * 1024 * 1024
+
+
+def get_source_archive(cfg) -> Optional[SourceArchive]:
+    directory = cfg['GENERAL'].get('ARCHIVE_DIR')
+    if not directory:
+        return None
+    return SourceArchive(directory)
+
+
+
 class MessengerBotSetup:
-    connections: List[MySQLConnection] = []
+    pool: Optional[ConnectionPool] = None
     name: str
     config: configparser.ConfigParser
 
@@ -90,25 +125,23 @@ class MessengerBotSetup:
         else:
             command_format = lambda command: f'"{command}"'
 
-        # Setup CovidData, Bot and UserManager
-        data_conn = get_connection(self.config, autocommit=True)
-        user_conn = get_connection(self.config, autocommit=True)
-        monitor_conn = get_connection(self.config, autocommit=True)
-
-        self.connections.append(data_conn)
-        self.connections.append(user_conn)
-        self.connections.append(monitor_conn)
-
-        data = CovidData(data_conn)
-        visualization = Visualization(data_conn,
-                                      self.config['GENERAL'].get('CACHE_DIR', 'graphics'))
-        user_manager = UserManager(self.name, user_conn,
+        # Setup CovidData, Bot and UserManager, sharing a connection pool
+        self.pool = get_connection_pool(self.config, autocommit=True)
+        connection = PooledConnection(self.pool)
+
+        cache_dir = self.config['GENERAL'].get('CACHE_DIR', 'graphics')
+        data = CovidData(connection, cache_dir=cache_dir)
+        visualization = Visualization(connection, cache_dir, timeseries=get_timeseries_store(self.config),
+                                      cache_bytes=get_graph_cache_bytes(self.config),
+                                      memory_bytes=self.config['GENERAL'].getint('GRAPH_MEMORY_CACHE_MB',
+                                                                                 fallback=32) * 1024 * 1024)
+        user_manager = UserManager(self.name, connection,
                                    activated_default=users_activated)
         bot = Bot(user_manager, data, visualization, command_formatter=command_format,
                   has_location_feature=location_feature)
 
         # Setup database monitoring
-        monitor_data = MonitorMetrics(monitor_conn)
+        monitor_data = MonitorMetrics(connection)
         AVERAGE_SUBSCRIPTION_COUNT.set_function(monitor_data.get_average_subscriptions)
 
         USER_COUNT.labels(platform="threema").set_function(
@@ -242,8 +275,8 @@ class MessengerBotSetup:
                                                                                  fallback=False))
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        for db_conn in self.connections:
-            db_conn.close()
+        if self.pool:
+            self.pool.close()
 
 
 async def sendUpdates(messenger_iface: str, config: configparser):
@@ -316,6 +349,12 @@ def main():
                         action='store_true')
     parser.add_argument('--archive-update', help='Fetch all covid data',
                         action='store_true')
+    parser.add_argument('--reingest',
+                        help='Ingest archived payloads of data sources again, e.g. after corrections',
+                        metavar='CONTENT_HASH', action='store', nargs="+", type=str)
+    parser.add_argument('--rebuild-facts',
+                        help='Recalculate derived data such as district facts, e.g. after corrections',
+                        action='store_true')
     parser.add_argument('--daily-report',
                         help='Send daily reports if available, requires --platform',
                         action='store_true')
@@ -346,7 +385,8 @@ def main():
         logging_level = logging.INFO
 
     if not args.platform and not (
-            args.check_updates or args.message_user or args.graphic_test or args.archive_update):
+            args.check_updates or args.message_user or args.graphic_test or args.archive_update
+            or args.rebuild_facts or args.reingest):
         print("Exactly one platform has to be set, e.g. --platform telegram")
         exit(1)
 
@@ -381,35 +421,63 @@ def main():
         logging.getLogger().addHandler(stream_handler)
 
         logging.info("### Start Data Update ###")
-        with get_connection(config, autocommit=False) as conn:
-            from covidbot.covid_data import CovidData, VaccinationGermanyUpdater, \
-                RValueGermanyUpdater, \
-                RKIKeyDataUpdater, ICUGermanyUpdater, \
-                RulesGermanyUpdater, ICUGermanyHistoryUpdater, HospitalisationRKIUpdater
-            for updater in [RKIKeyDataUpdater(conn), ICUGermanyHistoryUpdater(conn),
-                            VaccinationGermanyUpdater(conn), RulesGermanyUpdater(conn),
-                            RValueGermanyUpdater(conn), ICUGermanyUpdater(conn),
-                            HospitalisationRKIUpdater(conn)]:
-                try:
-                    if updater.update():
-                        logging.warning(f"Got new data from {updater.__class__.__name__}")
-                        with MessengerBotSetup("telegram", config, setup_logs=False,
-                                               monitoring=False) as telegram:
-                            asyncio.run(
-                                telegram.send_message_to_users(
-                                    f"Got new data from {updater.__class__.__name__}",
-                                    [config["TELEGRAM"].get("DEV_CHAT")]))
-                except Exception as error:
-                    # Data did not make it through plausibility check
-                    logging.exception(
-                        f"Exception happened on Data Update with {updater.__class__.__name__}: {error}",
-                        exc_info=error)
-                    with MessengerBotSetup("telegram", config, setup_logs=False,
-                                           monitoring=False) as telegram:
-                        asyncio.run(telegram.send_message_to_users(
-                            f"Exception happened on Data Update with "
-                            f"{updater.__class__.__name__}: {error}",
+        from covidbot.covid_data import VaccinationGermanyUpdater, RValueGermanyUpdater, RKIKeyDataUpdater, \
+            ICUGermanyUpdater, RulesGermanyUpdater, ICUGermanyHistoryUpdater, HospitalisationRKIUpdater
+        from covidbot.covid_data.updater.runner import UpdaterRunner
+        from covidbot.covid_data.updater.updater import Updater
+
+        Updater.archive = get_source_archive(config)
+
+        runner = UpdaterRunner(lambda: get_connection(config, autocommit=False),
+                               [RKIKeyDataUpdater, ICUGermanyHistoryUpdater, VaccinationGermanyUpdater,
+                                RulesGermanyUpdater, RValueGermanyUpdater, ICUGermanyUpdater,
+                                HospitalisationRKIUpdater])
+        results = runner.run()
+        for result in results:
+            if result.updated:
+                logging.warning(f"Got new data from {result.name} after {result.duration:.1f}s")
+                with MessengerBotSetup("telegram", config, setup_logs=False,
+                                       monitoring=False) as telegram:
+                    asyncio.run(
+                        telegram.send_message_to_users(
+                            f"Got new data from {result.name}",
                             [config["TELEGRAM"].get("DEV_CHAT")]))
+            elif result.error:
+                # Data did not make it through plausibility check
+                with MessengerBotSetup("telegram", config, setup_logs=False,
+                                       monitoring=False) as telegram:
+                    asyncio.run(telegram.send_message_to_users(
+                        f"Exception happened on Data Update with "
+                        f"{result.name}: {result.error}",
+                        [config["TELEGRAM"].get("DEV_CHAT")]))
+            elif result.skipped:
+                with MessengerBotSetup("telegram", config, setup_logs=False,
+                                       monitoring=False) as telegram:
+                    asyncio.run(telegram.send_message_to_users(
+                        f"Skipped Data Update with {result.name}, "
+                        f"{result.failed_dependency} failed",
+                        [config["TELEGRAM"].get("DEV_CHAT")]))
+
+        timeseries = get_timeseries_store(config)
+        if timeseries and any(result.updated for result in results):
+            try:
+                with get_connection(config, autocommit=False) as conn:
+                    timeseries.rebuild(conn)
+            except Exception as error:
+                logging.exception(f"Exception happened on rebuilding the time series store: {error}",
+                                  exc_info=error)
+
+        processes = config['GENERAL'].getint('PRERENDER_PROCESSES', fallback=os.cpu_count())
+        if processes and any(result.updated for result in results):
+            from covidbot.covid_data.prerender import GraphPreRenderer
+            try:
+                with get_connection(config, autocommit=True) as conn:
+                    GraphPreRenderer(conn, get_connection_args(config, autocommit=True),
+                                     config['GENERAL'].get('CACHE_DIR', 'graphics'),
+                                     timeseries_dir=config['GENERAL'].get('TIMESERIES_DIR'),
+                                     cache_bytes=get_graph_cache_bytes(config), processes=processes).run()
+            except Exception as error:
+                logging.exception(f"Exception happened on pre-rendering graphs: {error}", exc_info=error)
 
         # Check Tweets & Co
         platforms = ["feedback"]
@@ -507,9 +575,17 @@ def main():
         logging.info("### Start Archive Update ###")
         with get_connection(config, autocommit=False) as conn:
             from covidbot.covid_data import RKIHistoryUpdater
+            from covidbot.covid_data.updater.updater import Updater
+
+            Updater.archive = get_source_archive(config)
 
             try:
-                if RKIHistoryUpdater(conn).update():
+                updater = RKIHistoryUpdater(conn)
+                if updater.update():
+                    updater.bump_data_version()
+                    timeseries = get_timeseries_store(config)
+                    if timeseries:
+                        timeseries.rebuild(conn)
                     logging.warning(
                         f"Got new data from {RKIHistoryUpdater.__class__.__name__}")
                     with MessengerBotSetup("telegram", config, setup_logs=False,
@@ -530,6 +606,61 @@ def main():
                         f"{RKIHistoryUpdater.__class__.__name__}: {error}",
                         [config["TELEGRAM"].get("DEV_CHAT")]))
 
+    elif args.reingest:
+        # Setup Logging
+        logging.basicConfig(format=LOGGING_FORMAT, level=logging_level,
+                            filename=os.path.join(logs_dir, "updater.log"))
+
+        # Log also to stdout
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(LOGGING_FORMAT))
+        logging.getLogger().addHandler(stream_handler)
+
+        archive = get_source_archive(config)
+        if not archive:
+            print("--reingest requires GENERAL.ARCHIVE_DIR to be set")
+            exit(1)
+
+        logging.info("### Start Reingest ###")
+        with get_connection(config, autocommit=False) as conn:
+            from covidbot.covid_data import VaccinationGermanyUpdater, RValueGermanyUpdater, RKIKeyDataUpdater, \
+                ICUGermanyUpdater, RulesGermanyUpdater, ICUGermanyHistoryUpdater, HospitalisationRKIUpdater, \
+                RKIHistoryUpdater
+            from covidbot.covid_data.updater.updater import Updater
+
+            Updater.archive = archive
+            payloads = Updater.get_archived_payloads(conn, args.reingest)
+            for updater in [RKIKeyDataUpdater, RKIHistoryUpdater, ICUGermanyHistoryUpdater, VaccinationGermanyUpdater,
+                            RulesGermanyUpdater, RValueGermanyUpdater, ICUGermanyUpdater, HospitalisationRKIUpdater]:
+                replay = {url: content_hash for url, content_hash in payloads.items() if updater.uses_url(url)}
+                if not replay:
+                    continue
+
+                instance = updater(conn)
+                instance.replay = replay
+                if instance.update():
+                    instance.bump_data_version()
+                    logging.info(f"Reingested {', '.join(replay.values())} with {updater.__name__}")
+                else:
+                    logging.warning(f"{updater.__name__} did not change data from {', '.join(replay.values())}")
+
+            timeseries = get_timeseries_store(config)
+            if timeseries:
+                timeseries.rebuild(conn)
+
+    elif args.rebuild_facts:
+        logging.basicConfig(format=LOGGING_FORMAT, level=logging_level)
+        logging.info("### Rebuild District Facts ###")
+        with get_connection(config, autocommit=False) as conn:
+            from covidbot.covid_data.calculated import CalculatedCovidData
+            from covidbot.covid_data.covid_data import CovidDatabaseCreator
+            from covidbot.covid_data.versions import DataVersions
+
+            CovidDatabaseCreator(conn)
+            CalculatedCovidData(conn).refresh()
+            DataVersions.bump(conn, DataVersions.CASES)
+            conn.commit()
+
 
 if __name__ == "__main__":
     main()
@@ -991,8 +991,18 @@ Weitere Informationen findest Du im <a href="https://corona.rki.de/">Dashboard d
         """
         self.user_manager.set_platform_user_number(self.user_manager.get_user_number(self.user_manager.platform))
 
-        for user in self.user_manager.get_all_user(with_subscriptions=True):
+        users = self.user_manager.get_all_user(with_subscriptions=True)
+        warmed_up = False
+        for user in users:
             for t in self.report_generator.get_available_reports(user):
+                if not warmed_up:
+                    # Load data for all subscribed districts at once instead of user by user
+                    subscriptions = set()
+                    for u in users:
+                        if u.subscriptions:
+                            subscriptions.update(u.subscriptions)
+                    self.covid_data.warm_up(list(subscriptions))
+                    warmed_up = True
                 yield t, user.platform_id, self.report_generator.generate_report(user, t)
 
             if not user.activated:
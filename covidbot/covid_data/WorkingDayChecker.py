@@ -1,39 +1,158 @@
 import datetime
 import json
-from typing import Optional
+import logging
+import os
+from typing import Optional, List, Dict, Tuple
 
-import requests
+import numpy
 
 
 class WorkingDayChecker:
+    # Saturdays are working days
+    WEEKMASK = "1111110"
+    STATES = ["NATIONAL", "BW", "BY", "BE", "BB", "HB", "HH", "HE", "MV", "NI", "NW", "RP", "SL", "SN", "ST", "SH",
+              "TH"]
+    log = logging.getLogger(__name__)
 
-    def __init__(self):
+    def __init__(self, cache_dir: Optional[str] = None):
+        """
+        :param cache_dir: Directory to persist the computed holidays per year in, nothing is persisted if None
+        """
         self.holidays = dict()
+        self.calendars: Dict[str, Tuple[int, int, numpy.busdaycalendar]] = dict()
+        self.cache_dir = cache_dir
 
-    def _data(self, year):
-        if not year in self.holidays:
-            header = {
-                "User-Agent": "CovidBot (https://github.com/eknoes/covid-bot | https://covidbot.d-64.org)"}
-            response = requests.get(
-                f'https://feiertage-api.de/api/?jahr={year}',
-                headers=header)
+    def _data(self, year: int) -> Dict[str, Dict[str, Dict[str, str]]]:
+        if year not in self.holidays:
+            data = None
+            filepath = None
+            if self.cache_dir:
+                filepath = os.path.join(self.cache_dir, f"holidays-{year}.json")
+                if os.path.isfile(filepath):
+                    try:
+                        with open(filepath, "r") as f:
+                            data = json.load(f)
+                    except (OSError, ValueError) as e:
+                        self.log.warning(f"Can't read holidays from {filepath}, calculating them again: {e}")
 
-            if not response or response.status_code < 200 or response.status_code >= 300:
-                raise ConnectionError(f"Can't connect to feiertage-api.de: {response}")
-            self.holidays[year] = json.loads(response.text)
+            if data is None:
+                data = self.calculate_holidays(year)
+                if filepath:
+                    try:
+                        os.makedirs(self.cache_dir, exist_ok=True)
+                        with open(filepath, "w") as f:
+                            json.dump(data, f)
+                    except OSError as e:
+                        self.log.warning(f"Can't write holidays to {filepath}: {e}")
+            self.holidays[year] = data
 
         return self.holidays[year]
 
+    @staticmethod
+    def get_easter_sunday(year: int) -> datetime.date:
+        # Anonymous Gregorian algorithm
+        a = year % 19
+        b, c = divmod(year, 100)
+        d, e = divmod(b, 4)
+        f = (b + 8) // 25
+        g = (b - f + 1) // 3
+        h = (19 * a + b - d - g + 15) % 30
+        i, k = divmod(c, 4)
+        l = (32 + 2 * e + 2 * i - h - k) % 7
+        m = (a + 11 * h + 22 * l) // 451
+        month, day = divmod(h + l - 7 * m + 114, 31)
+        return datetime.date(year, month, day + 1)
+
+    @staticmethod
+    def calculate_holidays(year: int) -> Dict[str, Dict[str, Dict[str, str]]]:
+        """
+        Calculates the public holidays for all states in the format of feiertage-api.de
+        :param year: Year to calculate holidays for
+        :return: Dict of state to Dict of holiday name to {'datum': ISO date, 'hinweis': note}
+        """
+        easter = WorkingDayChecker.get_easter_sunday(year)
+        # Wednesday before 23th November
+        repentance_day = datetime.date(year, 11, 22)
+        repentance_day -= datetime.timedelta(days=(repentance_day.weekday() - 2) % 7)
+
+        national = {"Neujahrstag": datetime.date(year, 1, 1),
+                    "Karfreitag": easter - datetime.timedelta(days=2),
+                    "Ostermontag": easter + datetime.timedelta(days=1),
+                    "Tag der Arbeit": datetime.date(year, 5, 1),
+                    "Christi Himmelfahrt": easter + datetime.timedelta(days=39),
+                    "Pfingstmontag": easter + datetime.timedelta(days=50),
+                    "Tag der Deutschen Einheit": datetime.date(year, 10, 3),
+                    "1. Weihnachtstag": datetime.date(year, 12, 25),
+                    "2. Weihnachtstag": datetime.date(year, 12, 26)}
+        if year == 2017:
+            national["Reformationstag"] = datetime.date(year, 10, 31)
+
+        # (Name, date, states)
+        regional = [("Heilige Drei Könige", datetime.date(year, 1, 6), ["BW", "BY", "ST"]),
+                    ("Ostersonntag", easter, ["BB"]),
+                    ("Pfingstsonntag", easter + datetime.timedelta(days=49), ["BB"]),
+                    ("Fronleichnam", easter + datetime.timedelta(days=60), ["BW", "BY", "HE", "NW", "RP", "SL"]),
+                    ("Mariä Himmelfahrt", datetime.date(year, 8, 15), ["BY", "SL"]),
+                    ("Allerheiligen", datetime.date(year, 11, 1), ["BW", "BY", "NW", "RP", "SL"]),
+                    ("Buß- und Bettag", repentance_day, ["SN"])]
+
+        reformation_day = ["BB", "MV", "SN", "ST", "TH"]
+        if year >= 2018:
+            reformation_day += ["HB", "HH", "NI", "SH"]
+        if year != 2017:
+            regional.append(("Reformationstag", datetime.date(year, 10, 31), reformation_day))
+
+        womens_day = []
+        if year >= 2019:
+            womens_day.append("BE")
+        if year >= 2023:
+            womens_day.append("MV")
+        regional.append(("Internationaler Frauentag", datetime.date(year, 3, 8), womens_day))
+
+        if year >= 2019:
+            regional.append(("Weltkindertag", datetime.date(year, 9, 20), ["TH"]))
+
+        if year in [2020, 2025]:
+            regional.append(("Tag der Befreiung", datetime.date(year, 5, 8), ["BE"]))
+
+        result = {}
+        for state in WorkingDayChecker.STATES:
+            holidays = dict(national)
+            for name, day, states in regional:
+                if state in states:
+                    holidays[name] = day
+            result[state] = {name: {"datum": day.isoformat(), "hinweis": ""} for name, day in holidays.items()}
+        return result
+
     def is_valid_state(self, state: str) -> bool:
-        return state.upper() in self._data(datetime.date.today().year)
+        return state.upper() in self.STATES
 
-    def check_holiday(self, for_day: datetime.date, state: Optional[str] = "NATIONAL") -> bool:
+    def _normalize_state(self, state: Optional[str]) -> str:
         if not state or state == "BUND":
             state = "NATIONAL"
         state = state.upper()
 
         if not self.is_valid_state(state):
             raise ValueError(f"{state} not a valid name to check for holidays")
+        return state
+
+    def _calendar(self, state: str, first_year: int, last_year: int) -> numpy.busdaycalendar:
+        cached = self.calendars.get(state)
+        if cached:
+            if cached[0] <= first_year and last_year <= cached[1]:
+                return cached[2]
+            first_year, last_year = min(first_year, cached[0]), max(last_year, cached[1])
+
+        holidays = []
+        for year in range(first_year, last_year + 1):
+            holidays += [info['datum'] for info in self._data(year)[state].values()]
+
+        calendar = numpy.busdaycalendar(weekmask=self.WEEKMASK, holidays=holidays)
+        self.calendars[state] = (first_year, last_year, calendar)
+        return calendar
+
+    def check_holiday(self, for_day: datetime.date, state: Optional[str] = "NATIONAL") -> bool:
+        state = self._normalize_state(state)
 
         if for_day.weekday() == 6:
             return True
@@ -45,3 +164,42 @@ class WorkingDayChecker:
 
         return False
 
+    def count_working_days(self, since: datetime.date, until: Optional[datetime.date] = None,
+                           state: Optional[str] = "NATIONAL") -> int:
+        """
+        Counts the working days from since (inclusive) to until (exclusive)
+        :param since: First day
+        :param until: Day after the last day, defaults to today
+        :param state: State to take holidays from
+        :return: Number of working days, 0 if since is not before until
+        """
+        return self.count_working_days_bulk([since], until, [state])[0]
+
+    def count_working_days_bulk(self, since: List[datetime.date], until: Optional[datetime.date] = None,
+                                states: Optional[List[Optional[str]]] = None) -> List[int]:
+        """
+        Counts the working days from each date in since (inclusive) to until (exclusive)
+        :param since: First days
+        :param until: Day after the last day, defaults to today
+        :param states: State to take holidays from for each date in since, national holidays if None
+        :return: Number of working days for each date in since
+        """
+        if until is None:
+            until = datetime.date.today()
+
+        if states is None:
+            states = [None] * len(since)
+
+        by_state: Dict[str, List[int]] = dict()
+        for i, state in enumerate(states):
+            by_state.setdefault(self._normalize_state(state), []).append(i)
+
+        results = [0] * len(since)
+        for state, indices in by_state.items():
+            years = [since[i].year for i in indices] + [until.year]
+            calendar = self._calendar(state, min(years), max(years))
+            begin = numpy.array([since[i] for i in indices], dtype='datetime64[D]')
+            counts = numpy.busday_count(begin, numpy.datetime64(until, 'D'), busdaycal=calendar)
+            for i, count in zip(indices, counts):
+                results[i] = max(int(count), 0)
+        return results
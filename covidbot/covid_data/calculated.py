@@ -0,0 +1,155 @@
+import logging
+from datetime import date
+from typing import Optional
+
+from mysql.connector import MySQLConnection
+
+
+class CalculatedCovidData:
+    """
+    Maintains covid_data_calculated, which holds the rows of covid_data together with the daily differences and
+    district information, district_threshold_crossings, which holds the last date the incidence of a district was
+    below or above each of the INCIDENCE_THRESHOLDS, and district_facts, which holds the records of each district.
+    All of them have to be refreshed whenever covid_data is written.
+    """
+    INCIDENCE_THRESHOLDS = [10, 35, 50, 100, 150, 165, 200]
+    connection: MySQLConnection
+    log = logging.getLogger(__name__)
+
+    def __init__(self, connection: MySQLConnection):
+        self.connection = connection
+
+    def refresh(self, since: Optional[date] = None) -> int:
+        """
+        Recalculates covid_data_calculated for all dates starting at since. As new cases and deaths depend on the
+        previous day, the day after a changed date has to be included, which is always the case here.
+        Threshold crossings and district facts are updated with the refreshed rows.
+        Does not commit, so it can be part of the transaction that changed covid_data.
+        :param since: First date that changed, None to recalculate everything
+        :return: Number of affected rows
+        """
+        args = []
+        where_query = ""
+        if since:
+            where_query = "WHERE d.date >= DATE(%s)"
+            args = [since]
+
+        self.log.debug(f"Refreshing covid_data_calculated since {since}")
+        with self.connection.cursor() as cursor:
+            cursor.execute('INSERT INTO covid_data_calculated (rs, county_name, type, parent, date, total_cases, '
+                           'new_cases, total_deaths, new_deaths, incidence, last_update) '
+                           'SELECT * FROM '
+                           '(SELECT d.rs, c.county_name, c.type, c.parent, d.date, d.total_cases, '
+                           'd.total_cases - y.total_cases as new_cases, d.total_deaths, '
+                           'd.total_deaths - y.total_deaths as new_deaths, d.incidence, d.last_update '
+                           'FROM covid_data d '
+                           'LEFT JOIN covid_data y ON y.rs = d.rs AND y.date = SUBDATE(d.date, 1) '
+                           'LEFT JOIN counties c ON c.rs = d.rs '
+                           f'{where_query}) as new '
+                           'ON DUPLICATE KEY UPDATE county_name=new.county_name, type=new.type, parent=new.parent, '
+                           'total_cases=new.total_cases, new_cases=new.new_cases, total_deaths=new.total_deaths, '
+                           'new_deaths=new.new_deaths, incidence=new.incidence, last_update=new.last_update', args)
+            rows = cursor.rowcount
+
+        self.refresh_threshold_crossings(since)
+        self.refresh_district_facts(since)
+        return rows
+
+    def refresh_threshold_crossings(self, since: Optional[date] = None) -> None:
+        """
+        Updates district_threshold_crossings with the rows of covid_data_calculated starting at since. Dates are only
+        moved forward, so if existing incidences might have been corrected, a full refresh is needed.
+        Does not commit, so it can be part of the transaction that changed covid_data.
+        :param since: First date that changed, None to recalculate everything
+        """
+        args = list(self.INCIDENCE_THRESHOLDS)
+        thresholds_query = " UNION ALL ".join(["SELECT %s as threshold"] * len(self.INCIDENCE_THRESHOLDS))
+
+        where_query = ""
+        if since:
+            where_query = "AND d.date >= DATE(%s) "
+            args.append(since)
+
+        if since:
+            update_query = ('last_below=GREATEST(COALESCE(district_threshold_crossings.last_below, new.last_below), '
+                            'COALESCE(new.last_below, district_threshold_crossings.last_below)), '
+                            'last_above=GREATEST(COALESCE(district_threshold_crossings.last_above, new.last_above), '
+                            'COALESCE(new.last_above, district_threshold_crossings.last_above))')
+        else:
+            update_query = 'last_below=new.last_below, last_above=new.last_above'
+
+        self.log.debug(f"Refreshing district_threshold_crossings since {since}")
+        with self.connection.cursor() as cursor:
+            if not since:
+                # noinspection SqlWithoutWhere
+                cursor.execute('DELETE FROM district_threshold_crossings')
+
+            cursor.execute('INSERT INTO district_threshold_crossings (rs, threshold, last_below, last_above) '
+                           'SELECT * FROM '
+                           '(SELECT d.rs, t.threshold, '
+                           'MAX(IF(d.incidence < t.threshold, d.date, NULL)) as last_below, '
+                           'MAX(IF(d.incidence > t.threshold, d.date, NULL)) as last_above '
+                           f'FROM covid_data_calculated d JOIN ({thresholds_query}) t '
+                           f'WHERE d.incidence IS NOT NULL {where_query}'
+                           'GROUP BY d.rs, t.threshold) as new '
+                           f'ON DUPLICATE KEY UPDATE {update_query}', args)
+
+    def refresh_district_facts(self, since: Optional[date] = None) -> None:
+        """
+        Updates district_facts with the rows of covid_data_calculated starting at since. Records are only replaced by
+        higher values, on ties the earlier date is kept. If existing data might have been corrected, a full refresh
+        is needed.
+        Does not commit, so it can be part of the transaction that changed covid_data.
+        :param since: First date that changed, None to recalculate everything
+        """
+        args = []
+        where_query = ""
+        join_query = ""
+        if since:
+            where_query = "WHERE date >= DATE(%s) "
+            join_query = "AND d.date >= DATE(%s) "
+            args = [since, since]
+
+        if since:
+            update_query = []
+            # Dates have to be updated first, as they depend on the old values
+            for field in ["highest_incidence", "highest_cases", "highest_deaths"]:
+                update_query.append(f'{field}_date=IF(COALESCE(new.{field} > district_facts.{field}, '
+                                    f'district_facts.{field} IS NULL), new.{field}_date, district_facts.{field}_date)')
+                update_query.append(f'{field}=IF(COALESCE(new.{field} > district_facts.{field}, '
+                                    f'district_facts.{field} IS NULL), new.{field}, district_facts.{field})')
+            for field in ["first_case_date", "first_death_date"]:
+                update_query.append(f'{field}=COALESCE(LEAST(district_facts.{field}, new.{field}), '
+                                    f'district_facts.{field}, new.{field})')
+            update_query = ", ".join(update_query)
+        else:
+            update_query = ", ".join([f"{field}=new.{field}" for field in
+                                      ["highest_incidence", "highest_incidence_date", "highest_cases",
+                                       "highest_cases_date", "highest_deaths", "highest_deaths_date",
+                                       "first_case_date", "first_death_date"]])
+
+        self.log.debug(f"Refreshing district_facts since {since}")
+        with self.connection.cursor() as cursor:
+            if not since:
+                # noinspection SqlWithoutWhere
+                cursor.execute('DELETE FROM district_facts')
+
+            cursor.execute('INSERT INTO district_facts (rs, highest_incidence, highest_incidence_date, highest_cases, '
+                           'highest_cases_date, highest_deaths, highest_deaths_date, first_case_date, '
+                           'first_death_date) '
+                           'SELECT * FROM '
+                           '(SELECT agg.rs, agg.highest_incidence, '
+                           'MIN(IF(d.incidence = agg.highest_incidence, d.date, NULL)) as highest_incidence_date, '
+                           'agg.highest_cases, '
+                           'MIN(IF(d.new_cases = agg.highest_cases, d.date, NULL)) as highest_cases_date, '
+                           'agg.highest_deaths, '
+                           'MIN(IF(d.new_deaths = agg.highest_deaths, d.date, NULL)) as highest_deaths_date, '
+                           'agg.first_case_date, agg.first_death_date '
+                           'FROM (SELECT rs, MAX(incidence) as highest_incidence, MAX(new_cases) as highest_cases, '
+                           'MAX(new_deaths) as highest_deaths, MIN(IF(total_cases > 0, date, NULL)) as first_case_date, '
+                           'MIN(IF(total_deaths > 0, date, NULL)) as first_death_date '
+                           f'FROM covid_data_calculated {where_query}GROUP BY rs) agg '
+                           f'JOIN covid_data_calculated d ON d.rs = agg.rs {join_query}'
+                           'GROUP BY agg.rs, agg.highest_incidence, agg.highest_cases, agg.highest_deaths, '
+                           'agg.first_case_date, agg.first_death_date) as new '
+                           f'ON DUPLICATE KEY UPDATE {update_query}', args)
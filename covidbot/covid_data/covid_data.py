@@ -1,14 +1,21 @@
 import logging
 import math
+import threading
+import time
+from collections import OrderedDict
 from datetime import date, timedelta, datetime
-from typing import List, Optional, Dict, Union
+from typing import List, Optional, Dict, Union, Tuple
 
 from mysql.connector import MySQLConnection
 
 from covidbot.covid_data.WorkingDayChecker import WorkingDayChecker
+from covidbot.covid_data.calculated import CalculatedCovidData
 from covidbot.covid_data.models import District, VaccinationData, RValueData, DistrictData, ICUData, \
     RuleData, IncidenceIntervalData, DistrictFacts, Hospitalization, HospitalizationAgeGroup, ICUFacts
-from covidbot.metrics import LOCATION_DB_LOOKUP
+from covidbot.covid_data.rollup import DistrictRollup
+from covidbot.covid_data.search_index import DistrictSearchIndex
+from covidbot.covid_data.versions import DataVersions
+from covidbot.metrics import LOCATION_DB_LOOKUP, DATA_CACHE_HITS, DATA_CACHE_MISSES
 from covidbot.utils import get_trend
 
 
@@ -16,48 +23,64 @@ class CovidData(object):
     connection: MySQLConnection
     log = logging.getLogger(__name__)
     working_day_checker = WorkingDayChecker()
+    cache_size: int
+    version_check_interval: int
+    data_versions: DataVersions
+    WARM_UP_BATCH_SIZE = 100
 
-    def __init__(self, connection: MySQLConnection) -> None:
+    def __init__(self, connection: MySQLConnection, cache_size: int = 500, version_check_interval: int = 60,
+                 cache_dir: Optional[str] = None) -> None:
+        """
+        :param connection: Database connection
+        :param cache_size: Maximum number of DistrictData snapshots kept in memory
+        :param version_check_interval: Seconds until the data versions and last update timestamps of the sources are
+        checked again
+        :param cache_dir: Directory to persist calculated holidays in
+        """
         self.connection = connection
+        if cache_dir:
+            self.working_day_checker = WorkingDayChecker(cache_dir)
+        self.cache_size = cache_size
+        self.version_check_interval = version_check_interval
+        self._cache: OrderedDict[int, DistrictData] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_version: Optional[tuple] = None
+        self._version_checked: Optional[float] = None
+        self._icu_facts: Optional[ICUFacts] = None
+        self._search_index: Optional[DistrictSearchIndex] = None
+        self._search_index_signature = None
+        self._search_index_checked = 0.0
         CovidDatabaseCreator(self.connection)
+        # Checked as often as the timestamps, see _check_data_version
+        self.data_versions = DataVersions(connection, check_interval=0)
 
     @LOCATION_DB_LOOKUP.time()
     def search_district_by_name(self, search_str: str) -> List[District]:
-        search_str = search_str.lower().strip()
-        query_str = '%' + search_str.replace(" ", "%") + '%'
-        results = []
-        with self.connection.cursor(dictionary=True) as cursor:
-            if search_str.isdigit():
-                cursor.execute('SELECT rs, county_name FROM counties WHERE rs = %s',
-                               [int(search_str)])
-            else:
-                cursor.execute('SELECT rs, county_name FROM counties WHERE LOWER(county_name) LIKE %s '
-                               'OR concat(LOWER(type), LOWER(county_name)) LIKE %s',
-                               [query_str, query_str])
-
-            exact_matches = []
-            for row in cursor.fetchall():
-                if row['county_name'].lower() == search_str:
-                    return [District(row['county_name'], row['rs'])]
-
-                if len(search_str) < len(row['county_name']) and row['county_name'][
-                                                                 :len(search_str) + 1].lower() == search_str + " ":
-                    exact_matches.append(District(row['county_name'], row['rs']))
+        return self._get_search_index().search(search_str)
 
-                results.append(District(row['county_name'], row['rs']))
+    def _get_search_index(self) -> DistrictSearchIndex:
+        now = time.monotonic()
+        if self._search_index and now - self._search_index_checked < self.version_check_interval:
+            return self._search_index
 
-            if not search_str.isdigit():
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT (SELECT COUNT(*) FROM counties), '
+                           '(SELECT SUM(CRC32(CONCAT_WS(\'|\', rs, county_name, type))) FROM counties), '
+                           '(SELECT COUNT(*) FROM county_alt_names), '
+                           '(SELECT SUM(CRC32(CONCAT_WS(\'|\', district_id, alt_name))) FROM county_alt_names)')
+            signature = cursor.fetchone()
+
+            if not self._search_index or signature != self._search_index_signature:
+                self.log.debug("Building district search index")
+                cursor.execute('SELECT rs, county_name, type FROM counties ORDER BY rs')
+                counties = cursor.fetchall()
                 cursor.execute('SELECT district_id, c.county_name, alt_name FROM county_alt_names '
-                               'LEFT JOIN counties c on c.rs = county_alt_names.district_id '
-                               'WHERE LOWER(alt_name) LIKE %s', [query_str])
-                for row in cursor.fetchall():
-                    if row['alt_name'].lower() == search_str:
-                        exact_matches.append(District(row['county_name'], row['district_id']))
-                    results.append(District(row['county_name'], row['district_id']))
-
-            if len(exact_matches) == 1:
-                return exact_matches
-        return results
+                               'LEFT JOIN counties c on c.rs = county_alt_names.district_id ORDER BY alt_name')
+                alt_names = cursor.fetchall()
+                self._search_index = DistrictSearchIndex(counties, alt_names)
+                self._search_index_signature = signature
+        self._search_index_checked = now
+        return self._search_index
 
     def get_district(self, district_id: int) -> District:
         with self.connection.cursor(dictionary=True) as cursor:
@@ -72,40 +95,23 @@ class CovidData(object):
             for row in cursor.fetchall():
                 children.append(row['rs'])
         if children:
-            children_data = []
-            for child in children:
-                children_data.append((self.get_district_data(child)))
-            return children_data
+            children_data = self.get_districts_data(children)
+            return [children_data[child] for child in children if child in children_data]
 
     def get_district_facts(self, district_id: int) -> Optional[DistrictFacts]:
-        with self.connection.cursor() as cursor:
-            cursor.execute('''SELECT 'cases', new_cases, date FROM covid_data_calculated WHERE rs=%s AND new_cases = (SELECT MAX(new_cases) FROM covid_data_calculated WHERE rs=%s)
-UNION
-SELECT 'deaths', new_deaths, date FROM covid_data_calculated WHERE rs=%s AND new_deaths = (SELECT MAX(new_deaths) FROM covid_data_calculated WHERE rs=%s)
-UNION
-SELECT 'incidence', incidence, date FROM covid_data_calculated WHERE rs=%s AND incidence = (SELECT MAX(incidence) FROM covid_data_calculated WHERE rs=%s)
-UNION 
-(SELECT 'first-death', total_deaths, date FROM covid_data WHERE rs=%s AND total_deaths > 0 ORDER BY date LIMIT 1)
-UNION 
-(SELECT 'first-case', total_cases, date FROM covid_data WHERE rs=%s AND total_cases > 0 ORDER BY date LIMIT 1)
-''',
-                           [district_id] * 8)
-            facts = DistrictFacts()
-            for record in cursor.fetchall():
-                if record[0] == 'cases':
-                    facts.highest_cases = int(record[1])
-                    facts.highest_cases_date = record[2]
-                elif record[0] == 'deaths':
-                    facts.highest_deaths = int(record[1])
-                    facts.highest_deaths_date = record[2]
-                elif record[0] == 'incidence':
-                    facts.highest_incidence = record[1]
-                    facts.highest_incidence_date = record[2]
-                elif record[0] == 'first-death':
-                    facts.first_death_date = record[2]
-                elif record[0] == 'first-case':
-                    facts.first_case_date = record[2]
-            return facts
+        with self.connection.cursor(dictionary=True) as cursor:
+            cursor.execute('SELECT highest_incidence, highest_incidence_date, highest_cases, highest_cases_date, '
+                           'highest_deaths, highest_deaths_date, first_case_date, first_death_date '
+                           'FROM district_facts WHERE rs=%s', [district_id])
+            record = cursor.fetchone()
+            if not record:
+                return DistrictFacts()
+
+            if record['highest_cases'] is not None:
+                record['highest_cases'] = int(record['highest_cases'])
+            if record['highest_deaths'] is not None:
+                record['highest_deaths'] = int(record['highest_deaths'])
+            return DistrictFacts(**record)
 
     def get_district_data(self, district_id: int) \
             -> Optional[DistrictData]:
@@ -114,48 +120,140 @@ UNION
         :param district_id: ID of the district
         :return: DistrictData
         """
-        result = self.get_base_data(district_id)
+        return self.get_districts_data([district_id]).get(district_id)
 
-        if not result:
-            return None
+    def get_districts_data(self, district_ids: List[int]) -> Dict[int, DistrictData]:
+        """
+        Fetches the COVID-19 data for several districts for today. Each table is queried once for all districts, so
+        the number of queries does not depend on the number of districts. Results are served from the snapshot cache
+        until one of the data sources has been updated, so they must not be modified.
+        :param district_ids: IDs of the districts
+        :return: Dict of district ID to DistrictData, districts without data are omitted
+        """
+        self._check_data_version()
+
+        results = {}
+        missing = []
+        with self._cache_lock:
+            for district_id in self._unique_ids(district_ids):
+                if district_id in self._cache:
+                    self._cache.move_to_end(district_id)
+                    results[district_id] = self._cache[district_id]
+                else:
+                    missing.append(district_id)
+
+        if results:
+            DATA_CACHE_HITS.labels(type='district').inc(len(results))
+
+        if missing:
+            DATA_CACHE_MISSES.labels(type='district').inc(len(missing))
+            fetched = self._fetch_districts_data(missing)
+            with self._cache_lock:
+                for district_id, data in fetched.items():
+                    self._cache[district_id] = data
+                    self._cache.move_to_end(district_id)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            results.update(fetched)
+        return results
 
-        result.vaccinations = self.get_vaccination_data(district_id)
-        result.icu_data = self.get_icu_data(district_id)
-        result.r_value = self.get_r_value_data(district_id)
-        result.rules = self.get_rules_data(district_id)
-        result.hospitalisation = self.get_hospitalisation_data(district_id)
-        return result
+    def warm_up(self, district_ids: Optional[List[int]] = None) -> None:
+        """
+        Fills the snapshot cache, e.g. before sending reports.
+        :param district_ids: IDs of the districts to load, all districts if None
+        """
+        if district_ids is None:
+            with self.connection.cursor() as cursor:
+                cursor.execute('SELECT rs FROM counties ORDER BY rs')
+                district_ids = [row[0] for row in cursor.fetchall()]
+
+        district_ids = self._unique_ids(district_ids)[:self.cache_size]
+        self.log.debug(f"Warming up cache for {len(district_ids)} districts")
+        for i in range(0, len(district_ids), self.WARM_UP_BATCH_SIZE):
+            self.get_districts_data(district_ids[i:i + self.WARM_UP_BATCH_SIZE])
+
+    def _check_data_version(self) -> None:
+        now = time.monotonic()
+        if self._version_checked is not None and now - self._version_checked < self.version_check_interval:
+            return
+
+        # Day counts like working days above a threshold are counted up to today, corrections of older dates and
+        # sources without a timestamp here are only visible in the data versions
+        version = (date.today(), tuple(sorted(self.data_versions.get_all().items())), self.get_last_update_cases(),
+                   self.get_last_update_icu(), self.get_last_update_vaccination())
+        with self._cache_lock:
+            self._version_checked = now
+            if version != self._cache_version:
+                if self._cache_version is not None:
+                    self.log.info(f"Data has been updated, invalidating {len(self._cache)} cached districts")
+                self._cache.clear()
+                self._icu_facts = None
+                self._cache_version = version
+
+    def _fetch_districts_data(self, district_ids: List[int]) -> Dict[int, DistrictData]:
+        results = self._get_base_data(district_ids)
+        if not results:
+            return results
+
+        district_ids = list(results.keys())
+        vaccinations = self._get_vaccination_data(district_ids)
+        icu_data = self._get_icu_data(district_ids)
+        rules = self._get_rules_data(district_ids)
+        hospitalisation = self._get_hospitalisation_data(district_ids)
+
+        for district_id, result in results.items():
+            result.vaccinations = vaccinations.get(district_id)
+            result.icu_data = icu_data.get(district_id)
+            result.r_value = self.get_r_value_data(district_id)
+            result.rules = rules.get(district_id)
+            result.hospitalisation = hospitalisation.get(district_id)
+        return results
 
     def get_base_data(self, district_id: int) -> Optional[DistrictData]:
-        with self.connection.cursor(dictionary=True) as cursor:
-            cursor.execute('SELECT * FROM covid_data_calculated WHERE rs=%s ORDER BY date DESC LIMIT 1',
-                           [district_id])
+        return self.get_district_data(district_id)
 
-            record = cursor.fetchone()
-            if not record:
-                return None
+    def _get_base_data(self, district_ids: List[int]) -> Dict[int, DistrictData]:
+        district_ids = self._unique_ids(district_ids)
+        if not district_ids:
+            return {}
+
+        results = {}
+        with self.connection.cursor(dictionary=True) as cursor:
+            # Fetch current data and data for trends at once
+            cursor.execute('SELECT v.*, latest.max_date FROM covid_data_calculated v '
+                           'JOIN (SELECT rs, MAX(date) as max_date FROM covid_data_calculated '
+                           f'WHERE rs IN ({self._placeholders(district_ids)}) GROUP BY rs) latest '
+                           'ON latest.rs = v.rs AND v.date IN (latest.max_date, SUBDATE(latest.max_date, 1), '
+                           'SUBDATE(latest.max_date, 7))', district_ids)
+
+            comparison_records = []
+            for record in cursor.fetchall():
+                if record['date'] != record['max_date']:
+                    comparison_records.append(record)
+                    continue
 
-            incidence = record['incidence']
-            if incidence is not None:
-                incidence = float(incidence)
+                incidence = record['incidence']
+                if incidence is not None:
+                    incidence = float(incidence)
 
-            result = DistrictData(name=record['county_name'], id=district_id, incidence=incidence,
-                                  parent=record['parent'], type=record['type'],
-                                  total_cases=record['total_cases'], total_deaths=record['total_deaths'],
-                                  new_cases=record['new_cases'], new_deaths=record['new_deaths'],
-                                  date=record['date'], last_update=record['last_update'])
+                results[record['rs']] = DistrictData(name=record['county_name'], id=record['rs'], incidence=incidence,
+                                                     parent=record['parent'], type=record['type'],
+                                                     total_cases=record['total_cases'],
+                                                     total_deaths=record['total_deaths'],
+                                                     new_cases=record['new_cases'], new_deaths=record['new_deaths'],
+                                                     date=record['date'], last_update=record['last_update'])
 
             # Get data for trends
-            cursor.execute(
-                'SELECT * FROM covid_data_calculated WHERE rs=%s AND (date=SUBDATE(Date(%s), 7) OR date=SUBDATE(Date(%s), 1)) LIMIT 2',
-                [district_id, result.date, result.date])
+            for record in comparison_records:
+                result = results.get(record['rs'])
+                if not result:
+                    continue
 
-            for record in cursor.fetchall():
                 incidence = record['incidence']
                 if incidence is not None:
                     incidence = float(incidence)
 
-                comparison_data = DistrictData(name=record['county_name'], id=district_id,
+                comparison_data = DistrictData(name=record['county_name'], id=record['rs'],
                                                incidence=incidence,
                                                type=record['type'], total_cases=record['total_cases'],
                                                total_deaths=record['total_deaths'], new_cases=record['new_cases'],
@@ -166,123 +264,180 @@ UNION
                     result.cases_trend = get_trend(comparison_data.new_cases, result.new_cases)
                     result.deaths_trend = get_trend(comparison_data.new_deaths, result.new_deaths)
 
-            if not result.incidence:
-                return result
-
             # Check, how long incidence is in certain interval
-            cursor.execute(
-                'SELECT alt_name FROM county_alt_names WHERE alt_name LIKE \'DE-%\' AND (district_id=%s OR district_id=(SELECT parent FROM counties WHERE rs=%s)) LIMIT 1',
-                [district_id, district_id])
-            state_name = None
-            record = cursor.fetchone()
-            if record:
-                state_name = record['alt_name']
-                state_name = state_name.split("-")[1]
-
-            threshold_values = [10, 35, 50, 100, 150, 165, 200]
-            interval_data = IncidenceIntervalData()
-
-            # Get lower threshold
-            for i in range(len(threshold_values) - 1, 0, -1):
-                if threshold_values[i] < result.incidence:
-                    interval_data.lower_threshold = threshold_values[i]
-                    break
-
-            if interval_data.lower_threshold:
-                cursor.execute('SELECT date FROM covid_data WHERE incidence < %s AND rs=%s ORDER BY date DESC LIMIT 1',
-                               [interval_data.lower_threshold, district_id])
-                record = cursor.fetchone()
-                if record:
-                    lower_date = record['date']
-                    interval_data.lower_threshold_days = 0
-                    interval_data.lower_threshold_working_days = 0
-                    while lower_date < date.today():
-                        interval_data.lower_threshold_days += 1
-                        if not self.working_day_checker.check_holiday(lower_date, state_name):
-                            interval_data.lower_threshold_working_days += 1
-                        lower_date += timedelta(days=1)
-
-            # Get upper threshold
-            for val in threshold_values:
-                if result.incidence < val:
-                    interval_data.upper_threshold = val
-                    break
-
-            if interval_data.upper_threshold:
-                cursor.execute('SELECT date FROM covid_data WHERE incidence > %s AND rs=%s ORDER BY date DESC LIMIT 1',
-                               [interval_data.upper_threshold, district_id])
-                record = cursor.fetchone()
-                if record:
-                    upper_date = record['date']
-                    interval_data.upper_threshold_days = 0
-                    interval_data.upper_threshold_working_days = 0
-                    while upper_date < date.today():
-                        interval_data.upper_threshold_days += 1
-                        if not self.working_day_checker.check_holiday(upper_date, state_name):
-                            interval_data.upper_threshold_working_days += 1
-                        upper_date += timedelta(days=1)
-
-            result.incidence_interval_data = interval_data
-
-            return result
+            with_incidence = [result for result in results.values() if result.incidence]
+            if not with_incidence:
+                return results
+
+            ids = [result.id for result in with_incidence]
+            cursor.execute('SELECT c.rs, a.alt_name FROM counties c '
+                           'JOIN county_alt_names a ON a.district_id = c.rs OR a.district_id = c.parent '
+                           f'WHERE a.alt_name LIKE \'DE-%\' AND c.rs IN ({self._placeholders(ids)})', ids)
+            state_names = {}
+            for record in cursor.fetchall():
+                state_names.setdefault(record['rs'], record['alt_name'].split("-")[1])
+
+            threshold_values = CalculatedCovidData.INCIDENCE_THRESHOLDS
+            for result in with_incidence:
+                interval_data = IncidenceIntervalData()
+
+                # Get lower threshold
+                for i in range(len(threshold_values) - 1, 0, -1):
+                    if threshold_values[i] < result.incidence:
+                        interval_data.lower_threshold = threshold_values[i]
+                        break
+
+                # Get upper threshold
+                for val in threshold_values:
+                    if result.incidence < val:
+                        interval_data.upper_threshold = val
+                        break
+
+                result.incidence_interval_data = interval_data
+
+            lower_dates, upper_dates = self._get_threshold_dates(cursor, with_incidence)
+            lower_days = self._count_days_since(lower_dates, state_names)
+            upper_days = self._count_days_since(upper_dates, state_names)
+
+            for result in with_incidence:
+                interval_data = result.incidence_interval_data
+
+                if result.id in lower_days:
+                    interval_data.lower_threshold_days, interval_data.lower_threshold_working_days = \
+                        lower_days[result.id]
+
+                if result.id in upper_days:
+                    interval_data.upper_threshold_days, interval_data.upper_threshold_working_days = \
+                        upper_days[result.id]
+
+            return results
+
+    @staticmethod
+    def _get_threshold_dates(cursor, districts: List[DistrictData]) -> Tuple[Dict[int, date], Dict[int, date]]:
+        """
+        Fetches the last date the incidence of each district was below its lower and above its upper threshold
+        :param cursor: Cursor to use
+        :param districts: Districts with incidence_interval_data
+        :return: Dicts of district ID to date for lower and upper thresholds
+        """
+        ids = [d.id for d in districts]
+        cursor.execute('SELECT rs, threshold, last_below, last_above FROM district_threshold_crossings '
+                       f'WHERE rs IN ({CovidData._placeholders(ids)})', ids)
+        crossings = {}
+        for record in cursor.fetchall():
+            crossings[(record['rs'], record['threshold'])] = record
+
+        lower_dates, upper_dates = {}, {}
+        for district in districts:
+            interval_data = district.incidence_interval_data
+            lower = crossings.get((district.id, interval_data.lower_threshold))
+            if lower and lower['last_below']:
+                lower_dates[district.id] = lower['last_below']
+
+            upper = crossings.get((district.id, interval_data.upper_threshold))
+            if upper and upper['last_above']:
+                upper_dates[district.id] = upper['last_above']
+        return lower_dates, upper_dates
+
+    def _count_days_since(self, since: Dict[int, date], state_names: Dict[int, str]) -> Dict[int, Tuple[int, int]]:
+        """
+        Counts the days and working days from the given dates until today
+        :param since: Dict of district ID to date
+        :param state_names: Dict of district ID to state abbreviation, used for holidays
+        :return: Dict of district ID to (days, working days)
+        """
+        if not since:
+            return {}
+
+        district_ids = list(since.keys())
+        today = date.today()
+        working_days = self.working_day_checker.count_working_days_bulk([since[i] for i in district_ids], today,
+                                                                        [state_names.get(i) for i in district_ids])
+        return {district_id: (max((today - since[district_id]).days, 0), working_days[i])
+                for i, district_id in enumerate(district_ids)}
 
     def get_vaccination_data(self, district_id: int) -> Optional[VaccinationData]:
+        return self._get_vaccination_data([district_id]).get(district_id)
+
+    def _get_vaccination_data(self, district_ids: List[int]) -> Dict[int, VaccinationData]:
+        district_ids = self._unique_ids(district_ids)
+        if not district_ids:
+            return {}
+
+        results = {}
         with self.connection.cursor(dictionary=True) as cursor:
-            cursor.execute('SELECT MAX(date) as last_update FROM covid_vaccinations WHERE district_id=%s',
-                           [district_id])
-            vacc_date = cursor.fetchone()
-            if vacc_date:
-                last_update = vacc_date['last_update']
-                cursor.execute('SELECT vaccinated_booster, vaccinated_full, vaccinated_partial, '
-                               'rate_booster, rate_full, rate_partial, '
-                               'date, doses_diff, last_update '
-                               'FROM covid_vaccinations WHERE district_id=%s and date<=%s '
-                               'ORDER BY date DESC LIMIT 1',
-                               [district_id, last_update])
-                vaccination_record = cursor.fetchone()
-                if vaccination_record:
-                    vaccination_data = VaccinationData(vaccination_record['vaccinated_booster'],
-                                                       vaccination_record['vaccinated_full'],
-                                                       vaccination_record['vaccinated_partial'],
-                                                       vaccination_record['rate_booster'],
-                                                       vaccination_record['rate_full'],
-                                                       vaccination_record['rate_partial'],
-                                                       vaccination_record['date'],
-                                                       doses_diff=vaccination_record['doses_diff'],
-                                                       last_update=vaccination_record['last_update'])
-
-                    cursor.execute(
-                        'SELECT AVG(doses_diff) as avg_7day, population FROM covid_vaccinations LEFT JOIN counties c on c.rs = covid_vaccinations.district_id WHERE district_id=%s AND date > SUBDATE(%s, 7) AND doses_diff IS NOT NULL GROUP BY district_id',
-                        [district_id, last_update])
-                    record = cursor.fetchone()
-                    if record:
-                        vaccination_data.avg_speed = int(record['avg_7day'])
-                    return vaccination_data
+            # Fetch the current data and the data needed for the 7-day average
+            cursor.execute('SELECT v.district_id, v.vaccinated_booster, v.vaccinated_full, v.vaccinated_partial, '
+                           'v.rate_booster, v.rate_full, v.rate_partial, '
+                           'v.date, v.doses_diff, v.last_update, latest.max_date '
+                           'FROM covid_vaccinations v '
+                           'JOIN (SELECT district_id, MAX(date) as max_date FROM covid_vaccinations '
+                           f'WHERE district_id IN ({self._placeholders(district_ids)}) GROUP BY district_id) latest '
+                           'ON latest.district_id = v.district_id AND v.date > SUBDATE(latest.max_date, 7)',
+                           district_ids)
+
+            doses = {}
+            for vaccination_record in cursor.fetchall():
+                district_id = vaccination_record['district_id']
+                if vaccination_record['doses_diff'] is not None:
+                    doses.setdefault(district_id, []).append(vaccination_record['doses_diff'])
+
+                if vaccination_record['date'] == vaccination_record['max_date']:
+                    results[district_id] = VaccinationData(vaccination_record['vaccinated_booster'],
+                                                           vaccination_record['vaccinated_full'],
+                                                           vaccination_record['vaccinated_partial'],
+                                                           vaccination_record['rate_booster'],
+                                                           vaccination_record['rate_full'],
+                                                           vaccination_record['rate_partial'],
+                                                           vaccination_record['date'],
+                                                           doses_diff=vaccination_record['doses_diff'],
+                                                           last_update=vaccination_record['last_update'])
+
+            for district_id, vaccination_data in results.items():
+                if district_id in doses:
+                    vaccination_data.avg_speed = int(sum(doses[district_id]) / len(doses[district_id]))
+        return results
 
     def get_icu_data(self, district_id: int) -> Optional[ICUData]:
+        return self._get_icu_data([district_id]).get(district_id)
+
+    def _get_icu_data(self, district_ids: List[int]) -> Dict[int, ICUData]:
+        district_ids = self._unique_ids(district_ids)
+        if not district_ids:
+            return {}
+
+        results = {}
         with self.connection.cursor(dictionary=True) as cursor:
-            cursor.execute('SELECT date, clear, occupied, occupied_covid, clear_children, occupied_children, covid_ventilated, updated FROM icu_beds '
-                           'WHERE district_id=%s ORDER BY date DESC LIMIT 1', [district_id])
-            row = cursor.fetchone()
-            if row:
-                result = ICUData(date=row['date'], clear_beds=row['clear'], occupied_beds=row['occupied'],
-                                 occupied_covid=row['occupied_covid'],
-                                 occupied_beds_children=row['occupied_children'],
-                                 clear_beds_children=row['clear_children'],
-                                 covid_ventilated=row['covid_ventilated'], last_update=row['updated'])
-
-                cursor.execute('SELECT occupied, occupied_covid FROM icu_beds '
-                               'WHERE district_id=%s AND date=SUBDATE(%s, 7) LIMIT 1',
-                               [district_id, result.date])
-                row = cursor.fetchone()
-                if row:
+            cursor.execute('SELECT i.district_id, i.date, i.clear, i.occupied, i.occupied_covid, i.clear_children, '
+                           'i.occupied_children, i.covid_ventilated, i.updated, latest.max_date FROM icu_beds i '
+                           'JOIN (SELECT district_id, MAX(date) as max_date FROM icu_beds '
+                           f'WHERE district_id IN ({self._placeholders(district_ids)}) GROUP BY district_id) latest '
+                           'ON latest.district_id = i.district_id '
+                           'AND i.date IN (latest.max_date, SUBDATE(latest.max_date, 7))', district_ids)
+            comparison_rows = []
+            for row in cursor.fetchall():
+                if row['date'] != row['max_date']:
+                    comparison_rows.append(row)
+                    continue
+
+                results[row['district_id']] = ICUData(date=row['date'], clear_beds=row['clear'],
+                                                      occupied_beds=row['occupied'],
+                                                      occupied_covid=row['occupied_covid'],
+                                                      occupied_beds_children=row['occupied_children'],
+                                                      clear_beds_children=row['clear_children'],
+                                                      covid_ventilated=row['covid_ventilated'],
+                                                      last_update=row['updated'])
+
+            for row in comparison_rows:
+                result = results.get(row['district_id'])
+                if result:
                     result.occupied_beds_trend = get_trend(row['occupied'], result.occupied_beds)
                     result.occupied_covid_trend = get_trend(row['occupied_covid'], result.occupied_covid)
 
-                if district_id == 0:
-                    result.facts = self.get_icu_global_facts()
+        if 0 in results:
+            results[0].facts = self.get_icu_global_facts()
 
-                return result
+        return results
 
     def get_r_value_data(self, district_id: int) -> Optional[RValueData]:
         if district_id != 0:
@@ -305,29 +460,72 @@ UNION
             return r_data
 
     def get_rules_data(self, district_id: int) -> Optional[RuleData]:
+        return self._get_rules_data([district_id]).get(district_id)
+
+    def _get_rules_data(self, district_ids: List[int]) -> Dict[int, RuleData]:
+        district_ids = self._unique_ids(district_ids)
+        if not district_ids:
+            return {}
+
         with self.connection.cursor(dictionary=True) as cursor:
-            cursor.execute('SELECT text, link, updated FROM district_rules WHERE district_id=%s', [district_id])
-            data = cursor.fetchone()
-            if data:
-                return RuleData(data['updated'], data['text'], data['link'])
+            cursor.execute('SELECT district_id, text, link, updated FROM district_rules '
+                           f'WHERE district_id IN ({self._placeholders(district_ids)})', district_ids)
+            return {data['district_id']: RuleData(data['updated'], data['text'], data['link'])
+                    for data in cursor.fetchall()}
 
     def get_hospitalisation_data(self, district_id: int) -> Optional[Hospitalization]:
+        return self._get_hospitalisation_data([district_id]).get(district_id)
+
+    def _get_hospitalisation_data(self, district_ids: List[int]) -> Dict[int, Hospitalization]:
+        district_ids = self._unique_ids(district_ids)
+        if not district_ids:
+            return {}
+
+        results = {}
         with self.connection.cursor(dictionary=True) as cursor:
-            cursor.execute('SELECT number, incidence, date FROM hospitalisation WHERE district_id=%s AND age LIKE \'00+\' ORDER BY date DESC LIMIT 1', [district_id])
-            data = cursor.fetchone()
-            if data:
-                result = Hospitalization(data['number'], data['incidence'], data['date'])
-                groups = []
-                cursor.execute('SELECT number, incidence, age FROM hospitalisation WHERE district_id=%s AND age NOT LIKE \'00+\' AND date=%s ORDER BY age', [district_id, data['date']])
-                for row in cursor.fetchall():
-                    groups.append(HospitalizationAgeGroup(row['number'], row['incidence'], row['age']))
-                result.groups = groups
-                return result
+            cursor.execute('SELECT h.district_id, h.number, h.incidence, h.date, h.age FROM hospitalisation h '
+                           'JOIN (SELECT district_id, MAX(date) as max_date FROM hospitalisation '
+                           f'WHERE district_id IN ({self._placeholders(district_ids)}) AND age LIKE \'00+\' '
+                           'GROUP BY district_id) latest '
+                           'ON latest.district_id = h.district_id AND latest.max_date = h.date ORDER BY h.age',
+                           district_ids)
+            groups = {}
+            for row in cursor.fetchall():
+                if row['age'] == '00+':
+                    results[row['district_id']] = Hospitalization(row['number'], row['incidence'], row['date'])
+                else:
+                    groups.setdefault(row['district_id'], []).append(
+                        HospitalizationAgeGroup(row['number'], row['incidence'], row['age']))
+
+            for district_id, result in results.items():
+                result.groups = groups.get(district_id, [])
+        return results
+
+    @staticmethod
+    def _unique_ids(district_ids: List[int]) -> List[int]:
+        return list(dict.fromkeys(map(int, district_ids)))
+
+    @staticmethod
+    def _placeholders(values: List) -> str:
+        return ", ".join(["%s"] * len(values))
 
     def get_country_data(self) -> DistrictData:
         return self.get_district_data(0)
 
     def get_icu_global_facts(self) -> ICUFacts:
+        self._check_data_version()
+        facts = self._icu_facts
+        if facts:
+            DATA_CACHE_HITS.labels(type='icu-facts').inc()
+            return facts
+
+        DATA_CACHE_MISSES.labels(type='icu-facts').inc()
+        facts = self._get_icu_global_facts()
+        with self._cache_lock:
+            self._icu_facts = facts
+        return facts
+
+    def _get_icu_global_facts(self) -> ICUFacts:
         with self.connection.cursor(dictionary=True) as cursor:
             cursor.execute('SELECT MAX(date) as current FROM icu_beds')
             current_date = cursor.fetchone()['current']
@@ -434,25 +632,70 @@ class CovidDatabaseCreator:
                            'district_id INTEGER, text TEXT CHARACTER SET utf8 COLLATE utf8_general_ci, link VARCHAR(255), updated DATETIME,'
                            'FOREIGN KEY(district_id) REFERENCES counties(rs), UNIQUE(district_id))')
 
-            # Check if view exists
+            # Validators of the last responses of the data sources, maintained by Updater
+            cursor.execute('CREATE TABLE IF NOT EXISTS http_resources (url_hash CHAR(40) PRIMARY KEY, url TEXT, '
+                           'etag VARCHAR(255), last_modified VARCHAR(64), length BIGINT, tail_hash CHAR(40), '
+                           'header TEXT, updated DATETIME DEFAULT NOW())')
+            cursor.execute("SHOW COLUMNS FROM http_resources LIKE 'tail_hash'")
+            if cursor.fetchone() is None:
+                cursor.execute('ALTER TABLE http_resources ADD length BIGINT, ADD tail_hash CHAR(40), ADD header TEXT')
+
+            # Payloads of the data sources that were ingested, archived by Updater
+            cursor.execute('CREATE TABLE IF NOT EXISTS source_payloads (id INTEGER PRIMARY KEY AUTO_INCREMENT, '
+                           'url_hash CHAR(40), url TEXT, content_hash CHAR(64), ingested DATETIME DEFAULT NOW(), '
+                           'INDEX(url_hash), INDEX(content_hash))')
+
+            # Version of the data of each source, increased by the updaters and read by DataVersions
+            cursor.execute('CREATE TABLE IF NOT EXISTS data_versions (source VARCHAR(32) PRIMARY KEY, '
+                           'version INTEGER NOT NULL DEFAULT 0, updated DATETIME DEFAULT NOW())')
+
+            # Ancestors of each county, maintained by DistrictRollup
+            cursor.execute('CREATE TABLE IF NOT EXISTS county_ancestors (ancestor INTEGER, descendant INTEGER, '
+                           'branch INTEGER, PRIMARY KEY(ancestor, descendant), INDEX(descendant))')
+            cursor.execute('SELECT 1 FROM county_ancestors LIMIT 1')
+            if cursor.fetchone() is None:
+                DistrictRollup(connection).refresh_ancestors()
+
+            # Last dates the incidence was below/above the thresholds, maintained by CalculatedCovidData
+            cursor.execute("SHOW TABLES LIKE 'district_threshold_crossings'")
+            crossings_exist = cursor.fetchone() is not None
+            if not crossings_exist:
+                log.info("Table district_threshold_crossings does not exist, creating it!")
+                cursor.execute('CREATE TABLE district_threshold_crossings (rs INTEGER, threshold INTEGER, '
+                               'last_below DATE NULL DEFAULT NULL, last_above DATE NULL DEFAULT NULL, '
+                               'PRIMARY KEY(rs, threshold))')
+
+            # Records of each district, maintained by CalculatedCovidData
+            cursor.execute("SHOW TABLES LIKE 'district_facts'")
+            facts_exist = cursor.fetchone() is not None
+            if not facts_exist:
+                log.info("Table district_facts does not exist, creating it!")
+                cursor.execute('CREATE TABLE district_facts (rs INTEGER PRIMARY KEY, '
+                               'highest_incidence DECIMAL(7,2), highest_incidence_date DATE, '
+                               'highest_cases INT, highest_cases_date DATE, highest_deaths INT, '
+                               'highest_deaths_date DATE, first_case_date DATE, first_death_date DATE)')
+
+            # Infection data including daily differences, maintained by CalculatedCovidData
             cursor.execute("SHOW FULL TABLES WHERE TABLE_TYPE LIKE '%VIEW%';")
-            exists = False
             for row in cursor.fetchall():
                 if row[0] == "covid_data_calculated":
-                    exists = True
+                    log.info("Replacing view covid_data_calculated with a table")
+                    cursor.execute('DROP VIEW covid_data_calculated')
 
+            cursor.execute("SHOW TABLES LIKE 'covid_data_calculated'")
+            exists = cursor.fetchone() is not None
             if not exists:
-                log.info("View covid_data_calculated does not exist, creating it!")
-                cursor.execute('CREATE VIEW covid_data_calculated AS '
-                               'SELECT c.rs, c.county_name, c.type, c.parent, covid_data.date, '
-                               'covid_data.total_cases, covid_data.total_cases - y.total_cases as new_cases, '
-                               'covid_data.total_deaths, covid_data.total_deaths - y.total_deaths as new_deaths, '
-                               'covid_data.incidence, covid_data.last_update '
-                               'FROM covid_data '
-                               'LEFT JOIN covid_data y on y.rs = covid_data.rs AND '
-                               'y.date = subdate(covid_data.date, 1) '
-                               'LEFT JOIN counties c on c.rs = covid_data.rs '
-                               'ORDER BY covid_data.date DESC')
+                log.info("Table covid_data_calculated does not exist, creating it!")
+                cursor.execute('CREATE TABLE covid_data_calculated (rs INTEGER, county_name VARCHAR(255), '
+                               'type VARCHAR(30), parent INTEGER, date DATE, total_cases INT, new_cases INT, '
+                               'total_deaths INT, new_deaths INT, incidence DECIMAL(7,2), last_update DATETIME, '
+                               'PRIMARY KEY(rs, date))')
+                CalculatedCovidData(connection).refresh()
+            else:
+                if not crossings_exist:
+                    CalculatedCovidData(connection).refresh_threshold_crossings()
+                if not facts_exist:
+                    CalculatedCovidData(connection).refresh_district_facts()
 
             # Insert if not exists
             cursor.execute("INSERT IGNORE INTO counties (rs, county_name, type, parent) "
@@ -0,0 +1,183 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Callable, Tuple
+
+import numpy
+
+from covidbot.metrics import EVICTED_GRAPHS, GRAPH_CACHE_BYTES
+
+
+class GraphCache:
+    """
+    Rendered graphs stored by a hash of their type and plotted data, so a graph is only rendered again if its data
+    changed. An SQLite index in the directory keeps size and last access of the files for all processes, the least
+    recently used graphs are deleted as soon as the cache grows beyond max_bytes, except those used within
+    EVICTION_GRACE seconds, which another process might be about to send. The most recently read graphs are also kept
+    in memory of the process, up to memory_bytes.
+    Aliases name a graph by something cheaper than its data, like the version of the data. Each alias points to the
+    key of the graph it was last stored for.
+    """
+    INDEX_FILE = "graph-cache.sqlite3"
+    DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+    EVICTION_GRACE = 60.0
+    directory: str
+    max_bytes: int
+    memory_bytes: int
+    log = logging.getLogger(__name__)
+
+    def __init__(self, directory: str, max_bytes: Optional[int] = None, memory_bytes: int = 0):
+        self.directory = directory
+        self.max_bytes = max_bytes if max_bytes is not None else self.DEFAULT_MAX_BYTES
+        self.memory_bytes = memory_bytes
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_size = 0
+
+        self._index = sqlite3.connect(os.path.join(directory, self.INDEX_FILE), timeout=30, isolation_level=None,
+                                      check_same_thread=False)
+        self._index.execute("PRAGMA journal_mode=WAL")
+        self._index.execute("CREATE TABLE IF NOT EXISTS graphs (key TEXT PRIMARY KEY, type TEXT NOT NULL, "
+                            "size INTEGER NOT NULL, last_access REAL NOT NULL)")
+        self._index.execute("CREATE INDEX IF NOT EXISTS graphs_last_access ON graphs (last_access)")
+        self._index.execute("CREATE TABLE IF NOT EXISTS aliases (name TEXT PRIMARY KEY, version TEXT NOT NULL, "
+                            "key TEXT NOT NULL)")
+        self._index.execute("CREATE INDEX IF NOT EXISTS aliases_key ON aliases (key)")
+
+    @staticmethod
+    def get_key(graph_type: str, *data) -> str:
+        """
+        :param data: Everything shown in the graph, as numpy arrays or values with a stable repr
+        :return: SHA-256 of the graph type and its data
+        """
+        digest = hashlib.sha256(graph_type.encode("utf-8"))
+        for part in data:
+            if isinstance(part, numpy.ndarray):
+                digest.update(f"{part.dtype.str}{part.shape}".encode("utf-8"))
+                digest.update(numpy.ascontiguousarray(part).tobytes())
+            else:
+                digest.update(repr(part).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get_path(self, key: str, graph_type: str) -> str:
+        return os.path.abspath(os.path.join(self.directory, f"{graph_type}-{key}.jpg"))
+
+    def get(self, key: str, graph_type: str) -> Optional[str]:
+        """
+        :return: Path of the cached graph, None if it has to be rendered
+        """
+        filepath = self.get_path(key, graph_type)
+        with self._lock:
+            found = self._index.execute("UPDATE graphs SET last_access=? WHERE key=?", [time.time(), key]).rowcount
+            if found and not os.path.isfile(filepath):
+                self._index.execute("DELETE FROM graphs WHERE key=?", [key])
+                found = False
+        if not found:
+            return None
+        return filepath
+
+    def get_alias(self, name: str, version: str, graph_type: str) -> Optional[str]:
+        """
+        :return: Path of the graph stored for the alias and version, None if there is none
+        """
+        with self._lock:
+            row = self._index.execute("SELECT key FROM aliases WHERE name=? AND version=?", [name, version]).fetchone()
+        if not row:
+            return None
+        return self.get(row[0], graph_type)
+
+    def set_alias(self, name: str, version: str, key: str) -> None:
+        with self._lock:
+            self._index.execute("INSERT OR REPLACE INTO aliases (name, version, key) VALUES (?, ?, ?)",
+                                [name, version, key])
+
+    def store(self, key: str, graph_type: str, write: Callable[[str], None],
+              alias: Optional[Tuple[str, str]] = None) -> str:
+        """
+        Adds a graph to the cache and evicts the least recently used ones if the cache is too big
+        :param write: Writes the graph to the given path
+        :param alias: Name and version of an alias for the graph
+        :return: Path of the cached graph
+        """
+        filepath = self.get_path(key, graph_type)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{graph_type}-", suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._index.execute("BEGIN IMMEDIATE")
+            try:
+                self._index.execute("INSERT OR REPLACE INTO graphs (key, type, size, last_access) VALUES (?, ?, ?, ?)",
+                                    [key, graph_type, os.path.getsize(filepath), time.time()])
+                if alias:
+                    self._index.execute("INSERT OR REPLACE INTO aliases (name, version, key) VALUES (?, ?, ?)",
+                                        [alias[0], alias[1], key])
+                self._evict(key)
+                self._index.execute("COMMIT")
+            except BaseException:
+                self._index.execute("ROLLBACK")
+                raise
+        return filepath
+
+    def _evict(self, keep: str) -> None:
+        total = self._index.execute("SELECT COALESCE(SUM(size), 0) FROM graphs").fetchone()[0]
+        if total > self.max_bytes:
+            evicted = 0
+            for key, graph_type, size in self._index.execute("SELECT key, type, size FROM graphs WHERE key != ? "
+                                                             "AND last_access < ? ORDER BY last_access",
+                                                             [keep, time.time() - self.EVICTION_GRACE]).fetchall():
+                if total <= self.max_bytes:
+                    break
+
+                filepath = self.get_path(key, graph_type)
+                try:
+                    os.remove(filepath)
+                except FileNotFoundError:
+                    pass
+                self._index.execute("DELETE FROM graphs WHERE key=?", [key])
+                self._index.execute("DELETE FROM aliases WHERE key=?", [key])
+                content = self._memory.pop(filepath, None)
+                if content is not None:
+                    self._memory_size -= len(content)
+                EVICTED_GRAPHS.labels(type=graph_type).inc()
+                total -= size
+                evicted += 1
+            self.log.debug(f"Evicted {evicted} graphs from the cache")
+        GRAPH_CACHE_BYTES.labels(tier='disk').set(total)
+        GRAPH_CACHE_BYTES.labels(tier='memory').set(self._memory_size)
+
+    def read(self, filepath: str) -> bytes:
+        """
+        :return: Content of a graph, from memory if it was read recently
+        """
+        with self._lock:
+            content = self._memory.get(filepath)
+            if content is not None:
+                self._memory.move_to_end(filepath)
+                return content
+
+        with open(filepath, "rb") as f:
+            content = f.read()
+
+        if len(content) <= self.memory_bytes:
+            with self._lock:
+                if filepath not in self._memory:
+                    self._memory[filepath] = content
+                    self._memory_size += len(content)
+                    while self._memory_size > self.memory_bytes:
+                        _, old = self._memory.popitem(last=False)
+                        self._memory_size -= len(old)
+                GRAPH_CACHE_BYTES.labels(tier='memory').set(self._memory_size)
+        return content
@@ -0,0 +1,100 @@
+import logging
+import multiprocessing
+import time
+from typing import List, Tuple, Optional, Dict, Any
+
+from mysql.connector import MySQLConnection, connect
+
+from covidbot.covid_data.timeseries import TimeSeriesStore
+from covidbot.covid_data.visualization import Visualization
+
+# Visualization of a worker process
+_visualization: Optional[Visualization] = None
+
+
+def _init_worker(connection_args: Dict[str, Any], graphics_dir: str, timeseries_dir: Optional[str],
+                 cache_bytes: Optional[int]) -> None:
+    global _visualization
+    timeseries = TimeSeriesStore(timeseries_dir) if timeseries_dir else None
+    _visualization = Visualization(connect(**connection_args), graphics_dir, timeseries=timeseries,
+                                   cache_bytes=cache_bytes)
+
+
+def _render(job: Tuple[str, int]) -> Tuple[Tuple[str, int], Optional[str]]:
+    graph, district_id = job
+    try:
+        getattr(_visualization, graph)(district_id)
+    except Exception as e:
+        return job, f"{e.__class__.__name__}: {e}"
+    return job, None
+
+
+class GraphPreRenderer:
+    """
+    Renders the graphs of Germany, the states and all subscribed districts in a process pool after data updates.
+    The graphs are created through Visualization with the default arguments of reports and requests, so they find
+    them in the cache.
+    """
+    DISTRICT_GRAPHS = ["infections_graph", "incidence_graph"]
+    ICU_GRAPHS = ["icu_graph"]
+    VACCINATION_GRAPHS = ["vaccination_graph", "vaccination_speed_graph"]
+    connection: MySQLConnection
+    log = logging.getLogger(__name__)
+
+    def __init__(self, connection: MySQLConnection, connection_args: Dict[str, Any], graphics_dir: str,
+                 timeseries_dir: Optional[str] = None, cache_bytes: Optional[int] = None,
+                 processes: Optional[int] = None):
+        """
+        :param connection: Connection to find the districts to render
+        :param connection_args: Arguments for mysql.connector.connect, each worker process connects on its own
+        :param cache_bytes: Size of the graph cache, see Visualization
+        :param processes: Number of worker processes, defaults to the number of CPUs
+        """
+        self.connection = connection
+        self.connection_args = connection_args
+        self.graphics_dir = graphics_dir
+        self.timeseries_dir = timeseries_dir
+        self.cache_bytes = cache_bytes
+        self.processes = processes
+
+    def get_jobs(self) -> List[Tuple[str, int]]:
+        """
+        :return: Pairs of Visualization method and district id, districts with most subscribers first
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT c.rs FROM counties c LEFT JOIN subscriptions s ON s.rs = c.rs '
+                           'WHERE c.rs = 0 OR c.parent = 0 OR s.rs IS NOT NULL '
+                           'GROUP BY c.rs ORDER BY COUNT(s.user_id) DESC, c.rs')
+            district_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute('SELECT DISTINCT district_id FROM icu_beds')
+            icu_ids = {row[0] for row in cursor.fetchall()}
+            cursor.execute('SELECT DISTINCT district_id FROM covid_vaccinations')
+            vaccination_ids = {row[0] for row in cursor.fetchall()}
+
+        jobs = []
+        for district_id in district_ids:
+            graphs = list(self.DISTRICT_GRAPHS)
+            if district_id in icu_ids:
+                graphs += self.ICU_GRAPHS
+            if district_id in vaccination_ids:
+                graphs += self.VACCINATION_GRAPHS
+            jobs += [(graph, district_id) for graph in graphs]
+        return jobs
+
+    def run(self) -> int:
+        """
+        :return: Number of graphs rendered or found in the cache
+        """
+        jobs = self.get_jobs()
+        start = time.monotonic()
+        rendered = 0
+        with multiprocessing.Pool(self.processes, initializer=_init_worker,
+                                  initargs=(self.connection_args, self.graphics_dir, self.timeseries_dir,
+                                            self.cache_bytes)) as pool:
+            for (graph, district_id), error in pool.imap_unordered(_render, jobs):
+                if error:
+                    self.log.warning(f"Could not render {graph} of {district_id}: {error}")
+                else:
+                    rendered += 1
+        self.log.info(f"Pre-rendered {rendered} of {len(jobs)} graphs in {time.monotonic() - start:.1f}s")
+        return rendered
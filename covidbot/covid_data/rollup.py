@@ -0,0 +1,108 @@
+import logging
+from datetime import date
+from typing import Optional, List, Tuple
+
+from mysql.connector import MySQLConnection
+
+
+class DistrictRollup:
+    """
+    Aggregates the values of districts into their states and Germany. county_ancestors holds every ancestor of each
+    county together with the branch, the child of the ancestor the county belongs to. Rows are summed up from the
+    leaves, rows without rows of children on the same date, so all levels are calculated in one pass. This way
+    Berlin counts as a leaf on dates it has no data for its boroughs.
+    """
+    LEAF_QUERY = ('NOT EXISTS (SELECT 1 FROM {table} ch JOIN counties cc ON cc.rs = ch.{column} '
+                  'WHERE cc.parent = d.{column} AND ch.date = d.date)')
+    connection: MySQLConnection
+    log = logging.getLogger(__name__)
+
+    def __init__(self, connection: MySQLConnection):
+        self.connection = connection
+
+    def refresh_ancestors(self) -> None:
+        """
+        Rebuilds county_ancestors from counties, has to be called whenever counties changed.
+        Does not commit.
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT rs, parent FROM counties')
+            parents = {row[0]: row[1] for row in cursor.fetchall()}
+
+            ancestors: List[Tuple[int, int, int]] = []
+            for rs in parents:
+                branch, ancestor = rs, parents[rs]
+                while ancestor is not None and ancestor != rs:
+                    ancestors.append((ancestor, rs, branch))
+                    branch, ancestor = ancestor, parents.get(ancestor)
+
+            # noinspection SqlWithoutWhere
+            cursor.execute('DELETE FROM county_ancestors')
+            cursor.executemany('INSERT INTO county_ancestors (ancestor, descendant, branch) VALUES (%s, %s, %s)',
+                               ancestors)
+        self.log.debug(f"Refreshed county_ancestors with {len(ancestors)} rows")
+
+    def rollup_covid_data(self, since: Optional[date] = None) -> None:
+        """
+        Calculates cases and deaths of all parents from covid_data starting at since. The incidence is only
+        calculated for parents without one, weighted by population.
+        Does not commit.
+        :param since: First date that changed, None to recalculate everything
+        """
+        args = []
+        where_query = ""
+        if since:
+            where_query = "AND d.date >= DATE(%s) "
+            args = [since]
+        leaf_query = self.LEAF_QUERY.format(table="covid_data", column="rs")
+
+        self.log.debug(f"Aggregating covid_data since {since}")
+        with self.connection.cursor() as cursor:
+            cursor.execute('INSERT INTO covid_data (rs, date, total_cases, total_deaths, last_update) '
+                           'SELECT * FROM '
+                           '(SELECT a.ancestor as rs, d.date, SUM(d.total_cases) as total_cases, '
+                           'SUM(d.total_deaths) as total_deaths, MAX(d.last_update) as last_update '
+                           'FROM covid_data d JOIN county_ancestors a ON a.descendant = d.rs '
+                           f'WHERE {leaf_query} {where_query}'
+                           'GROUP BY a.ancestor, d.date) as new '
+                           'ON DUPLICATE KEY UPDATE total_cases=new.total_cases, total_deaths=new.total_deaths, '
+                           'last_update=new.last_update', args)
+
+            cursor.execute('UPDATE covid_data, '
+                           '(SELECT a.ancestor as rs, d.date, SUM(c.population * d.incidence) / SUM(c.population) '
+                           'as incidence FROM covid_data d '
+                           'JOIN county_ancestors a ON a.descendant = d.rs '
+                           'JOIN counties c ON c.rs = d.rs '
+                           f'WHERE {leaf_query} {where_query}'
+                           'GROUP BY a.ancestor, d.date) as incidence '
+                           'SET covid_data.incidence = incidence.incidence '
+                           'WHERE covid_data.incidence IS NULL AND covid_data.date = incidence.date '
+                           'AND covid_data.rs = incidence.rs', args)
+
+    def rollup_icu_beds(self, since: Optional[date] = None) -> None:
+        """
+        Inserts the ICU values of all parents missing in icu_beds starting at since. Germany is only calculated if all
+        states have data.
+        Does not commit.
+        :param since: First date that changed, None to calculate everything
+        """
+        args = []
+        where_query = ""
+        if since:
+            where_query = "AND d.date >= DATE(%s) "
+            args = [since]
+        leaf_query = self.LEAF_QUERY.format(table="icu_beds", column="district_id")
+
+        self.log.debug(f"Aggregating icu_beds since {since}")
+        with self.connection.cursor() as cursor:
+            cursor.execute('INSERT IGNORE INTO icu_beds (district_id, date, clear, occupied, occupied_covid, '
+                           'covid_ventilated, occupied_children, clear_children, updated) '
+                           'SELECT a.ancestor, d.date, SUM(d.clear), SUM(d.occupied), SUM(d.occupied_covid), '
+                           'SUM(d.covid_ventilated), SUM(d.occupied_children), SUM(d.clear_children), '
+                           'MAX(d.updated) FROM icu_beds d '
+                           'JOIN county_ancestors a ON a.descendant = d.district_id '
+                           'JOIN (SELECT parent, COUNT(*) as children FROM counties WHERE parent IS NOT NULL '
+                           'GROUP BY parent) ch ON ch.parent = a.ancestor '
+                           f'WHERE {leaf_query} {where_query}'
+                           'GROUP BY a.ancestor, d.date, ch.children '
+                           'HAVING a.ancestor > 0 OR COUNT(DISTINCT a.branch) = ch.children', args)
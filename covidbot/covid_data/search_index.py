@@ -0,0 +1,194 @@
+import re
+import unicodedata
+from typing import List, Tuple, Optional, Dict, Set, Iterable
+
+from covidbot.covid_data.models import District
+
+
+def collate(text: str) -> str:
+    """
+    Normalizes a string like the utf8mb4_unicode_ci collation does for comparisons: case and accent insensitive
+    """
+    text = unicodedata.normalize("NFKD", text.lower().replace("ß", "ss"))
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def transliterate(text: str) -> str:
+    """
+    Normalizes a string for fuzzy matching, umlauts are written as usual without special characters, e.g. München
+    and Muenchen are equal
+    """
+    text = text.lower()
+    for umlaut, replacement in [("ä", "ae"), ("ö", "oe"), ("ü", "ue"), ("ß", "ss")]:
+        text = text.replace(umlaut, replacement)
+    return collate(text)
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> Optional[int]:
+    """
+    Levenshtein distance between a and b
+    :return: Distance or None, if it is larger than max_distance
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > max_distance:
+            return None
+        previous = current
+
+    if previous[-1] > max_distance:
+        return None
+    return previous[-1]
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """
+    Maps trigrams to the IDs of the entries whose keys contain them
+    """
+    postings: Dict[str, Set[int]]
+    size: int
+
+    def __init__(self, keys: List[Iterable[str]]):
+        self.postings = {}
+        self.size = len(keys)
+        for entry_id, entry_keys in enumerate(keys):
+            for key in entry_keys:
+                for trigram in trigrams(key):
+                    self.postings.setdefault(trigram, set()).add(entry_id)
+
+    def all_of(self, segments: List[str]) -> List[int]:
+        """
+        :return: Sorted IDs of entries that might contain all segments
+        """
+        candidates = None
+        for segment in segments:
+            for trigram in trigrams(segment):
+                ids = self.postings.get(trigram, set())
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates:
+                    return []
+
+        if candidates is None:
+            return list(range(self.size))
+        return sorted(candidates)
+
+    def any_of(self, text: str) -> List[int]:
+        """
+        :return: Sorted IDs of entries sharing at least one trigram with text
+        """
+        candidates = set()
+        for trigram in trigrams(text):
+            candidates |= self.postings.get(trigram, set())
+        return sorted(candidates)
+
+
+class DistrictSearchIndex:
+    """
+    In-memory index over district names and alternative names. search() behaves like the former LIKE queries on
+    counties and county_alt_names, but falls back to fuzzy matching if nothing was found.
+    """
+    counties: List[Tuple[int, str, str]]
+    alt_names: List[Tuple[int, str, str]]
+
+    def __init__(self, counties: List[Tuple[int, str, Optional[str]]], alt_names: List[Tuple[int, str, str]]):
+        """
+        :param counties: List of (rs, county_name, type), ordered as results should be returned
+        :param alt_names: List of (district_id, county_name, alt_name), ordered as results should be returned
+        """
+        self.counties = [(rs, name, (county_type or "")) for rs, name, county_type in counties]
+        self.alt_names = [(rs, name, alt_name) for rs, name, alt_name in alt_names if name is not None]
+        self.county_names = {rs: name for rs, name, _ in self.counties}
+
+        self.county_keys = [(collate(name), collate(county_type + name)) for _, name, county_type in self.counties]
+        self.alt_name_keys = [collate(alt_name) for _, _, alt_name in self.alt_names]
+        self.county_index = TrigramIndex(self.county_keys)
+        self.alt_name_index = TrigramIndex([[key] for key in self.alt_name_keys])
+
+        self.fuzzy_entries = [(rs, name, transliterate(name)) for rs, name, _ in self.counties] + \
+                             [(rs, name, transliterate(alt_name)) for rs, name, alt_name in self.alt_names]
+        self.fuzzy_index = TrigramIndex([[key] for _, _, key in self.fuzzy_entries])
+
+    @staticmethod
+    def max_edit_distance(search_str: str) -> int:
+        if len(search_str) >= 10:
+            return 2
+        if len(search_str) >= 6:
+            return 1
+        return 0
+
+    def search(self, search_str: str) -> List[District]:
+        search_str = search_str.lower().strip()
+        if search_str.isdigit():
+            rs = int(search_str)
+            if rs in self.county_names:
+                return [District(self.county_names[rs], rs)]
+            return []
+
+        # Same as LIKE '%word1%word2%', including the wildcards of LIKE
+        like_pattern = collate('%' + search_str.replace(" ", "%") + '%')
+        pattern = re.compile("".join(".*" if c == "%" else "." if c == "_" else re.escape(c) for c in like_pattern),
+                             re.DOTALL)
+        segments = [s for s in re.split("[%_]", like_pattern) if s]
+
+        results = []
+        exact_matches = []
+        for entry_id in self.county_index.all_of(segments):
+            rs, name, _ = self.counties[entry_id]
+            if not any(pattern.fullmatch(key) for key in self.county_keys[entry_id]):
+                continue
+
+            if name.lower() == search_str:
+                return [District(name, rs)]
+
+            if len(search_str) < len(name) and name[:len(search_str) + 1].lower() == search_str + " ":
+                exact_matches.append(District(name, rs))
+
+            results.append(District(name, rs))
+
+        for entry_id in self.alt_name_index.all_of(segments):
+            if not pattern.fullmatch(self.alt_name_keys[entry_id]):
+                continue
+
+            rs, name, alt_name = self.alt_names[entry_id]
+            if alt_name.lower() == search_str:
+                exact_matches.append(District(name, rs))
+            results.append(District(name, rs))
+
+        if len(exact_matches) == 1:
+            return exact_matches
+
+        if not results:
+            return self.fuzzy_search(search_str)
+        return results
+
+    def fuzzy_search(self, search_str: str) -> List[District]:
+        """
+        Finds the districts with the smallest edit distance to search_str, within a bound depending on its length
+        """
+        search_key = transliterate(search_str)
+        max_distance = self.max_edit_distance(search_key)
+
+        best_distance = None
+        results = []
+        for entry_id in self.fuzzy_index.any_of(search_key):
+            rs, name, key = self.fuzzy_entries[entry_id]
+            distance = edit_distance(search_key, key, max_distance if best_distance is None else best_distance)
+            if distance is None:
+                continue
+
+            if best_distance is None or distance < best_distance:
+                best_distance = distance
+                results = []
+
+            if rs not in [d.id for d in results]:
+                results.append(District(name, rs))
+        return results
@@ -0,0 +1,270 @@
+import datetime
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Optional, Tuple, Dict, List
+
+import numpy
+import pandas as pd
+from mysql.connector import MySQLConnection
+
+from covidbot.covid_data.versions import DataVersions
+
+
+class TimeSeriesStore:
+    """
+    Dense district x date arrays of the historic data, stored as .npy files and memory-mapped read-only, so all
+    processes share them. Missing values are NaN. The store is rebuilt by the updaters into a new version directory,
+    readers switch to it as soon as the version pointer changed.
+    """
+    # Source in DataVersions, query, series names for the selected columns after district_id and date
+    SOURCES = [(DataVersions.CASES, "SELECT rs, date, new_cases, new_deaths, incidence FROM covid_data_calculated",
+                ["new_cases", "new_deaths", "incidence"]),
+               (DataVersions.ICU,
+                "SELECT district_id, date, clear, occupied, occupied_covid, covid_ventilated FROM icu_beds",
+                ["icu_clear", "icu_occupied", "icu_occupied_covid", "icu_covid_ventilated"]),
+               (DataVersions.VACCINATIONS,
+                "SELECT district_id, date, vaccinated_partial, vaccinated_full, vaccinated_booster, doses_diff "
+                "FROM covid_vaccinations",
+                ["vaccinated_partial", "vaccinated_full", "vaccinated_booster", "doses_diff"]),
+               (DataVersions.HOSPITALISATION,
+                "SELECT district_id, date, incidence FROM hospitalisation WHERE age='00+'",
+                ["hospitalisation_incidence"])]
+    POINTER_FILE = "current.json"
+    directory: str
+    check_interval: float
+    log = logging.getLogger(__name__)
+
+    def __init__(self, directory: str, check_interval: float = 5.0):
+        """
+        :param directory: Directory containing the store
+        :param check_interval: Seconds until the version pointer is checked again for a new version
+        """
+        self.directory = directory
+        self.check_interval = check_interval
+        self._loaded: Optional[Tuple[str, dict, Dict[str, numpy.ndarray], numpy.ndarray, Dict[int, int]]] = None
+        self._checked = 0.0
+
+    def rebuild(self, connection: MySQLConnection) -> None:
+        """
+        Writes a new version of the store from the database and points readers to it. Series of sources whose version
+        in DataVersions did not change since the previous version are copied from it instead of being queried.
+        """
+        # Read before the data, a source updated in between is queried again next time
+        versions = DataVersions(connection).get_all()
+        previous = self._read_pointer()
+        previous_meta = self._read_meta(previous) if previous else None
+
+        results = {}
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT rs, county_name, population FROM counties ORDER BY rs")
+            counties = cursor.fetchall()
+            districts = [[row[0], row[1], row[2]] for row in counties]
+            if previous_meta and previous_meta['districts'] != districts:
+                previous_meta = None
+
+            sources = {}
+            for source, query, series in self.SOURCES:
+                stored = previous_meta['sources'].get(source) if previous_meta else None
+                if stored and stored['version'] is not None and stored['version'] == versions.get(source):
+                    sources[source] = stored
+                    continue
+
+                cursor.execute(query)
+                result = cursor.fetchall()
+                results[source] = result
+                dates = [row[1] for row in result]
+                sources[source] = {"version": versions.get(source),
+                                   "first_date": min(dates).isoformat() if dates else None,
+                                   "last_date": max(dates).isoformat() if dates else None}
+
+            cursor.execute("SELECT district_id, MAX(updated) FROM hospitalisation WHERE age='00+' "
+                           "GROUP BY district_id")
+            hospitalisation_updated = {row[0]: row[1].isoformat() for row in cursor.fetchall() if row[1]}
+
+        first_dates = [datetime.date.fromisoformat(info['first_date']) for info in sources.values()
+                       if info['first_date']]
+        last_dates = [datetime.date.fromisoformat(info['last_date']) for info in sources.values() if info['last_date']]
+        if not first_dates:
+            self.log.warning("No data available, not building time series store")
+            return
+
+        first_date, last_date = min(first_dates), max(last_dates)
+        district_ids = numpy.array([row[0] for row in counties], dtype=numpy.int64)
+        num_days = (last_date - first_date).days + 1
+
+        version = f"v{time.time_ns()}"
+        version_dir = os.path.join(self.directory, version)
+        os.makedirs(version_dir)
+
+        for source, _, series in self.SOURCES:
+            if source not in results:
+                self.log.debug(f"Copying {source} from time series store {previous}")
+                previous_first = datetime.date.fromisoformat(previous_meta['first_date'])
+                for name in series:
+                    data = self._shift(numpy.load(os.path.join(self.directory, previous, f"{name}.npy"),
+                                                  mmap_mode='r'), (previous_first - first_date).days, num_days)
+                    numpy.save(os.path.join(version_dir, f"{name}.npy"), data)
+                continue
+
+            result = results[source]
+            row_ids = numpy.array([row[0] for row in result], dtype=numpy.int64)
+            district_idx = numpy.searchsorted(district_ids, row_ids)
+            known = district_idx < len(district_ids)
+            known[known] = district_ids[district_idx[known]] == row_ids[known]
+            # Converting each date to datetime64 is slow, there are only few distinct dates
+            dates = [row[1] for row in result]
+            day_index = {day: (day - first_date).days for day in set(dates)}
+            date_idx = numpy.fromiter(map(day_index.__getitem__, dates), dtype=numpy.int64, count=len(dates))
+            for column, name in enumerate(series, start=2):
+                data = numpy.full((len(district_ids), num_days), numpy.nan)
+                values = numpy.array([row[column] for row in result], dtype=object)
+                present = known & ~pd.isna(values)
+                data[district_idx[present], date_idx[present]] = values[present].astype(numpy.float64)
+                numpy.save(os.path.join(version_dir, f"{name}.npy"), data)
+
+        meta = {"first_date": first_date.isoformat(), "days": num_days, "districts": districts, "sources": sources,
+                "hospitalisation_updated": hospitalisation_updated}
+        with open(os.path.join(version_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        # Switch atomically, processes still mapping older versions keep their files until they reload
+        pointer = os.path.join(self.directory, self.POINTER_FILE)
+        with open(pointer + ".tmp", "w") as f:
+            json.dump({"version": version}, f)
+        os.replace(pointer + ".tmp", pointer)
+        self.log.info(f"Built time series store {version} with {len(district_ids)} districts and {num_days} days, "
+                      f"queried {', '.join(results) or 'no sources'}")
+
+        for entry in os.listdir(self.directory):
+            if entry not in [version, previous] and entry.startswith("v") and \
+                    os.path.isdir(os.path.join(self.directory, entry)):
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+
+    @staticmethod
+    def _shift(data: numpy.ndarray, offset: int, num_days: int) -> numpy.ndarray:
+        """
+        :param offset: Days from the new first date to the first date of data
+        :return: Copy of data with num_days columns, starting offset days earlier
+        """
+        shifted = numpy.full((data.shape[0], num_days), numpy.nan)
+        start, end = max(offset, 0), min(offset + data.shape[1], num_days)
+        if start < end:
+            shifted[:, start:end] = data[:, start - offset:end - offset]
+        return shifted
+
+    def _read_meta(self, version: str) -> Optional[dict]:
+        """
+        :return: Metadata of a version, None if it can't be read or was written without source versions
+        """
+        try:
+            with open(os.path.join(self.directory, version, "meta.json"), "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if "sources" in meta else None
+
+    def _read_pointer(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.directory, self.POINTER_FILE), "r") as f:
+                return json.load(f)["version"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _load(self):
+        now = time.monotonic()
+        if self._loaded and now - self._checked < self.check_interval:
+            return self._loaded
+        self._checked = now
+
+        version = self._read_pointer()
+        if version is None:
+            return self._loaded
+
+        if self._loaded and self._loaded[0] == version:
+            return self._loaded
+
+        version_dir = os.path.join(self.directory, version)
+        try:
+            with open(os.path.join(version_dir, "meta.json"), "r") as f:
+                meta = json.load(f)
+
+            arrays = {}
+            for _, _, series in self.SOURCES:
+                for name in series:
+                    arrays[name] = numpy.load(os.path.join(version_dir, f"{name}.npy"), mmap_mode='r')
+        except (OSError, ValueError) as e:
+            self.log.warning(f"Can't load time series store {version}: {e}")
+            return self._loaded
+
+        first_date = numpy.datetime64(meta['first_date'], 'D')
+        dates = numpy.arange(first_date, first_date + meta['days'])
+        positions = {district[0]: i for i, district in enumerate(meta['districts'])}
+        self._loaded = (version, meta, arrays, dates, positions)
+        self.log.debug(f"Loaded time series store {version}")
+        return self._loaded
+
+    def get_version(self) -> Optional[str]:
+        """
+        :return: Version of the store that is read, changes with every rebuild
+        """
+        loaded = self._load()
+        return loaded[0] if loaded else None
+
+    def is_available(self, district_id: int) -> bool:
+        loaded = self._load()
+        return loaded is not None and district_id in loaded[4]
+
+    def get(self, series: str, district_id: int) -> Optional[Tuple[numpy.ndarray, numpy.ndarray]]:
+        """
+        :return: Tuple of dates and values of the series for a district, both read-only views
+        """
+        loaded = self._load()
+        if not loaded or district_id not in loaded[4]:
+            return None
+        return loaded[3], loaded[2][series][loaded[4][district_id]]
+
+    def get_district(self, district_id: int) -> Optional[Tuple[str, Optional[int]]]:
+        """
+        :return: Tuple of name and population of a district
+        """
+        loaded = self._load()
+        if not loaded or district_id not in loaded[4]:
+            return None
+        _, name, population = loaded[1]['districts'][loaded[4][district_id]]
+        return name, population
+
+    def get_hospitalisation_updated(self, district_id: int) -> Optional[datetime.datetime]:
+        loaded = self._load()
+        if not loaded:
+            return None
+        updated = loaded[1]['hospitalisation_updated'].get(str(district_id))
+        if updated:
+            return datetime.datetime.fromisoformat(updated)
+
+    def get_rows(self, series: List[str], district_id: int, since: Optional[datetime.date] = None,
+                 strict: bool = False) -> Optional[Tuple[numpy.ndarray, List[numpy.ndarray]]]:
+        """
+        Like the rows of the source table: days on which any of the series has a value, starting at since
+        :param strict: Start after since instead of at since
+        :return: Tuple of dates and a list with the values for each series
+        """
+        loaded = self._load()
+        if not loaded or district_id not in loaded[4]:
+            return None
+
+        dates = loaded[3]
+        start = 0
+        if since:
+            start = numpy.searchsorted(dates, numpy.datetime64(since, 'D'), side='right' if strict else 'left')
+        values = [loaded[2][name][loaded[4][district_id]][start:] for name in series]
+        present = numpy.zeros(len(dates) - start, dtype=bool)
+        for v in values:
+            present |= ~numpy.isnan(v)
+        return dates[start:][present], [v[present] for v in values]
+
+    @staticmethod
+    def to_dates(dates: numpy.ndarray) -> List[datetime.date]:
+        return dates.astype(object).tolist()
@@ -0,0 +1,63 @@
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Iterable, BinaryIO
+
+
+class SourceArchive:
+    """
+    Downloaded payloads of the data sources, gzip compressed and stored by content hash in a directory per source,
+    so the same payload is stored only once
+    """
+    directory: str
+    log = logging.getLogger(__name__)
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @staticmethod
+    def source_key(url: str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def get_path(self, url: str, content_hash: str) -> str:
+        return os.path.join(self.directory, self.source_key(url), f"{content_hash}.gz")
+
+    def store(self, url: str, chunks: Iterable[bytes]) -> str:
+        """
+        Writes the payload while it is downloaded
+        :return: SHA-256 of the uncompressed payload
+        """
+        source_dir = os.path.join(self.directory, self.source_key(url))
+        os.makedirs(source_dir, exist_ok=True)
+
+        content_hash = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=source_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f, gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6, mtime=0) as gz:
+                for chunk in chunks:
+                    content_hash.update(chunk)
+                    gz.write(chunk)
+
+            path = self.get_path(url, content_hash.hexdigest())
+            if os.path.isfile(path):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.log.debug(f"Archived {url} as {content_hash.hexdigest()}")
+        return content_hash.hexdigest()
+
+    def open(self, url: str, content_hash: str) -> BinaryIO:
+        """
+        :return: Uncompressed payload
+        :raises FileNotFoundError: if the payload is not archived
+        """
+        return gzip.open(self.get_path(url, content_hash), "rb")
+
+    def exists(self, url: str, content_hash: str) -> bool:
+        return os.path.isfile(self.get_path(url, content_hash))
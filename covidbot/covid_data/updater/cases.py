@@ -1,28 +1,31 @@
 import csv
 import logging
 from datetime import datetime, date, timedelta
-from typing import Optional
+from typing import Optional, List
 
+import pandas as pd
 import ujson as json
 
+from covidbot.covid_data.calculated import CalculatedCovidData
+from covidbot.covid_data.rollup import DistrictRollup
 from covidbot.covid_data.updater.districts import RKIDistrictsUpdater
 from covidbot.covid_data.updater.updater import Updater
+from covidbot.covid_data.versions import DataVersions
 
 
 class RKIKeyDataUpdater(Updater):
+    depends_on = [RKIDistrictsUpdater]
+    data_source = DataVersions.CASES
     RKI_DATA = "https://services7.arcgis.com/mOBPykOjAyBO2ZKk/arcgis/rest/services/rki_key_data_hubv/FeatureServer/0/query?where=1%3D1&objectIds=&time=&resultType=none&outFields=*&returnIdsOnly=false&returnUniqueIdsOnly=false&returnCountOnly=false&returnDistinctValues=false&cacheHint=false&orderByFields=&groupByFieldsForStatistics=&outStatistics=&having=&resultOffset=&resultRecordCount=&sqlFormat=none&f=pjson&token="
     RKI_STATUS = "https://services7.arcgis.com/mOBPykOjAyBO2ZKk/arcgis/rest/services/rki_data_status_v/FeatureServer/0/query?where=1%3D1&outFields=*&outSR=4326&f=json"
 
     log = logging.getLogger(__name__)
 
     def update(self) -> bool:
-        # First check that districts exist
-        RKIDistrictsUpdater(self.connection).update()
-
         last_update = self.get_last_update()
 
         # Do not fetch if data is from today
-        if last_update == date.today():
+        if not self.replay and last_update == date.today():
             return False
 
         # Check RKI Status
@@ -35,7 +38,7 @@ class RKIKeyDataUpdater(Updater):
             return False
 
         online_date = date.fromtimestamp(response['features'][0]['attributes']['Datum'] / 1000)
-        if last_update is not None and online_date <= last_update:
+        if not self.replay and last_update is not None and online_date <= last_update:
             return False
 
         response = self.get_resource(self.RKI_DATA)
@@ -51,9 +54,10 @@ class RKIKeyDataUpdater(Updater):
             with self.connection.cursor(dictionary=True) as cursor:
                 cursor.executemany('''INSERT INTO covid_data (rs, date, total_cases, incidence, total_deaths)
                  VALUES (%s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE rs=rs''', covid_data)
+                CalculatedCovidData(self.connection).refresh(online_date)
 
                 # Plausibility check
-                cursor.execute("SELECT * FROM covid_data_calculated WHERE county_name LIKE '%Deutschland%' ORDER BY date DESC LIMIT 1")
+                cursor.execute("SELECT * FROM covid_data_calculated WHERE rs=0 ORDER BY date DESC LIMIT 1")
                 row = cursor.fetchone()
                 if (row['new_cases'] is not None and row['new_cases'] <= 0) or (row['new_deaths'] is not None and row['new_deaths'] <= 0):
                     self.connection.rollback()
@@ -74,11 +78,14 @@ class RKIKeyDataUpdater(Updater):
 
 
 class RKIHistoryUpdater(Updater):
+    depends_on = [RKIDistrictsUpdater]
+    data_source = DataVersions.CASES
     DEATHS_URL = "https://raw.githubusercontent.com/jgehrcke/covid-19-germany-gae/master/deaths-rki-by-ags.csv"
     CASES_URL = "https://raw.githubusercontent.com/jgehrcke/covid-19-germany-gae/master/cases-rki-by-ags.csv"
     INCIDENCE_URL = "https://raw.githubusercontent.com/jgehrcke/covid-19-germany-gae/master/more-data/7di-rki-by-ags.csv"
     max_delta = 1
     min_delta = 60
+    BATCH_SIZE = 5000
     log = logging.getLogger(__name__)
 
     def get_last_update(self) -> Optional[datetime]:
@@ -89,185 +96,91 @@ class RKIHistoryUpdater(Updater):
                 return row[0]
 
     def update(self) -> bool:
-        updated = False
-        if self.update_cases():
-            self.log.info("New case data available")
-            updated = True
-
-        if self.update_deaths():
-            self.log.info("New deaths data available")
-            updated = True
-
-        if self.update_incidences():
-            self.log.info("New incidence data available")
-            updated = True
-        return updated
-
-    def calculate_aggregated_values(self, new_updated: Optional[date] = None):
-        self.log.debug("Calculating aggregated values")
-        with self.connection.cursor(dictionary=True) as cursor:
-            # Calculate all parents, must be executed for every depth
-            for i in range(2):
-                # Calculate COVID-19 Data
-                args = []
-                where_query = ""
-                if new_updated:
-                    where_query = "AND date = DATE(%s) "
-                    args = [new_updated]
-
-                cursor.execute(f'''INSERT INTO covid_data (rs, date, total_cases, total_deaths, last_update)
-                                    SELECT new.parent, new_date, new_cases, new_deaths, last_update
-                                    FROM
-                                    (SELECT c.parent as parent, date as new_date, SUM(total_cases) as new_cases,
-                                     SUM(total_deaths) as new_deaths, last_update FROM covid_data 
-                                     LEFT JOIN counties c on covid_data.rs = c.rs
-                                     WHERE c.parent IS NOT NULL {where_query}
-                                     GROUP BY c.parent, date)
-                                    as new
-                                  ON DUPLICATE KEY UPDATE 
-                                  date=new.new_date, total_cases=new.new_cases, total_deaths=new.new_deaths, 
-                                  last_update=new.last_update''',
-                               args)
-                # Calculate Incidence
-                cursor.execute('UPDATE covid_data, '
-                               '(SELECT c.parent as rs, d.date, SUM(c.population * d.incidence) / SUM(c.population) '
-                               'as incidence FROM covid_data as d '
-                               'LEFT JOIN counties c on c.rs = d.rs '
-                               'WHERE c.parent IS NOT NULL '
-                               'GROUP BY date, c.parent) as incidence '
-                               'SET covid_data.incidence = incidence.incidence '
-                               'WHERE covid_data.incidence IS NULL AND covid_data.date = incidence.date '
-                               'AND covid_data.rs = incidence.rs')
-
-    def update_cases(self) -> bool:
-        cases = self.get_resource(self.CASES_URL, True)
-        if not cases:
+        history = []
+        for url, column in [(self.CASES_URL, "total_cases"), (self.DEATHS_URL, "total_deaths"),
+                            (self.INCIDENCE_URL, "incidence")]:
+            data = self.get_history(url, column)
+            if data is not None and not data.empty:
+                self.log.info(f"New {column} data available for {data['date'].min()} to {data['date'].max()}")
+                history.append(data)
+
+        if not history:
             return False
 
-        cases_csv = csv.DictReader(cases.splitlines())
+        data = history[0]
+        for other in history[1:]:
+            data = data.merge(other, on=["rs", "date"], how="outer")
 
-        new_cases = False
-        with self.connection.cursor() as cursor:
-            for row in cases_csv:
-                updated = None
-                for field in cases_csv.fieldnames:
-                    if field[:3] == "sum":
-                        continue
-                    elif field[:4] == "time":
-                        updated = row[field]
-                        updated = date(int(updated[:4]), int(updated[5:7]), int(updated[8:10]))
-                        # To keep it in sync with fresh RKI data
-                        updated = updated + timedelta(days=1)
-                        self.log.info(f"Got historic case data for {updated}")
-                        delta = (date.today() - updated)
-                        if not (self.max_delta < delta.days < self.min_delta):
-                            self.log.info(f"Skip {updated}")
-                            break
-                        continue
-
-                    district_id = field
-                    if district_id == '11000':
-                        district_id = '11'
-
-                    if district_id == '16056':
-                        continue
-
-                    cases_num = int(row[field])
-                    cursor.execute('INSERT INTO covid_data (rs, date, total_cases) VALUE (%s, %s, %s) '
-                                   'ON DUPLICATE KEY UPDATE covid_data.total_cases=%s, covid_data.last_update=CURRENT_TIMESTAMP()',
-                                   [int(district_id), updated, cases_num, cases_num])
-                    new_cases = True
-                self.connection.commit()
-            self.calculate_aggregated_values()
-        self.connection.commit()
+        rows = []
+        for row in data.itertuples(index=False):
+            row = row._asdict()
+            rows.append((int(row['rs']), row['date'],
+                         None if pd.isna(row.get('total_cases')) else int(row['total_cases']),
+                         None if pd.isna(row.get('total_deaths')) else int(row['total_deaths']),
+                         None if pd.isna(row.get('incidence')) else float(row['incidence'])))
 
-        return new_cases
-
-    def update_deaths(self) -> bool:
-        deaths = self.get_resource(self.DEATHS_URL, True)
-        if not deaths:
-            return False
-        deaths_csv = csv.DictReader(deaths.splitlines())
-        new_deaths = False
+        since = data['date'].min()
+        self.log.debug(f"Writing {len(rows)} historic rows since {since}")
         with self.connection.cursor() as cursor:
-            for row in deaths_csv:
-                updated = None
-                for field in deaths_csv.fieldnames:
-                    if field[:3] == "sum":
-                        continue
-                    elif field[:4] == "time":
-                        updated = row[field]
-                        updated = date(int(updated[:4]), int(updated[5:7]), int(updated[8:10]))
-                        # To keep it in sync with fresh RKI data
-                        updated = updated + timedelta(days=1)
-                        self.log.info(f"Got historic deaths data for {updated}")
-                        delta = (date.today() - updated)
-                        if not (self.max_delta < delta.days < self.min_delta):
-                            self.log.info(f"Skip {updated}")
-                            break
-                        continue
-
-                    district_id = field
-                    if district_id == '11000':
-                        district_id = '11'
-
-                    if district_id == '16056':
-                        continue
-
-                    deaths_num = int(row[field])
-                    cursor.execute('INSERT INTO covid_data (rs, date, total_deaths) VALUE (%s, %s, %s) '
-                                   'ON DUPLICATE KEY UPDATE covid_data.total_deaths=%s, covid_data.last_update=CURRENT_TIMESTAMP()',
-                                   [int(district_id), updated, deaths_num, deaths_num])
-                    new_deaths = True
-                self.connection.commit()
-            self.calculate_aggregated_values()
+            # Sent as multi-row statements, columns missing in a source keep their value
+            for i in range(0, len(rows), self.BATCH_SIZE):
+                cursor.executemany('INSERT INTO covid_data (rs, date, total_cases, total_deaths, incidence) '
+                                   'VALUES (%s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE '
+                                   'total_cases=COALESCE(VALUES(total_cases), covid_data.total_cases), '
+                                   'total_deaths=COALESCE(VALUES(total_deaths), covid_data.total_deaths), '
+                                   'incidence=COALESCE(VALUES(incidence), covid_data.incidence), '
+                                   'last_update=CURRENT_TIMESTAMP()', rows[i:i + self.BATCH_SIZE])
+
+        DistrictRollup(self.connection).rollup_covid_data(since)
+
+        calculated = CalculatedCovidData(self.connection)
+        calculated.refresh(since)
+        # Historic data might have been corrected
+        calculated.refresh_threshold_crossings()
+        calculated.refresh_district_facts()
         self.connection.commit()
-
-        return new_deaths
-
-    def update_incidences(self) -> bool:
-        incidences = self.get_resource(self.INCIDENCE_URL, True)
-        if not incidences:
-            return False
-        incidences_csv = csv.DictReader(incidences.splitlines())
-
-        new_data = False
-        with self.connection.cursor() as cursor:
-            for row in incidences_csv:
-                updated = None
-                for field in incidences_csv.fieldnames:
-                    if field[:3] == "sum":
-                        continue
-                    elif field[:4] == "time":
-                        updated = row[field]
-                        updated = date(int(updated[:4]), int(updated[5:7]), int(updated[8:10]))
-                        # To keep it in sync with fresh RKI data
-                        updated = updated + timedelta(days=1)
-                        self.log.info(f"Got historic incidence data for {updated}")
-
-                        delta = (date.today() - updated)
-                        if not (self.max_delta < delta.days < self.min_delta):
-                            self.log.info(f"Skip {updated}")
-                            break
-                        continue
-
-                    district_id = field[:-4]
-                    if district_id == '11000':
-                        district_id = '11'
-
-                    if district_id == 'germany':
-                        district_id = '0'
-
-                    if district_id == '16056':
-                        continue
-
-                    incidence = float(row[field])
-
-                    cursor.execute(
-                        'INSERT INTO covid_data (rs, date, incidence) VALUE (%s, %s, %s) '
-                        'ON DUPLICATE KEY UPDATE covid_data.incidence=%s, covid_data.last_update=CURRENT_TIMESTAMP()',
-                        [int(district_id), updated, incidence, incidence])
-                    new_data = True
-                self.connection.commit()
-
-        return new_data
+        return True
+
+    def get_history(self, url: str, column: str) -> Optional[pd.DataFrame]:
+        """
+        Fetches one of the wide CSV files, with a row per day and a column per district
+        :return: DataFrame with rs, date and column for each district and day within max_delta and min_delta
+        """
+        time_index = None
+
+        def get_updated(row: List[str]) -> date:
+            # To keep it in sync with fresh RKI data
+            return date.fromisoformat(row[time_index][:10]) + timedelta(days=1)
+
+        def reread(line: str) -> bool:
+            # Rows younger than min_delta are ingested or might be corrected later, the next fetch starts with them
+            return bool(line) and (date.today() - get_updated(next(csv.reader([line])))).days < self.min_delta
+
+        lines = self.get_resource_lines(url, True, append=True, reread=reread)
+        if lines is None:
+            return None
+
+        # Only rows within the window are kept, the files contain the whole history
+        reader = csv.reader(lines)
+        fields = next(reader, [])
+        if not fields:
+            return None
+        time_index = next(i for i, field in enumerate(fields) if field[:4] == "time")
+        rows, dates = [], []
+        for row in reader:
+            if not row:
+                continue
+            updated = get_updated(row)
+            if self.max_delta < (date.today() - updated).days < self.min_delta:
+                rows.append(row)
+                dates.append(updated)
+
+        district_fields = [field for field in fields if field[:3] != "sum" and field[:4] != "time"]
+        data = pd.DataFrame(rows, columns=fields, dtype=str)
+        data['date'] = dates
+        data = data.melt(id_vars=["date"], value_vars=district_fields, var_name="rs", value_name=column)
+        data['rs'] = data['rs'].str.replace("_7di", "", regex=False)
+        data = data[data['rs'] != "16056"]
+        data['rs'] = data['rs'].replace({"11000": "11", "germany": "0"}).astype(int)
+        data[column] = pd.to_numeric(data[column])
+        return data.dropna(subset=[column])
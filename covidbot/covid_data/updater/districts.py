@@ -2,6 +2,7 @@ import logging
 from datetime import datetime
 from typing import Optional
 
+from covidbot.covid_data.rollup import DistrictRollup
 from covidbot.covid_data.updater.updater import Updater
 
 
@@ -22,5 +23,6 @@ class RKIDistrictsUpdater(Updater):
         with self.connection.cursor(dictionary=True) as cursor:
             with open(self.RKI_LK_SQL, "r") as f:
                 cursor.execute(f.read())
+        DistrictRollup(self.connection).refresh_ancestors()
         self.connection.commit()
         self.log.debug("Finished inserting county data")
\ No newline at end of file
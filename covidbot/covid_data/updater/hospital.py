@@ -1,12 +1,21 @@
 import csv
 import logging
 from datetime import datetime, timedelta
+from decimal import Decimal
 from typing import Optional
 
+from covidbot.covid_data.updater.districts import RKIDistrictsUpdater
 from covidbot.covid_data.updater.updater import Updater
+from covidbot.covid_data.versions import DataVersions
+from covidbot.utils import batched
 
 
 class HospitalisationRKIUpdater(Updater):
+    depends_on = [RKIDistrictsUpdater]
+    data_source = DataVersions.HOSPITALISATION
+    BATCH_SIZE = 5000
+    # Precision of hospitalisation.incidence
+    INCIDENCE_PRECISION = Decimal("0.01")
     log = logging.getLogger(__name__)
     URL = "https://raw.githubusercontent.com/robert-koch-institut/COVID-19-Hospitalisierungen_in_Deutschland/master/Aktuell_Deutschland_COVID-19-Hospitalisierungen.csv"
 
@@ -21,38 +30,47 @@ class HospitalisationRKIUpdater(Updater):
     def update(self) -> bool:
         last_update = self.get_last_update()
 
-        if last_update and datetime.now() - last_update < timedelta(hours=12):
+        if not self.replay and last_update and datetime.now() - last_update < timedelta(hours=12):
             return False
 
         new_data = False
-        response = self.get_resource(self.URL)
-        if response:
+        lines = self.get_resource_lines(self.URL)
+        if lines:
             self.log.debug("Got Hospitalisation Data from RKI")
-            hospital_data = response.splitlines()
-            reader = csv.DictReader(hospital_data, quoting=csv.QUOTE_NONE)
+            reader = csv.DictReader(lines, quoting=csv.QUOTE_NONE)
+
+            rows = []
+            for row in reader:
+                if row['Bundesland'] == "Bundesgebiet":
+                    row['Bundesland'] = "Deutschland"
+                district_id = self.get_district_id(row['Bundesland'])
+                if district_id is None:
+                    raise ValueError(f"No district_id for {row['Bundesland']}")
+
+                if row['7T_Hospitalisierung_Faelle'] == "NA" or row['7T_Hospitalisierung_Inzidenz'] == "NA":
+                    continue
+
+                rows.append((district_id, datetime.fromisoformat(row['Datum']), row['Altersgruppe'],
+                             row['7T_Hospitalisierung_Faelle'], row['7T_Hospitalisierung_Inzidenz']))
 
             with self.connection.cursor() as cursor:
-                for row in reader:
-                    if row['Bundesland'] == "Bundesgebiet":
-                        row['Bundesland'] = "Deutschland"
-                    district_id = self.get_district_id(row['Bundesland'])
-                    if district_id is None:
-                        raise ValueError(f"No district_id for {row['Bundesland']}")
-
-                    if row['7T_Hospitalisierung_Faelle'] == "NA" or row['7T_Hospitalisierung_Inzidenz'] == "NA":
-                        continue
-
-                    updated = datetime.fromisoformat(row['Datum'])
-                    cursor.execute("SELECT id FROM hospitalisation WHERE date = %s AND district_id=%s AND age=%s",
-                                   [updated, district_id, row['Altersgruppe']])
-                    data_id = cursor.fetchone()
-                    if data_id:
-                        cursor.execute("UPDATE hospitalisation SET number=%s, incidence=%s, updated=CURRENT_TIMESTAMP() WHERE id=%s", [row['7T_Hospitalisierung_Faelle'], row['7T_Hospitalisierung_Inzidenz'], data_id[0]])
-                        continue
-
-                    new_data = True
-
-                    cursor.execute('INSERT INTO hospitalisation (district_id, date, age, number, incidence) VALUES (%s, %s, %s, %s, %s)',
-                                   [district_id, updated, row['Altersgruppe'], row['7T_Hospitalisierung_Faelle'], row['7T_Hospitalisierung_Inzidenz']])
+                # New and revised rows count as new data, updated is set on every fetch
+                changed = 0
+                if rows:
+                    cursor.execute('SELECT district_id, date, age, number, incidence FROM hospitalisation '
+                                   'WHERE date >= %s', [min(row[1] for row in rows)])
+                    stored = {(r[0], r[1], r[2]): (r[3], r[4]) for r in cursor.fetchall()}
+                    for district_id, day, age, number, incidence in rows:
+                        value = (int(number), Decimal(incidence).quantize(self.INCIDENCE_PRECISION))
+                        if stored.get((district_id, day.date(), age)) != value:
+                            changed += 1
+
+                for batch in batched(rows, self.BATCH_SIZE):
+                    cursor.executemany('INSERT INTO hospitalisation (district_id, date, age, number, incidence) '
+                                       'VALUES (%s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE '
+                                       'number=VALUES(number), incidence=VALUES(incidence), '
+                                       'updated=CURRENT_TIMESTAMP()', batch)
+            self.log.debug(f"Wrote {len(rows)} hospitalisation rows, {changed} changed")
+            new_data = changed > 0
             self.connection.commit()
         return new_data
@@ -1,12 +1,83 @@
 import csv
 import logging
 from datetime import datetime, timedelta, date
-from typing import Optional
+from typing import Optional, Iterator
 
+from covidbot.covid_data.rollup import DistrictRollup
+from covidbot.covid_data.updater.districts import RKIDistrictsUpdater
 from covidbot.covid_data.updater.updater import Updater
+from covidbot.covid_data.versions import DataVersions
+from covidbot.utils import batched
+
+
+class ICUGermanyHistoryUpdater(Updater):
+    depends_on = [RKIDistrictsUpdater]
+    data_source = DataVersions.ICU
+    BATCH_SIZE = 1000
+    URL = "https://diviexchange.blob.core.windows.net/%24web/zeitreihe-tagesdaten.csv"
+    log = logging.getLogger(__name__)
+
+    def get_last_update(self) -> Optional[datetime]:
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT MIN(date) FROM icu_beds")
+            row = cursor.fetchone()
+            if row:
+                return row[0]
+
+    def update(self) -> bool:
+        last_update = self.get_last_update()
+        if not self.replay and last_update is not None and last_update == date(2020, 4, 24):
+            return False
+
+        lines = self.get_resource_lines(self.URL, True, append=True)
+        if not lines:
+            return False
+
+        first_date = None
+        with self.connection.cursor(dictionary=True) as cursor:
+            for batch in batched(self.parse_rows(csv.DictReader(lines)), self.BATCH_SIZE):
+                cursor.executemany(
+                    "INSERT IGNORE INTO icu_beds (district_id, date, clear, occupied, occupied_covid,"
+                    " covid_ventilated, clear_children, occupied_children) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                    batch)
+                batch_date = min(row[1] for row in batch)
+                if first_date is None or batch_date < first_date:
+                    first_date = batch_date
+
+        # Calculate aggregated values for states and Germany
+        if first_date:
+            DistrictRollup(self.connection).rollup_icu_beds(first_date)
+        self.connection.commit()
+        return True
+
+    @staticmethod
+    def parse_rows(reader: csv.DictReader) -> Iterator[list]:
+        key_district_id = "gemeindeschluessel"
+        key_covid_ventilated = "faelle_covid_aktuell_invasiv_beatmet"
+        key_covid = "faelle_covid_aktuell"
+
+        for row in reader:
+            # Berlin is here AGS = 11000
+            if row[key_district_id] == '11000':
+                row[key_district_id] = '11'
+
+            if key_covid_ventilated:
+                num_ventilated = row[key_covid_ventilated]
+            else:
+                num_ventilated = None
+
+            if key_covid:
+                num_covid = row[key_covid]
+            else:
+                num_covid = None
+
+            yield [row[key_district_id], row['date'], row['betten_frei_nur_erwachsen'], row['betten_belegt_nur_erwachsen'],
+                   num_covid, num_ventilated, int(row['betten_frei']) - int(row['betten_frei_nur_erwachsen']), int(row['betten_belegt']) - int(row['betten_belegt_nur_erwachsen'])]
 
 
 class ICUGermanyUpdater(Updater):
+    depends_on = [RKIDistrictsUpdater, ICUGermanyHistoryUpdater]
+    data_source = DataVersions.ICU
     log = logging.getLogger(__name__)
     URL = "https://diviexchange.blob.core.windows.net/%24web/DIVI_Intensivregister_Auszug_pro_Landkreis.csv"
 
@@ -20,7 +91,7 @@ class ICUGermanyUpdater(Updater):
     def update(self) -> bool:
         last_update = self.get_last_update()
 
-        if last_update and datetime.now() - last_update < timedelta(hours=12):
+        if not self.replay and last_update and datetime.now() - last_update < timedelta(hours=12):
             return False
 
         response = self.get_resource(self.URL)
@@ -41,84 +112,10 @@ class ICUGermanyUpdater(Updater):
                     cursor.execute("INSERT IGNORE INTO icu_beds (district_id, date, clear, occupied, occupied_covid,"
                                    " covid_ventilated, occupied_children, clear_children) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", row)
 
-                # Calculate aggregated values for states
-                for i in range(2):
-                    cursor.execute(
-                        "INSERT IGNORE INTO icu_beds (district_id, date, clear, occupied, occupied_covid, covid_ventilated, occupied_children, clear_children, updated) "
-                        "SELECT c.parent, date, SUM(clear), SUM(occupied), SUM(occupied_covid), "
-                        "SUM(covid_ventilated), SUM(occupied_children), SUM(clear_children), updated FROM icu_beds "
-                        "INNER JOIN counties c on c.rs = icu_beds.district_id "
-                        "GROUP BY c.parent, date "
-                        "HAVING (COUNT(c.parent) = (SELECT COUNT(*) FROM counties WHERE parent=c.parent) OR c.parent > 0) AND parent IS NOT NULL")
+            # Calculate aggregated values for states and Germany
+            if results:
+                DistrictRollup(self.connection).rollup_icu_beds(min(row[1] for row in results))
             self.connection.commit()
             if last_update != self.get_last_update():
                 return True
         return False
-
-
-class ICUGermanyHistoryUpdater(Updater):
-    URL = "https://diviexchange.blob.core.windows.net/%24web/zeitreihe-tagesdaten.csv"
-    log = logging.getLogger(__name__)
-
-    def get_last_update(self) -> Optional[datetime]:
-        with self.connection.cursor() as cursor:
-            cursor.execute("SELECT MIN(date) FROM icu_beds")
-            row = cursor.fetchone()
-            if row:
-                return row[0]
-
-    def update(self) -> bool:
-        last_update = self.get_last_update()
-        if last_update is not None and last_update == date(2020, 4, 24):
-            return False
-
-        new_data = False
-
-        data = self.get_resource(self.URL, True)
-        if not data:
-            return new_data
-
-        reader = csv.DictReader(data.splitlines())
-
-        with self.connection.cursor(dictionary=True) as cursor:
-            results = []
-
-            key_district_id = "gemeindeschluessel"
-            key_covid_ventilated = "faelle_covid_aktuell_invasiv_beatmet"
-            key_covid = "faelle_covid_aktuell"
-
-            for row in reader:
-                # Berlin is here AGS = 11000
-                if row[key_district_id] == '11000':
-                    row[key_district_id] = '11'
-
-                if key_covid_ventilated:
-                    num_ventilated = row[key_covid_ventilated]
-                else:
-                    num_ventilated = None
-
-                if key_covid:
-                    num_covid = row[key_covid]
-                else:
-                    num_covid = None
-
-                row_contents = [row[key_district_id], row['date'], row['betten_frei_nur_erwachsen'], row['betten_belegt_nur_erwachsen'],
-                                num_covid, num_ventilated, int(row['betten_frei']) - int(row['betten_frei_nur_erwachsen']), int(row['betten_belegt']) - int(row['betten_belegt_nur_erwachsen'])]
-                results.append(row_contents)
-
-            cursor.executemany(
-                "INSERT IGNORE INTO icu_beds (district_id, date, clear, occupied, occupied_covid,"
-                " covid_ventilated, clear_children, occupied_children) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", results)
-
-            # Calculate aggregated values for states
-            for i in range(2):
-                cursor.execute(
-                    "INSERT IGNORE INTO icu_beds (district_id, date, clear, occupied, occupied_covid, covid_ventilated, occupied_children, clear_children, updated) "
-                    "SELECT c.parent, date, SUM(clear), SUM(occupied), SUM(occupied_covid), "
-                    "SUM(covid_ventilated), SUM(occupied_children), SUM(clear_children), updated FROM icu_beds "
-                    "INNER JOIN counties c on c.rs = icu_beds.district_id "
-                    "GROUP BY c.parent, date "
-                    "HAVING (COUNT(c.parent) = (SELECT COUNT(*) FROM counties WHERE parent=c.parent) OR c.parent > 0) AND parent IS NOT NULL")
-            self.connection.commit()
-            new_data = True
-        return new_data
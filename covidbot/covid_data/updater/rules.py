@@ -4,10 +4,14 @@ from typing import Optional
 
 import ujson as json
 
+from covidbot.covid_data.updater.districts import RKIDistrictsUpdater
 from covidbot.covid_data.updater.updater import Updater
+from covidbot.covid_data.versions import DataVersions
 
 
 class RulesGermanyUpdater(Updater):
+    depends_on = [RKIDistrictsUpdater]
+    data_source = DataVersions.RULES
     log = logging.getLogger(__name__)
     URL = "https://tourismus-wegweiser.de/json/"
 
@@ -20,7 +24,7 @@ class RulesGermanyUpdater(Updater):
 
     def update(self) -> bool:
         last_update = self.get_last_update()
-        if last_update and datetime.now() - last_update < timedelta(hours=12):
+        if not self.replay and last_update and datetime.now() - last_update < timedelta(hours=12):
             return False
 
         new_data = False
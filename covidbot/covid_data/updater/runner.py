@@ -0,0 +1,135 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import List, Type, Optional, Callable, Dict
+
+from mysql.connector import MySQLConnection
+
+from covidbot.covid_data.updater.updater import Updater
+from covidbot.database import ConnectionPool, PooledConnection
+
+
+@dataclass
+class UpdaterResult:
+    updater: Type[Updater]
+    updated: bool = False
+    duration: float = 0.0
+    error: Optional[Exception] = None
+    skipped: bool = False
+    failed_dependency: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return self.updater.__name__
+
+
+class UpdaterRunner:
+    """
+    Runs updaters concurrently, each with its own connection. An updater is started as soon as all updaters it
+    depends_on finished successfully, dependencies are added if they were not requested.
+    """
+    updaters: List[Type[Updater]]
+    max_workers: int
+    log = logging.getLogger(__name__)
+
+    def __init__(self, connect: Callable[[], MySQLConnection], updaters: List[Type[Updater]],
+                 max_workers: Optional[int] = None):
+        """
+        :param connect: Creates a new connection, with autocommit disabled
+        :param updaters: Updaters to run
+        :param max_workers: Number of updaters running at the same time, defaults to all
+        """
+        self.connect = connect
+        self.updaters = self.resolve(updaters)
+        self.max_workers = max_workers or len(self.updaters)
+
+    @staticmethod
+    def resolve(updaters: List[Type[Updater]]) -> List[Type[Updater]]:
+        """
+        :return: Updaters and their dependencies, each after its dependencies
+        :raises ValueError: if dependencies are circular
+        """
+        ordered = []
+        visiting = set()
+
+        def visit(updater: Type[Updater]):
+            if updater in ordered:
+                return
+            if updater in visiting:
+                raise ValueError(f"Circular dependency on {updater.__name__}")
+            visiting.add(updater)
+            for dependency in updater.depends_on:
+                visit(dependency)
+            visiting.remove(updater)
+            ordered.append(updater)
+
+        for u in updaters:
+            visit(u)
+        return ordered
+
+    def run(self) -> List[UpdaterResult]:
+        """
+        :return: Result of each updater, in the order they were resolved
+        """
+        results: Dict[Type[Updater], UpdaterResult] = {u: UpdaterResult(u) for u in self.updaters}
+        pool = ConnectionPool(self.connect, size=self.max_workers, autocommit=False)
+        try:
+            # Creating updaters sets up the tables, which should not happen concurrently
+            instances = {}
+            for updater in self.updaters:
+                try:
+                    instances[updater] = updater(PooledConnection(pool))
+                except Exception as e:
+                    results[updater].error = e
+
+            pending = list(self.updaters)
+            running = {}
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="updater") as executor:
+                while pending or running:
+                    for updater in list(pending):
+                        dependencies = [results[d] for d in updater.depends_on]
+                        failed = [d for d in dependencies if d.error or d.skipped]
+                        if results[updater].error or failed:
+                            if not results[updater].error:
+                                results[updater].skipped = True
+                                results[updater].failed_dependency = failed[0].failed_dependency or failed[0].name
+                            pending.remove(updater)
+                        elif all(d.updater not in running and d.updater not in pending for d in dependencies):
+                            running[updater] = executor.submit(self._run_updater, instances[updater],
+                                                               results[updater])
+                            pending.remove(updater)
+
+                    if running:
+                        done, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+                        running = {u: f for u, f in running.items() if f not in done}
+        finally:
+            pool.close()
+
+        for result in results.values():
+            if result.skipped:
+                self.log.warning(f"{result.name} skipped, {result.failed_dependency} failed")
+            elif result.error:
+                self.log.warning(f"{result.name} failed after {result.duration:.1f}s: {result.error}")
+            else:
+                self.log.info(f"{result.name} finished after {result.duration:.1f}s, "
+                              f"{'new data' if result.updated else 'no new data'}")
+        return list(results.values())
+
+    def _run_updater(self, updater: Updater, result: UpdaterResult) -> None:
+        start = time.monotonic()
+        try:
+            result.updated = bool(updater.update())
+            if result.updated:
+                updater.bump_data_version()
+        except Exception as e:
+            self.log.exception(f"Exception happened on Data Update with {result.name}: {e}", exc_info=e)
+            result.error = e
+            try:
+                updater.connection.rollback()
+            except Exception:
+                pass
+        finally:
+            result.duration = time.monotonic() - start
+            # Hand the connection of this thread back to the pool
+            updater.connection.close()
@@ -3,10 +3,14 @@ import logging
 from datetime import datetime, date
 from typing import Optional
 
+from covidbot.covid_data.updater.districts import RKIDistrictsUpdater
 from covidbot.covid_data.updater.updater import Updater
+from covidbot.covid_data.versions import DataVersions
 
 
 class RValueGermanyUpdater(Updater):
+    depends_on = [RKIDistrictsUpdater]
+    data_source = DataVersions.R_VALUE
     log = logging.getLogger(__name__)
     URL = "https://raw.githubusercontent.com/robert-koch-institut/SARS-CoV-2-Nowcasting_und_-R-Schaetzung/main/" \
           "Nowcast_R_aktuell.csv"
@@ -22,55 +26,55 @@ class RValueGermanyUpdater(Updater):
 
     def update(self) -> bool:
         last_update = self.get_last_update()
-        if last_update and last_update.date() == date.today():
+        if not self.replay and last_update and last_update.date() == date.today():
             return False
 
         new_data = False
-        response = self.get_resource(self.URL)
+        lines = self.get_resource_lines(self.URL)
 
-        if response:
+        if lines:
             self.log.debug("Got R-Value Data")
 
-            rki_data = response.splitlines()
-            reader = csv.DictReader(rki_data, delimiter=',', )
+            reader = csv.DictReader(lines, delimiter=',', )
             district_id = self.get_district_id("Deutschland")
             if district_id is None:
                 raise ValueError("No district_id for Deutschland")
 
-            with self.connection.cursor() as cursor:
-                for row in reader:
-                    # RKI appends Erläuterungen to Data
-                    if row['Datum'] == 'Erläuterung':
-                        break
+            rows = []
+            for row in reader:
+                # RKI appends Erläuterungen to Data
+                if row['Datum'] == 'Erläuterung':
+                    break
 
-                    if row['Datum'] == '':
-                        continue
+                if row['Datum'] == '':
+                    continue
 
-                    if self.R_VALUE_7DAY_CSV_KEY not in row:
-                        if self.R_VALUE_7DAY_CSV_KEY_ALT not in row:
-                            raise ValueError(f"{self.R_VALUE_7DAY_CSV_KEY} is not in CSV!")
-                        r_value = row[self.R_VALUE_7DAY_CSV_KEY_ALT]
-                    else:
-                        r_value = row[self.R_VALUE_7DAY_CSV_KEY]
+                if self.R_VALUE_7DAY_CSV_KEY not in row:
+                    if self.R_VALUE_7DAY_CSV_KEY_ALT not in row:
+                        raise ValueError(f"{self.R_VALUE_7DAY_CSV_KEY} is not in CSV!")
+                    r_value = row[self.R_VALUE_7DAY_CSV_KEY_ALT]
+                else:
+                    r_value = row[self.R_VALUE_7DAY_CSV_KEY]
 
-                    if not r_value:
-                        continue
-                    else:
-                        r_value = float(r_value)
+                if not r_value:
+                    continue
+                else:
+                    r_value = float(r_value)
 
-                    try:
-                        r_date = datetime.strptime(row['Datum'], "%Y-%m-%d").date()
-                    except ValueError as e:
-                        self.log.error(f"Could not get date of string {row['Datum']}", exc_info=e)
-                        continue
+                try:
+                    r_date = datetime.strptime(row['Datum'], "%Y-%m-%d").date()
+                except ValueError as e:
+                    self.log.error(f"Could not get date of string {row['Datum']}", exc_info=e)
+                    continue
 
-                    cursor.execute("SELECT id FROM covid_r_value WHERE district_id=%s AND r_date=%s",
-                                   [district_id, r_date])
-                    if cursor.fetchone():
-                        continue
+                rows.append((district_id, r_date, r_value, datetime.now()))
 
-                    new_data = True
-                    cursor.execute("INSERT INTO covid_r_value (district_id, r_date, `7day_r_value`, updated) "
-                                   "VALUES (%s, %s, %s, %s)", [district_id, r_date, r_value, datetime.now()])
+            # Nowcasted values are corrected later on, unchanged rows are not affected
+            with self.connection.cursor() as cursor:
+                cursor.executemany("INSERT INTO covid_r_value (district_id, r_date, `7day_r_value`, updated) "
+                                   "VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE "
+                                   "updated=IF(`7day_r_value` <=> VALUES(`7day_r_value`), updated, VALUES(updated)), "
+                                   "`7day_r_value`=VALUES(`7day_r_value`)", rows)
+                new_data = cursor.rowcount > 0
             self.connection.commit()
         return new_data
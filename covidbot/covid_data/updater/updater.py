@@ -1,18 +1,93 @@
+import hashlib
+import itertools
 import logging
 import random
+import threading
+import time
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List, Type, Tuple, Iterator, Dict, Callable
 
 import requests
 from mysql.connector import MySQLConnection
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from covidbot.covid_data.covid_data import CovidDatabaseCreator
+from covidbot.covid_data.updater.archive import SourceArchive
+from covidbot.covid_data.search_index import collate
+from covidbot.covid_data.versions import DataVersions
+from covidbot.metrics import UNRESOLVED_DISTRICT_NAMES
+
+# Connect and read timeout in seconds
+HTTP_TIMEOUT = (10, 120)
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_district_names: Optional['DistrictNames'] = None
+_district_names_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """
+    :return: Session shared by all updaters, retrying failed requests
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504],
+                          raise_on_status=False)
+            adapter = HTTPAdapter(max_retries=retry, pool_maxsize=10)
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+class DistrictNames:
+    """
+    Names of counties and their alternative names, shared by the updaters of a process
+    """
+    CHECK_INTERVAL = 60
+    signature: tuple
+    checked: float
+
+    def __init__(self, signature: tuple, counties: List[Tuple[int, str]], alt_names: List[Tuple[int, str]]):
+        self.signature = signature
+        self.checked = time.monotonic()
+        self.counties = [(rs, name, collate(name)) for rs, name in counties]
+        self.alt_names = [(rs, name, collate(name)) for rs, name in alt_names]
+        self._resolved: Dict[str, Optional[int]] = {}
+
+    def resolve(self, district_name: str) -> Optional[int]:
+        if district_name not in self._resolved:
+            key = collate(district_name)
+            district_id = None
+            for names in [self.counties, self.alt_names]:
+                rows = [(rs, name) for rs, name, collated in names if key in collated]
+                if len(rows) == 1:
+                    district_id = rows[0][0]
+                else:
+                    district_id = next((rs for rs, name in rows if name == district_name), None)
+
+                if district_id is not None:
+                    break
+            self._resolved[district_name] = district_id
+        return self._resolved[district_name]
 
 
 class Updater(ABC):
     connection: MySQLConnection
     log: logging.Logger
+    # Updaters that have to run before, used by UpdaterRunner
+    depends_on: List[Type['Updater']] = []
+    # Bytes compared before appended data is read
+    TAIL_SIZE = 4096
+    # Archive for the payloads of all updaters, unchanged payloads are not ingested again
+    archive: Optional[SourceArchive] = None
+    # URLs mapped to the archived payloads that are ingested instead of fetching them
+    replay: Dict[str, str] = {}
+    # Source in data_versions of the data written by the updater
+    data_source: Optional[str] = None
 
     def __init__(self, conn: MySQLConnection):
         self.connection = conn
@@ -20,54 +95,327 @@ class Updater(ABC):
         CovidDatabaseCreator(self.connection)
 
     def get_resource(self, url: str, force=False) -> Optional[str]:
+        """
+        Fetches url, unless it was not modified since the last fetch
+        :param force: Fetch without conditional headers
+        :return: Response body or None if not modified
+        """
+        response = self._request(url, force)
+        if response is not None:
+            return response.text
+
+    def get_resource_lines(self, url: str, force=False, append=False,
+                           reread: Optional[Callable[[str], bool]] = None) -> Optional[Iterator[str]]:
+        """
+        Like get_resource, but the body is decoded while it is downloaded
+        :param append: The resource only grows at the end, only the header and lines added since the last completely
+        read response are returned
+        :param reread: In append mode, lines from the first one it returns True for on are returned again next time
+        :return: Generator of the lines of the body or None if not modified
+        """
+        if append:
+            return self._get_appended_lines(url, force, reread)
+
+        response = self._request(url, force, stream=True)
+        if response is None:
+            return None
+
+        if response.encoding is None:
+            response.encoding = "utf-8"
+        return self._iter_lines(response)
+
+    @staticmethod
+    def _iter_lines(response: requests.Response) -> Iterator[str]:
+        try:
+            for line in response.iter_lines(chunk_size=64 * 1024, decode_unicode=True):
+                yield line
+        finally:
+            response.close()
+
+    def _get_appended_lines(self, url: str, force: bool,
+                            reread: Optional[Callable[[str], bool]]) -> Optional[Iterator[str]]:
+        # Byte offsets refer to the file, so it must not be compressed for the transfer
+        headers = {"Accept-Encoding": "identity"}
+        length, tail_hash, header = self.get_append_state(url)
+        if length and tail_hash and header is not None:
+            start = max(length - self.TAIL_SIZE, 0)
+            response = self._request(url, force, stream=True, headers={**headers, "Range": f"bytes={start}-"})
+            if response is None:
+                return None
+
+            if response.status_code == 206:
+                chunks = response.iter_content(chunk_size=64 * 1024)
+                tail, rest = b"", b""
+                for chunk in chunks:
+                    tail += chunk
+                    if len(tail) >= length - start:
+                        tail, rest = tail[:length - start], tail[length - start:]
+                        break
+
+                if hashlib.sha1(tail).hexdigest() == tail_hash:
+                    self.log.debug(f"Reading {url} from byte {length}")
+                    return self._iter_appended(url, response, itertools.chain([rest], chunks), reread, length, tail,
+                                               header)
+                self.log.info(f"{url} changed before byte {length}, fetching it completely")
+            elif response.status_code == 200:
+                # Range is not supported
+                return self._iter_appended(url, response, response.iter_content(chunk_size=64 * 1024), reread)
+            response.close()
+            force = True
+
+        response = self._request(url, force, stream=True, headers=headers)
+        if response is None:
+            return None
+        return self._iter_appended(url, response, response.iter_content(chunk_size=64 * 1024), reread)
+
+    def _iter_appended(self, url: str, response: requests.Response, chunks: Iterator[bytes],
+                       reread: Optional[Callable[[str], bool]] = None, offset: int = 0, tail: bytes = b"",
+                       header: Optional[str] = None) -> Iterator[str]:
+        """
+        Yields header and the lines in chunks, stores offset and tail of the last complete line once all were read,
+        or of the first line reread returned True for
+        """
+        encoding = response.encoding or "utf-8"
+        resume = None
+        try:
+            if header is not None:
+                yield header
+
+            pending = b""
+            for chunk in chunks:
+                lines = (pending + chunk).split(b"\n")
+                pending = lines.pop()
+                for raw in lines:
+                    line = raw.rstrip(b"\r").decode(encoding)
+                    if header is None:
+                        header = line
+                    elif resume is None and reread and reread(line):
+                        resume = offset, tail
+                    offset += len(raw) + 1
+                    tail = (tail + raw + b"\n")[-self.TAIL_SIZE:]
+                    yield line
+
+            # Incomplete last line is read again next time
+            if pending:
+                yield pending.rstrip(b"\r").decode(encoding)
+
+            if resume:
+                offset, tail = resume
+            self.set_append_state(url, offset, hashlib.sha1(tail).hexdigest(), header)
+        finally:
+            response.close()
+
+    def _request(self, url: str, force: bool, stream: bool = False,
+                 headers: Optional[Dict[str, str]] = None) -> Optional[requests.Response]:
+        if url in self.replay:
+            self.log.info(f"Ingesting archived payload {self.replay[url]} of {url}")
+            return self._open_archived(url, self.replay[url])
+
         header = {"User-Agent": "CovidBot (https://github.com/eknoes/covid-bot | https://covidbot.d-64.org)"}
-        last_update = self.get_last_update()
-        if not force and last_update:
-            # need to use our own day/month, as locale can't be changed on the fly and we have to ensure not asking for
-            # Mär in March
-            day = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"][last_update.weekday()]
-            month = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-            month = month[last_update.month - 1]
-            header["If-Modified-Since"] = day + ", " + last_update.strftime(f'%d {month} %Y %H:%M:%S GMT')
+        if headers:
+            header.update(headers)
+        if not force:
+            etag, last_modified = self.get_validators(url)
+            if etag:
+                header["If-None-Match"] = etag
+            if last_modified:
+                header["If-Modified-Since"] = last_modified
+
+            last_update = self.get_last_update()
+            if not etag and not last_modified and last_update:
+                # need to use our own day/month, as locale can't be changed on the fly and we have to ensure not
+                # asking for Mär in March
+                day = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"][last_update.weekday()]
+                month = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+                month = month[last_update.month - 1]
+                header["If-Modified-Since"] = day + ", " + last_update.strftime(f'%d {month} %Y %H:%M:%S GMT')
 
         self.log.debug(f"Requesting url {url}")
-        response = requests.get(url, headers=header)
+        response = get_http_session().get(url, headers=header, timeout=HTTP_TIMEOUT, stream=stream)
 
-        if response.status_code == 200:
-            return response.text
-        elif response.status_code == 304:
+        if response.status_code in [200, 206]:
+            self.set_validators(url, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+            if response.status_code == 200 and self.archive:
+                return self._archive_response(url, response)
+            return response
+
+        if response.status_code == 416 and "Range" in header:
+            # File got shorter
+            return response
+
+        response.close()
+        if response.status_code == 304:
             self.log.info("HTTP304: No new data available")
         else:
             raise ValueError(f"Updater Response Status Code is {response.status_code}: {response.reason}\n{url}")
 
+    def _archive_response(self, url: str, response: requests.Response) -> Optional[requests.Response]:
+        """
+        Archives the body before it is read by the updater
+        :return: Response reading the archived body or None if it was ingested last time
+        """
+        try:
+            content_hash = self.archive.store(url, response.iter_content(chunk_size=64 * 1024))
+        finally:
+            response.close()
+
+        if content_hash == self.get_ingested_payload(url):
+            self.log.info(f"Payload of {url} did not change since it was ingested")
+            return None
+        return self._open_archived(url, content_hash, response)
+
+    def _open_archived(self, url: str, content_hash: str,
+                       response: Optional[requests.Response] = None) -> requests.Response:
+        archived = requests.Response()
+        archived.status_code = 200
+        archived.url = url
+        archived.raw = self.archive.open(url, content_hash)
+        if response is not None:
+            archived.headers = response.headers
+            archived.encoding = response.encoding
+        self.add_ingested_payload(url, content_hash)
+        return archived
+
+    def get_ingested_payload(self, url: str) -> Optional[str]:
+        """
+        :return: Content hash of the payload of url ingested last
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT content_hash FROM source_payloads WHERE url_hash=%s ORDER BY id DESC LIMIT 1",
+                           [hashlib.sha1(url.encode("utf-8")).hexdigest()])
+            row = cursor.fetchone()
+            if row:
+                return row[0]
+
+    def add_ingested_payload(self, url: str, content_hash: str) -> None:
+        """
+        Not committed, like set_validators
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute("INSERT INTO source_payloads (url_hash, url, content_hash) VALUES (%s, %s, %s)",
+                           [hashlib.sha1(url.encode("utf-8")).hexdigest(), url, content_hash])
+
+    @staticmethod
+    def get_archived_payloads(connection: MySQLConnection, content_hashes: List[str]) -> Dict[str, str]:
+        """
+        :return: URL of each payload mapped to its content hash
+        :raises ValueError: if a payload was never ingested
+        """
+        payloads = {}
+        with connection.cursor() as cursor:
+            for content_hash in content_hashes:
+                cursor.execute("SELECT url FROM source_payloads WHERE content_hash=%s LIMIT 1", [content_hash])
+                row = cursor.fetchone()
+                if not row:
+                    raise ValueError(f"No payload with hash {content_hash} was ingested")
+                payloads[row[0]] = content_hash
+        return payloads
+
+    @classmethod
+    def uses_url(cls, url: str) -> bool:
+        return url in vars(cls).values()
+
+    def get_validators(self, url: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        :return: ETag and Last-Modified header of the last response for url
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT etag, last_modified FROM http_resources WHERE url_hash=%s",
+                           [hashlib.sha1(url.encode("utf-8")).hexdigest()])
+            row = cursor.fetchone()
+            if row:
+                return row[0], row[1]
+        return None, None
+
+    def set_validators(self, url: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        """
+        Stores the validators of a response. Not committed, so they are only kept if the updater commits the data
+        it got from the response.
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute("INSERT INTO http_resources (url_hash, url, etag, last_modified) VALUES (%s, %s, %s, %s) "
+                           "ON DUPLICATE KEY UPDATE etag=VALUES(etag), last_modified=VALUES(last_modified), "
+                           "updated=NOW()",
+                           [hashlib.sha1(url.encode("utf-8")).hexdigest(), url, etag, last_modified])
+
+    def get_append_state(self, url: str) -> Tuple[Optional[int], Optional[str], Optional[str]]:
+        """
+        :return: Length, hash of the last TAIL_SIZE bytes and header line of the last completely read response
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT length, tail_hash, header FROM http_resources WHERE url_hash=%s",
+                           [hashlib.sha1(url.encode("utf-8")).hexdigest()])
+            row = cursor.fetchone()
+            if row:
+                return row[0], row[1], row[2]
+        return None, None, None
+
+    def set_append_state(self, url: str, length: int, tail_hash: str, header: Optional[str]) -> None:
+        """
+        Not committed, like set_validators
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute("INSERT INTO http_resources (url_hash, url, length, tail_hash, header) "
+                           "VALUES (%s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE length=VALUES(length), "
+                           "tail_hash=VALUES(tail_hash), header=VALUES(header), updated=NOW()",
+                           [hashlib.sha1(url.encode("utf-8")).hexdigest(), url, length, tail_hash, header])
+
     @abstractmethod
     def update(self) -> bool:
         pass
 
+    def bump_data_version(self) -> None:
+        """
+        Tells readers like Visualization that the data of data_source changed. Has to be called after the data was
+        committed, otherwise they might keep what they derived from the old data under the new version.
+        Commits.
+        """
+        if not self.data_source:
+            return
+        DataVersions.bump(self.connection, self.data_source)
+        self.connection.commit()
+
     @abstractmethod
     def get_last_update(self) -> Optional[datetime]:
         pass
 
     def get_district_id(self, district_name: str) -> Optional[int]:
-        with self.connection.cursor() as cursor:
-            cursor.execute('SELECT rs, county_name FROM counties WHERE county_name LIKE %s',
-                           ["%" + district_name + "%"])
-            rows = cursor.fetchall()
-            if rows:
-                if len(rows) == 1:
-                    return rows[0][0]
+        """
+        Resolves a name like LIKE '%district_name%' on counties and then county_alt_names, an exact match wins if
+        several districts match. The names are loaded once per process and reloaded if counties or county_alt_names
+        changed, which is checked on unknown names and every DistrictNames.CHECK_INTERVAL seconds.
+        """
+        global _district_names
+        with _district_names_lock:
+            now = time.monotonic()
+            if _district_names is None or now - _district_names.checked >= DistrictNames.CHECK_INTERVAL:
+                _district_names = self._load_district_names(_district_names)
 
-                for row in rows:
-                    if row[1] == district_name:
-                        return row[0]
+            district_id = _district_names.resolve(district_name)
+            if district_id is None and _district_names.checked != now:
+                _district_names = self._load_district_names(_district_names)
+                district_id = _district_names.resolve(district_name)
 
-            cursor.execute('SELECT district_id, alt_name FROM county_alt_names WHERE alt_name LIKE %s',
-                           [f'%{district_name}%'])
-            rows = cursor.fetchall()
-            if rows:
-                if len(rows) == 1:
-                    return rows[0][0]
+        if district_id is None:
+            UNRESOLVED_DISTRICT_NAMES.inc()
+            self.log.warning(f"Can't resolve district name {district_name}")
+        return district_id
+
+    def _load_district_names(self, current: Optional[DistrictNames]) -> DistrictNames:
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT (SELECT COUNT(*) FROM counties), '
+                           '(SELECT SUM(CRC32(CONCAT_WS(\'|\', rs, county_name))) FROM counties), '
+                           '(SELECT COUNT(*) FROM county_alt_names), '
+                           '(SELECT SUM(CRC32(CONCAT_WS(\'|\', district_id, alt_name))) FROM county_alt_names)')
+            signature = cursor.fetchone()
+            if current and current.signature == signature:
+                current.checked = time.monotonic()
+                return current
+
+            self.log.debug("Loading district names")
+            cursor.execute('SELECT rs, county_name FROM counties')
+            counties = cursor.fetchall()
+            cursor.execute('SELECT district_id, alt_name FROM county_alt_names')
+            alt_names = cursor.fetchall()
+        return DistrictNames(signature, counties, alt_names)
 
-                for row in rows:
-                    if row[1] == district_name:
-                        return row[0]
@@ -1,17 +1,19 @@
 import io
 import logging
-from datetime import datetime, timedelta
-from typing import Optional
+from datetime import datetime, timedelta, date
+from typing import Optional, Dict, List
 
 import numpy
 import pandas as pd
 
 from covidbot.covid_data.updater.districts import RKIDistrictsUpdater
 from covidbot.covid_data.updater.updater import Updater
-from covidbot.utils import date_range
+from covidbot.covid_data.versions import DataVersions
 
 
 class VaccinationGermanyUpdater(Updater):
+    depends_on = [RKIDistrictsUpdater]
+    data_source = DataVersions.VACCINATIONS
     log = logging.getLogger(__name__)
     URL = "https://raw.githubusercontent.com/robert-koch-institut/COVID-19-Impfungen_in_Deutschland/master/Aktuell_Deutschland_Bundeslaender_COVID-19-Impfungen.csv"
 
@@ -31,89 +33,92 @@ class VaccinationGermanyUpdater(Updater):
         if district_id is None:
             raise ValueError("No district_id for Deutschland")
 
-        if last_update and datetime.now() - last_update < timedelta(hours=12):
+        if not self.replay and last_update and datetime.now() - last_update < timedelta(hours=12):
             return False
 
-        # Make sure population exists
-        RKIDistrictsUpdater(self.connection).update()
-
         response = self.get_resource(self.URL)
         if response:
             self.log.debug("Got Vaccination Data from RKI")
             data = pd.read_csv(io.StringIO(response), parse_dates=["Impfdatum"])
 
-            population = {d_id: None for d_id in range(1, 17)}
             with self.connection.cursor() as cursor:
-                max_date = data['Impfdatum'].max().date()
                 cursor.execute("SELECT MAX(date) FROM covid_vaccinations")
                 row = cursor.fetchone()
-                if row[0] is None:
+                # Archived payloads are ingested again to correct the stored data
+                if row[0] is None or self.replay:
                     min_date = data['Impfdatum'].min().date()
                 else:
                     min_date = row[0]
 
-                cursor.execute("SELECT population FROM counties WHERE rs=0")
-                fed_population = cursor.fetchone()[0]
-
-                for date in date_range(start_date=min_date + timedelta(days=1), end_date=max_date + timedelta(days=1)):
-                    current_data = data.query("Impfdatum <= @date").groupby(['BundeslandId_Impfort', 'Impfserie', 'Impfstoff']).sum()
-                    if current_data.empty:
-                        continue
+                cursor.execute("SELECT rs, population FROM counties WHERE rs <= 16")
+                population = {row[0]: row[1] for row in cursor.fetchall()}
 
+                rows = self.calculate_rows(data, min_date, population)
+                if rows:
                     new_data = True
-                    self.log.info(f"Got new vaccination data for {date}")
-                    for district_id in range(1, 17):
-                        doses_diff = int(data.query("Impfdatum == @date and BundeslandId_Impfort == @district_id")[['Anzahl']].sum())
-
-                        district_data = current_data.query(f"BundeslandId_Impfort == @district_id")
-
-                        if not population[district_id]:
-                            cursor.execute('SELECT population FROM counties WHERE rs=%s', [district_id])
-                            population[district_id] = cursor.fetchone()[0]
-                            if not population[district_id]:
-                                self.log.warning(f"Can't fetch population for {district_id}")
-                                continue
-
-                        district_partial = int(district_data.query("Impfserie == 1").sum())
-                        district_full = int(district_data.query("Impfserie == 2").sum() + district_data.query("Impfserie == 1 and Impfstoff == 'Janssen'").sum())
-                        district_booster = int(district_data.query("Impfserie == 3").sum())
-
-                        rate_partial = district_partial / population[district_id]
-                        rate_full = district_full / population[district_id]
-                        rate_booster = district_booster / population[district_id]
-
-                        cursor.execute('INSERT INTO covid_vaccinations (district_id, date, vaccinated_partial, '
+                    self.log.info(f"Got new vaccination data for {rows[0][1]} to {rows[-1][1]}")
+                    cursor.executemany('INSERT INTO covid_vaccinations (district_id, date, vaccinated_partial, '
                                        'vaccinated_full, vaccinated_booster, rate_partial, rate_full, rate_booster, '
-                                       'doses_diff) VALUE (%s, %s, %s, %s, %s, %s, %s, %s, %s)',
-                                       [district_id, date,
-                                        district_partial, district_full, district_booster,
-                                        rate_partial, rate_full, rate_booster,
-                                        int(doses_diff)])
-
-                    # Federal data
-                    fed_data = current_data.groupby(['Impfserie']).sum()
-
-                    fed_partial, fed_full, fed_booster = 0, 0, 0
-                    if 1 in fed_data.index:
-                        fed_partial = int(fed_data.at[1, 'Anzahl'])
-                    if 2 in fed_data.index:
-                        # Janssen is counted as partial and full vaccination, but as a single dose
-                        fed_full = int(fed_data.at[2, 'Anzahl']) + \
-                                   int(data.query("Impfdatum <= @date and Impfstoff == 'Janssen' and Impfserie == 1")[['Anzahl']].sum())
-                    if 3 in fed_data.index:
-                        fed_booster = int(fed_data.at[3, 'Anzahl'])
-
-                    fed_doses = int(data.query("Impfdatum == @date")[['Anzahl']].sum())
-
-                    cursor.execute('INSERT INTO covid_vaccinations (district_id, date, vaccinated_partial, '
-                                   'vaccinated_full, vaccinated_booster, rate_partial, rate_full, rate_booster, '
-                                   'doses_diff) VALUE (%s, %s, %s, %s, %s, %s, %s, %s, %s)',
-                                   [0, date,
-                                    fed_partial,
-                                    fed_full,
-                                    fed_booster,
-                                    fed_partial / fed_population, fed_full / fed_population, fed_booster / fed_population,
-                                    fed_doses])
+                                       'doses_diff) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) '
+                                       'ON DUPLICATE KEY UPDATE vaccinated_partial=VALUES(vaccinated_partial), '
+                                       'vaccinated_full=VALUES(vaccinated_full), '
+                                       'vaccinated_booster=VALUES(vaccinated_booster), '
+                                       'rate_partial=VALUES(rate_partial), rate_full=VALUES(rate_full), '
+                                       'rate_booster=VALUES(rate_booster), doses_diff=VALUES(doses_diff)', rows)
 
             self.connection.commit()
         return new_data
+
+    @classmethod
+    def calculate_rows(cls, data: pd.DataFrame, since: date, population: Dict[int, int]) -> List[tuple]:
+        """
+        Calculates the cumulated vaccinations of the states and Germany for each day after since in one pass
+        :param data: Vaccinations per day, state, vaccine and series as published by RKI
+        :param population: Population of Germany (0) and the states
+        :return: Rows for covid_vaccinations, ordered by date
+        """
+        days = pd.date_range(data['Impfdatum'].min(), data['Impfdatum'].max())
+        series = data['Impfserie']
+        # Janssen is counted as partial and full vaccination, but as a single dose
+        data = data.assign(partial=data['Anzahl'].where(series == 1, 0),
+                           full=data['Anzahl'].where((series == 2) |
+                                                     ((series == 1) & (data['Impfstoff'] == 'Janssen')), 0),
+                           booster=data['Anzahl'].where(series == 3, 0),
+                           second_doses=(series == 2).astype(int))
+        columns = ['partial', 'full', 'booster', 'Anzahl']
+
+        daily = data.pivot_table(index='Impfdatum', columns='BundeslandId_Impfort', values=columns, aggfunc='sum',
+                                 fill_value=0)
+        daily = daily.reindex(index=days, columns=pd.MultiIndex.from_product([columns, range(1, 17)]), fill_value=0)
+        totals = daily.cumsum()
+
+        fed_daily = data.groupby('Impfdatum')[columns + ['second_doses']].sum().reindex(days, fill_value=0)
+        fed_totals = fed_daily.cumsum()
+        # Germany has no full vaccinations before the first second dose
+        fed_totals.loc[fed_totals['second_doses'] == 0, 'full'] = 0
+
+        selected = days.date > since
+        dates = days.date[selected]
+        rows = []
+        for district_id in range(1, 17):
+            if not population.get(district_id):
+                cls.log.warning(f"Can't fetch population for {district_id}")
+                continue
+
+            values = [totals[(column, district_id)][selected] for column in columns[:3]]
+            rows.append(cls._to_rows(district_id, dates, values, daily[('Anzahl', district_id)][selected],
+                                      population[district_id]))
+
+        values = [fed_totals[column][selected] for column in columns[:3]]
+        rows.append(cls._to_rows(0, dates, values, fed_daily['Anzahl'][selected], population[0]))
+
+        # Same order as a day by day calculation
+        return [row for day_rows in zip(*rows) for row in day_rows]
+
+    @staticmethod
+    def _to_rows(district_id: int, dates: numpy.ndarray, values: List[pd.Series], doses: pd.Series,
+                 population: int) -> List[tuple]:
+        partial, full, booster = [v.to_numpy(dtype=numpy.int64).tolist() for v in values]
+        return [(district_id, day, partial[i], full[i], booster[i], partial[i] / population, full[i] / population,
+                 booster[i] / population, doses_diff)
+                for i, (day, doses_diff) in enumerate(zip(dates, doses.to_numpy(dtype=numpy.int64).tolist()))]
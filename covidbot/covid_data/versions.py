@@ -0,0 +1,63 @@
+import logging
+import threading
+import time
+from typing import Optional, Dict
+
+from mysql.connector import MySQLConnection
+
+
+class DataVersions:
+    """
+    Current version of the data of each source in data_versions, increased by the updaters after they committed new
+    data. Readers can check whether something derived from the data is still current without reading the data.
+    All versions are read with one query, at most every check_interval seconds.
+    """
+    CASES = "cases"
+    ICU = "icu"
+    VACCINATIONS = "vaccinations"
+    HOSPITALISATION = "hospitalisation"
+    R_VALUE = "r_value"
+    RULES = "rules"
+    connection: MySQLConnection
+    check_interval: float
+    log = logging.getLogger(__name__)
+
+    def __init__(self, connection: MySQLConnection, check_interval: float = 5.0):
+        self.connection = connection
+        self.check_interval = check_interval
+        self._versions: Dict[str, int] = {}
+        self._checked = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def bump(connection: MySQLConnection, source: str) -> None:
+        """
+        Marks the data of a source as changed.
+        Does not commit.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('INSERT INTO data_versions (source, version) VALUES (%s, 1) '
+                           'ON DUPLICATE KEY UPDATE version=version+1, updated=CURRENT_TIMESTAMP()', [source])
+
+    def get(self, source: str) -> Optional[int]:
+        """
+        :return: Current version of the data of source, None if it is unknown
+        """
+        return self.get_all().get(source)
+
+    def get_all(self) -> Dict[str, int]:
+        """
+        :return: Current versions of all known sources
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._checked is None or now - self._checked >= self.check_interval:
+                self._checked = now
+                try:
+                    with self.connection.cursor() as cursor:
+                        cursor.execute('SELECT source, version FROM data_versions')
+                        self._versions = {row[0]: row[1] for row in cursor.fetchall()}
+                except Exception as e:
+                    self.log.warning(f"Can't read data versions: {e}")
+                    self._versions = {}
+            return dict(self._versions)
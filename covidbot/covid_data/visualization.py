@@ -2,32 +2,50 @@ import datetime
 import logging
 import math
 import os
-from functools import reduce
 from typing import Optional, Tuple, List
 
 import matplotlib.dates as mdates
-import matplotlib.pyplot as plt
+import matplotlib.image
 import matplotlib.ticker
+import numpy
 from matplotlib import gridspec
 from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.cbook import get_sample_data
 from matplotlib.figure import Figure
 from matplotlib.offsetbox import OffsetImage, AnnotationBbox
 from mysql.connector import MySQLConnection
+from PIL import Image
 
 from covidbot import utils
+from covidbot.covid_data.graph_cache import GraphCache
+from covidbot.covid_data.timeseries import TimeSeriesStore
+from covidbot.covid_data.versions import DataVersions
 from covidbot.metrics import CACHED_GRAPHS, CREATED_GRAPHS
 from covidbot.utils import format_int, format_float
 
 
 class Visualization:
+    # Part of the cache keys, increase it if the look of the graphs changes
+    GRAPH_VERSION = 1
     connection: MySQLConnection
+    timeseries: Optional[TimeSeriesStore]
+    graph_cache: GraphCache
+    data_versions: Optional[DataVersions]
     graphics_dir: str
     log = logging.getLogger(__name__)
     disable_cache: bool
-
-    def __init__(self, connection: MySQLConnection, directory: str, disable_cache: bool = False) -> None:
+    _logo: Optional[numpy.ndarray] = None
+
+    def __init__(self, connection: MySQLConnection, directory: str, disable_cache: bool = False,
+                 timeseries: Optional[TimeSeriesStore] = None, cache_bytes: Optional[int] = None,
+                 memory_bytes: int = 0) -> None:
+        """
+        :param cache_bytes: Size of the graphs kept in directory, defaults to GraphCache.DEFAULT_MAX_BYTES
+        :param memory_bytes: Size of the recently read graphs kept in memory
+        """
         self.connection = connection
+        self.timeseries = timeseries
         if not os.path.exists(directory):
             os.makedirs(directory)
         if not os.path.isdir(directory):
@@ -35,87 +53,141 @@ class Visualization:
 
         self.graphics_dir = directory
         self.disable_cache = disable_cache
-
-    @staticmethod
-    def setup_plot(current_date: Optional[datetime.date], title: str, y_label: str,
+        self.graph_cache = GraphCache(directory, cache_bytes, memory_bytes)
+        self.data_versions = DataVersions(connection) if connection else None
+
+    @classmethod
+    def get_logo(cls) -> numpy.ndarray:
+        # Decoded once per process, the figures only read it
+        if cls._logo is None:
+            with get_sample_data(os.path.abspath('resources/d64-logo.png')) as logo:
+                arr_img = matplotlib.image.imread(logo, format='png')
+            arr_img.flags.writeable = False
+            cls._logo = arr_img
+        return cls._logo
+
+    @classmethod
+    def setup_plot(cls, current_date: Optional[datetime.date], title: str, y_label: str,
                    source: str = "Robert-Koch-Institut", quadratic: bool = False) -> Tuple[Figure, Axes]:
         figsize = (8, 5)
         if quadratic:
             figsize = (8, 8)
 
-        fig = plt.figure(figsize=figsize, dpi=200)
+        # Own figure and canvas for each graph, pyplot keeps global state and is not thread-safe
+        fig = Figure(figsize=figsize, dpi=200)
+        FigureCanvasAgg(fig)
+        fig.subplots_adjust(bottom=0.2)
         gs = gridspec.GridSpec(15, 3)
 
+        # The footer is placed in the cells of the bottom row, but without axes of its own
+        def footer_position(cell, x: float, y: float) -> Tuple[float, float]:
+            bbox = cell.get_position(fig)
+            return bbox.x0 + x * bbox.width, bbox.y0 + y * bbox.height
+
         if current_date:
-            # Second subplot just for Source and current date
-            ax2 = fig.add_subplot(gs[14, 0])
-            plt.axis('off')
-            ax2.annotate("Stand: {date}\nQuelle: {source}"
-                         .format(date=current_date.strftime("%d.%m.%Y"), source=source),
-                         color="#6e6e6e",
-                         xy=(0, -4.5), xycoords='axes fraction',
-                         horizontalalignment='left',
-                         verticalalignment='bottom')
-
-        # Third subplot for Link
-        ax3 = fig.add_subplot(gs[14:, 1])
-        plt.axis('off')
-
-        ax3.annotate("Tägliche Updates:\n"
-                     "https://covidbot.d-64.org",
-                     color="#6e6e6e",
-                     xy=(0, -4.5), xycoords='axes fraction',
-                     horizontalalignment='left',
-                     verticalalignment='bottom')
-
-        # 4th subplot for Logo
-        ax4 = fig.add_subplot(gs[14:, 2])
-        plt.axis('off')
-
-        # Annotate the 2nd position with D64 logo
-        with get_sample_data(os.path.abspath('resources/d64-logo.png')) as logo:
-            arr_img = plt.imread(logo, format='png')
-
-        imagebox = OffsetImage(arr_img, zoom=0.3)
-        imagebox.image.axes = ax4
-
-        ab = AnnotationBbox(imagebox, xy=(0, 0), frameon=False, xybox=(1, -2.5), xycoords='axes fraction',
-                            box_alignment=(1, 1))
-
-        ax4.add_artist(ab)
+            # Source and current date
+            fig.text(*footer_position(gs[14, 0], 0, -4.5),
+                     "Stand: {date}\nQuelle: {source}".format(date=current_date.strftime("%d.%m.%Y"), source=source),
+                     color="#6e6e6e", horizontalalignment='left', verticalalignment='bottom')
+
+        # Link
+        fig.text(*footer_position(gs[14:, 1], 0, -4.5),
+                 "Tägliche Updates:\n"
+                 "https://covidbot.d-64.org",
+                 color="#6e6e6e", horizontalalignment='left', verticalalignment='bottom')
+
+        # D64 logo
+        imagebox = OffsetImage(cls.get_logo(), zoom=0.3)
+        ab = AnnotationBbox(imagebox, xy=(0, 0), frameon=False, xybox=footer_position(gs[14:, 2], 1, -2.5),
+                            xycoords='figure fraction', box_alignment=(1, 1))
+        fig.add_artist(ab)
 
         ax1 = fig.add_subplot(gs[:14, :])
 
         # Set title and labels
         fig.suptitle(title, fontweight="bold")
-        plt.ylabel(y_label)
+        ax1.set_ylabel(y_label)
 
         # Styling
         for direction in ["left", "right", "bottom", "top"]:
             ax1.spines[direction].set_visible(False)
-        plt.grid(axis="y", zorder=0)
+        ax1.grid(axis="y", zorder=0)
         fig.patch.set_facecolor("#eeeeee")
         ax1.patch.set_facecolor("#eeeeee")
-        fig.subplots_adjust(bottom=0.2)
 
         # Ticks also on right side
         ax1.tick_params(axis="y", labelleft=True, labelright=True, grid_color="#666666")
 
+        # The locators of the graphs create the x ticks when drawn, they copy the labels of the first tick
+        for label in ax1.get_xticklabels():
+            label.set_rotation(30)
+            label.set_horizontalalignment('right')
+
         return fig, ax1
 
     @staticmethod
-    def teardown_plt(figure: Figure):
-        figure.clf()
-        plt.close(figure)
+    def save_plot(fig: Figure, filepath: str):
+        # Encode the JPEG ourselves, Figure.savefig changes rcParams for JPEGs which races with other threads
+        fig.canvas.draw()
+        Image.fromarray(numpy.asarray(fig.canvas.buffer_rgba())).convert("RGB") \
+            .save(filepath, format="JPEG", dpi=(fig.dpi, fig.dpi))
+
+    def get_current_graph(self, graph_type: str, source: str, *args) -> Tuple[Optional[Tuple[str, str]],
+                                                                              Optional[str]]:
+        """
+        Looks up a graph by the current version of its data, so a cached graph costs no query of the data
+        :param source: Source of the data in DataVersions
+        :param args: Arguments of the graph
+        :return: Alias of the graph and the path of the cached graph, None if the data has to be read
+        """
+        version = self.data_versions.get(source) if self.data_versions else None
+        if version is None:
+            return None, None
+
+        # The time series store is rebuilt after the data changed, and most graphs start relative to today
+        store_version = self.timeseries.get_version() if self.timeseries else None
+        alias = (GraphCache.get_key(graph_type, self.GRAPH_VERSION, *args),
+                 f"{source}-{version}-{store_version}-{datetime.date.today().isoformat()}")
+        if self.disable_cache:
+            return alias, None
+        return alias, self.graph_cache.get_alias(alias[0], alias[1], graph_type)
+
+    def get_cached_graph(self, graph_type: str, *data, alias: Optional[Tuple[str, str]] = None) \
+            -> Tuple[str, Optional[str]]:
+        """
+        :param data: Everything shown in the graph
+        :param alias: Alias from get_current_graph, pointed to the graph
+        :return: Cache key and the path of the cached graph, None if it has to be rendered
+        """
+        key = GraphCache.get_key(graph_type, self.GRAPH_VERSION, *data)
+        if self.disable_cache:
+            return key, None
+
+        filepath = self.graph_cache.get(key, graph_type)
+        if filepath and alias:
+            self.graph_cache.set_alias(alias[0], alias[1], key)
+        return key, filepath
+
+    def store_graph(self, fig: Figure, key: str, graph_type: str, alias: Optional[Tuple[str, str]] = None) -> str:
+        return self.graph_cache.store(key, graph_type, lambda filepath: self.save_plot(fig, filepath), alias)
+
+    def read_graph(self, filepath: str) -> bytes:
+        return self.graph_cache.read(filepath)
 
     def infections_graph(self, district_id: int, duration: int = 49, quadratic=False) -> str:
+        # Without reading the data if it did not change
+        alias, filepath = self.get_current_graph("infections", DataVersions.CASES, district_id, duration, quadratic)
+        if filepath:
+            CACHED_GRAPHS.labels(type='infections').inc()
+            return filepath
+
         district_name, current_date, x_data, y_data = self._get_covid_data("new_cases", district_id, duration)
 
-        filepath = os.path.abspath(
-            os.path.join(self.graphics_dir, f"infections-{current_date.isoformat()}-{district_id}-{duration}.jpg"))
+        key, filepath = self.get_cached_graph("infections", district_name, current_date, x_data, y_data, duration,
+                                              quadratic, alias=alias)
 
         # Do not draw new graphic if its cached
-        if not self.disable_cache and os.path.isfile(filepath):
+        if filepath:
             CACHED_GRAPHS.labels(type='infections').inc()
             return filepath
         CREATED_GRAPHS.labels(type='infections').inc()
@@ -123,8 +195,7 @@ class Visualization:
         fig, ax1 = self.setup_plot(current_date, f"Neuinfektionen {district_name}", "Neuinfektionen",
                                    quadratic=quadratic)
         # Plot data
-        plt.xticks(x_data, rotation='30', ha='right')
-        bars = plt.bar(x_data, y_data, color="#1fa2de", width=0.8, zorder=3)
+        bars = ax1.bar(x_data, y_data, color="#1fa2de", width=0.8, zorder=3)
         props = dict(boxstyle='round', facecolor='#ffffff', alpha=0.7, edgecolor='#ffffff')
 
         # Add a label every 7 days
@@ -143,35 +214,47 @@ class Visualization:
             self.set_monthly_formatter(ax1)
 
         # Save to file
-        plt.savefig(filepath, format='JPEG')
-        self.teardown_plt(fig)
-        return filepath
+        return self.store_graph(fig, key, "infections", alias)
 
     def vaccination_speed_graph(self, district_id: int, duration: int = 49, quadratic=False) -> str:
-        with self.connection.cursor(dictionary=True) as cursor:
-            oldest_date = datetime.date.today() - datetime.timedelta(days=duration)
-            cursor.execute('SELECT c.county_name as name, date, doses_diff FROM covid_vaccinations '
-                           'LEFT JOIN counties c on c.rs = covid_vaccinations.district_id '
-                           'WHERE district_id=%s AND date > %s ORDER BY date', [district_id, oldest_date])
-            x_data = []
-            y_data = []
-            current_date = None
-            district_name = None
-            for row in cursor.fetchall():
-                if row['doses_diff'] is None:
-                    row['doses_diff'] = 0
-                y_data.append(row['doses_diff'])
-                x_data.append(row['date'])
-                if not current_date or row['date'] > current_date:
-                    current_date = row['date']
-                    district_name = row['name']
+        # Without reading the data if it did not change
+        alias, filepath = self.get_current_graph("vaccination-speed", DataVersions.VACCINATIONS, district_id, duration,
+                                                 quadratic)
+        if filepath:
+            CACHED_GRAPHS.labels(type='vaccination-speed').inc()
+            return filepath
 
-        filepath = os.path.abspath(
-            os.path.join(self.graphics_dir,
-                         f"vaccination-speed-{current_date.isoformat()}-{district_id}-{duration}.jpg"))
+        oldest_date = datetime.date.today() - datetime.timedelta(days=duration)
+        if self.timeseries and self.timeseries.is_available(district_id):
+            dates, values = self.timeseries.get_rows(["doses_diff", "vaccinated_partial", "vaccinated_full",
+                                                      "vaccinated_booster"], district_id, oldest_date, strict=True)
+            x_data = TimeSeriesStore.to_dates(dates)
+            y_data = numpy.nan_to_num(values[0]).tolist()
+            district_name = self.timeseries.get_district(district_id)[0]
+            current_date = x_data[-1] if x_data else None
+        else:
+            with self.connection.cursor(dictionary=True) as cursor:
+                cursor.execute('SELECT c.county_name as name, date, doses_diff FROM covid_vaccinations '
+                               'LEFT JOIN counties c on c.rs = covid_vaccinations.district_id '
+                               'WHERE district_id=%s AND date > %s ORDER BY date', [district_id, oldest_date])
+                x_data = []
+                y_data = []
+                current_date = None
+                district_name = None
+                for row in cursor.fetchall():
+                    if row['doses_diff'] is None:
+                        row['doses_diff'] = 0
+                    y_data.append(row['doses_diff'])
+                    x_data.append(row['date'])
+                    if not current_date or row['date'] > current_date:
+                        current_date = row['date']
+                        district_name = row['name']
+
+        key, filepath = self.get_cached_graph("vaccination-speed", district_name, current_date, x_data, y_data,
+                                              quadratic, alias=alias)
 
         # Do not draw new graphic if its cached
-        if not self.disable_cache and os.path.isfile(filepath):
+        if filepath:
             CACHED_GRAPHS.labels(type='vaccination-speed').inc()
             return filepath
         CREATED_GRAPHS.labels(type='vaccination-speed').inc()
@@ -179,10 +262,9 @@ class Visualization:
         fig, ax1 = self.setup_plot(current_date, f"Impfungen {district_name}", "Verimpfte Dosen",
                                    quadratic=quadratic)
         # Plot data
-        plt.xticks(x_data, rotation='30', ha='right')
 
         # Add a label every 7 days
-        bars = plt.bar(x_data, y_data, color="#1fa2de", width=0.8, zorder=3)
+        bars = ax1.bar(x_data, y_data, color="#1fa2de", width=0.8, zorder=3)
         props = dict(boxstyle='round', facecolor='#ffffff', alpha=0.7, edgecolor='#ffffff')
         for i in range(len(bars) - 1, 0, -7):
             rect = bars[i]
@@ -196,16 +278,14 @@ class Visualization:
         self.set_weekday_formatter(ax1, current_date.weekday())
 
         # Save to file
-        plt.savefig(filepath, format='JPEG')
-        self.teardown_plt(fig)
-        return filepath
+        return self.store_graph(fig, key, "vaccination-speed", alias)
 
     def bot_user_graph(self) -> str:
         now = datetime.datetime.now()
         quarter = math.floor(now.hour / 4)
-        filepath = os.path.abspath(
-            os.path.join(self.graphics_dir, f"botuser-{now.strftime(f'%Y-%m-%d-{quarter}')}.jpg"))
-        if not self.disable_cache and os.path.isfile(filepath):
+        # Redrawn every four hours without looking at the data
+        key, filepath = self.get_cached_graph("botuser", now.strftime(f'%Y-%m-%d-{quarter}'))
+        if filepath:
             CACHED_GRAPHS.labels(type='botuser').inc()
             return filepath
         CREATED_GRAPHS.labels(type='botuser').inc()
@@ -237,104 +317,113 @@ class Visualization:
 
             fig, ax1 = self.setup_plot(None, f"Nutzer:innen des Covidbots", "Anzahl")
             # Plot data
-            plt.xticks(x_data, rotation='30', ha='right')
             ax1.fill_between(x_data, y_data, color="#1fa2de", zorder=3)
 
             self.set_monthly_formatter(ax1)
 
             # Save to file
-            plt.savefig(filepath, format='JPEG')
-            self.teardown_plt(fig)
-            return filepath
+            return self.store_graph(fig, key, "botuser")
 
     def vaccination_graph(self, district_id: int) -> str:
-        with self.connection.cursor(dictionary=True) as cursor:
-            cursor.execute(
-                "SELECT vaccinated_partial, vaccinated_full, vaccinated_booster, date FROM covid_vaccinations WHERE district_id=%s ORDER BY date",
-                [district_id])
+        # Without reading the data if it did not change
+        alias, filepath = self.get_current_graph("vaccinations", DataVersions.VACCINATIONS, district_id)
+        if filepath:
+            CACHED_GRAPHS.labels(type='vaccinations').inc()
+            return filepath
 
-            y_data_booster = []
-            y_data_full = []
-            y_data_partial = []
-            x_data = []
-            for row in cursor.fetchall():
-                if not row['vaccinated_partial']:
-                    row['vaccinated_partial'] = 0
+        if self.timeseries and self.timeseries.is_available(district_id):
+            dates, values = self.timeseries.get_rows(["vaccinated_partial", "vaccinated_full", "vaccinated_booster"],
+                                                     district_id)
+            x_data = TimeSeriesStore.to_dates(dates)
+            series = []
+            for v in values:
+                v = numpy.nan_to_num(v)
+                # Values must not decrease, except for the first two ones
+                if len(v) > 2:
+                    v = numpy.concatenate([v[:1], numpy.maximum.accumulate(v[1:])])
+                series.append(v.tolist())
+            y_data_partial, y_data_full, y_data_booster = series
+        else:
+            with self.connection.cursor(dictionary=True) as cursor:
+                cursor.execute(
+                    "SELECT vaccinated_partial, vaccinated_full, vaccinated_booster, date FROM covid_vaccinations WHERE district_id=%s ORDER BY date",
+                    [district_id])
 
-                if not row['vaccinated_full']:
-                    row['vaccinated_full'] = 0
+                y_data_booster = []
+                y_data_full = []
+                y_data_partial = []
+                x_data = []
+                for row in cursor.fetchall():
+                    if not row['vaccinated_partial']:
+                        row['vaccinated_partial'] = 0
 
-                if not row['vaccinated_booster']:
-                    row['vaccinated_booster'] = 0
+                    if not row['vaccinated_full']:
+                        row['vaccinated_full'] = 0
 
-                if len(y_data_partial) > 1 and y_data_partial[-1] > row['vaccinated_partial']:
-                    row['vaccinated_partial'] = y_data_partial[-1]
+                    if not row['vaccinated_booster']:
+                        row['vaccinated_booster'] = 0
 
-                if len(y_data_full) > 1 and y_data_full[-1] > row['vaccinated_full']:
-                    row['vaccinated_full'] = y_data_full[-1]
+                    if len(y_data_partial) > 1 and y_data_partial[-1] > row['vaccinated_partial']:
+                        row['vaccinated_partial'] = y_data_partial[-1]
 
-                if len(y_data_booster) > 1 and y_data_booster[-1] > row['vaccinated_booster']:
-                    row['vaccinated_booster'] = y_data_booster[-1]
+                    if len(y_data_full) > 1 and y_data_full[-1] > row['vaccinated_full']:
+                        row['vaccinated_full'] = y_data_full[-1]
 
-                y_data_partial.append(row['vaccinated_partial'])
-                y_data_full.append(row['vaccinated_full'])
-                y_data_booster.append(row['vaccinated_booster'])
+                    if len(y_data_booster) > 1 and y_data_booster[-1] > row['vaccinated_booster']:
+                        row['vaccinated_booster'] = y_data_booster[-1]
 
-                x_data.append(row['date'])
+                    y_data_partial.append(row['vaccinated_partial'])
+                    y_data_full.append(row['vaccinated_full'])
+                    y_data_booster.append(row['vaccinated_booster'])
 
-            filepath = os.path.abspath(
-                os.path.join(self.graphics_dir, f"vaccinations-{x_data[-1].isoformat()}-{district_id}.jpg"))
+                    x_data.append(row['date'])
 
-            # Do not draw new graphic if its cached
-            if not self.disable_cache and os.path.isfile(filepath):
-                CACHED_GRAPHS.labels(type='vaccinations').inc()
-                return filepath
-            CREATED_GRAPHS.labels(type='vaccinations').inc()
+        district_name, population = self._get_district(district_id)
+        key, filepath = self.get_cached_graph("vaccinations", district_name, population, x_data, y_data_partial,
+                                              y_data_full, y_data_booster, alias=alias)
 
-            cursor.execute("SELECT county_name, population FROM counties WHERE rs=%s", [district_id])
-            row = cursor.fetchone()
-            district_name = row['county_name']
-            population = row['population']
+        # Do not draw new graphic if its cached
+        if filepath:
+            CACHED_GRAPHS.labels(type='vaccinations').inc()
+            return filepath
+        CREATED_GRAPHS.labels(type='vaccinations').inc()
 
-            source = "Robert-Koch-Institut"
-            fig, ax1 = self.setup_plot(x_data[-1], f"Impfungen {district_name}", "Anzahl Impfungen", source=source)
-            # Plot data
-            plt.xticks(x_data, rotation='30', ha='right')
-            ax1.fill_between(x_data, y_data_partial, color="#1fa2de", zorder=3, label="Erstimpfungen")
-
-            i = 0
-            while y_data_full[i] == 0:
-                i += 1
-            ax1.fill_between(x_data[i:], y_data_full[i:], color="#384955", zorder=3, label="Vollständige Erstimmunisierung")
-
-            i = 0
-            while y_data_booster[i] == 0:
-                i += 1
-            ax1.fill_between(x_data[i:], y_data_booster[i:], color="#9DCCED", zorder=3, label="Auffrischungsimpfungen")
-
-            ax1.legend(loc="upper left")
-
-            # One tick every 7 days for easier comparison
-            if len(x_data) < 120:
-                formatter = mdates.DateFormatter("%a, %d.%m.")
-                ax1.xaxis.set_major_locator(mdates.WeekdayLocator(byweekday=x_data[-1].weekday()))
-                ax1.xaxis.set_major_formatter(formatter)
-            else:
-                self.set_monthly_formatter(ax1)
-            ax1.yaxis.set_major_formatter(self.tick_formatter_german_numbers)
+        source = "Robert-Koch-Institut"
+        fig, ax1 = self.setup_plot(x_data[-1], f"Impfungen {district_name}", "Anzahl Impfungen", source=source)
+        # Plot data
+        ax1.fill_between(x_data, y_data_partial, color="#1fa2de", zorder=3, label="Erstimpfungen")
+
+        i = 0
+        while y_data_full[i] == 0:
+            i += 1
+        ax1.fill_between(x_data[i:], y_data_full[i:], color="#384955", zorder=3, label="Vollständige Erstimmunisierung")
 
-            secaxy = ax1.secondary_yaxis('right', functions=(lambda x: x / population * 100, lambda x: x * population / 100))
-            secaxy.set_ylabel('Anteil der Bevölkerung')
-            for direction in ["left", "right", "bottom", "top"]:
-                secaxy.spines[direction].set_visible(False)
-            secaxy.yaxis.set_major_formatter(lambda x, y: f'{int(x)}%')
+        i = 0
+        while y_data_booster[i] == 0:
+            i += 1
+        ax1.fill_between(x_data[i:], y_data_booster[i:], color="#9DCCED", zorder=3, label="Auffrischungsimpfungen")
 
-            ax1.tick_params(axis="y", labelright=False)
+        ax1.legend(loc="upper left")
 
-            # Save to file
-            plt.savefig(filepath, format='JPEG')
-            self.teardown_plt(fig)
-            return filepath
+        # One tick every 7 days for easier comparison
+        if len(x_data) < 120:
+            formatter = mdates.DateFormatter("%a, %d.%m.")
+            ax1.xaxis.set_major_locator(mdates.WeekdayLocator(byweekday=x_data[-1].weekday()))
+            ax1.xaxis.set_major_formatter(formatter)
+        else:
+            self.set_monthly_formatter(ax1)
+        ax1.yaxis.set_major_formatter(self.tick_formatter_german_numbers)
+
+        secaxy = ax1.secondary_yaxis('right', functions=(lambda x: x / population * 100, lambda x: x * population / 100))
+        secaxy.set_ylabel('Anteil der Bevölkerung')
+        for direction in ["left", "right", "bottom", "top"]:
+            secaxy.spines[direction].set_visible(False)
+        secaxy.yaxis.set_major_formatter(lambda x, y: f'{int(x)}%')
+
+        ax1.tick_params(axis="y", labelright=False)
+
+        # Save to file
+        return self.store_graph(fig, key, "vaccinations", alias)
 
     def multi_incidence_graph(self, district_ids: List[int], duration: int = 49) -> Optional[str]:
         if not district_ids:
@@ -343,6 +432,12 @@ class Visualization:
         data = []
         district_ids.sort()
 
+        # Without reading the data if it did not change
+        alias, filepath = self.get_current_graph("multi-incidence", DataVersions.CASES, district_ids, duration)
+        if filepath:
+            CACHED_GRAPHS.labels(type='incidence').inc()
+            return filepath
+
         # Source: https://matplotlib.org/stable/gallery/lines_bars_and_markers/linestyles.html
         line_styles = [
             'solid', 'dotted', 'dashed', 'dashdot', (0, (5, 1)), (0, (3, 1, 1, 1)), (0, (3, 1, 1, 1, 1, 1))]
@@ -365,14 +460,10 @@ class Visualization:
                 max_y = max(y_data + [max_y])
 
         current_date = data[0].get('date')
-        identifier = reduce(lambda x, y: x + y, map(str, district_ids))
-
-        filepath = os.path.abspath(
-            os.path.join(self.graphics_dir,
-                         f"multi-incidence-{current_date.isoformat()}-duration-{duration}-{identifier}.jpg"))
+        key, filepath = self.get_cached_graph("multi-incidence", current_date, data, alias=alias)
 
         # Do not draw new graphic if its cached
-        if not self.disable_cache and os.path.isfile(filepath):
+        if filepath:
             CACHED_GRAPHS.labels(type='incidence').inc()
             return filepath
         CREATED_GRAPHS.labels(type='incidence').inc()
@@ -381,16 +472,15 @@ class Visualization:
 
         x_data = data[0].get('x')
         # Plot data
-        plt.xticks(x_data, rotation='30', ha='right')
 
         # Sort for legend, highest at first
         data.sort(key=lambda element: element.get('y')[-1], reverse=True)
         for d in data:
-            plt.plot(d.get('x'), d.get('y'), linestyle=d.get('linestyle'), color=d.get('linecolor'), zorder=3,
+            ax1.plot(d.get('x'), d.get('y'), linestyle=d.get('linestyle'), color=d.get('linecolor'), zorder=3,
                      linewidth=1, label=d.get('name'))
 
         # Add legend
-        plt.legend(loc="lower left")
+        ax1.legend(loc="lower left")
 
         ax1.set_ylim(bottom=0)
 
@@ -398,27 +488,30 @@ class Visualization:
         self.set_weekday_formatter(ax1, current_date.weekday())
 
         # Save to file
-        plt.savefig(filepath, format='JPEG')
-        self.teardown_plt(fig)
-        return filepath
+        return self.store_graph(fig, key, "multi-incidence", alias)
 
     def incidence_graph(self, district_id: int, duration: int = 49) -> str:
+        # Without reading the data if it did not change
+        alias, filepath = self.get_current_graph("incidence", DataVersions.CASES, district_id, duration)
+        if filepath:
+            CACHED_GRAPHS.labels(type='incidence').inc()
+            return filepath
+
         district_name, current_date, x_data, y_data = self._get_covid_data("incidence", district_id, duration)
-        filepath = os.path.abspath(
-            os.path.join(self.graphics_dir, f"incidence-{current_date.isoformat()}-{district_id}-{duration}.jpg"))
+        key, filepath = self.get_cached_graph("incidence", district_name, current_date, x_data, y_data, duration,
+                                              alias=alias)
 
         # Do not draw new graphic if its cached
-        if not self.disable_cache and os.path.isfile(filepath):
+        if filepath:
             CACHED_GRAPHS.labels(type='incidence').inc()
             return filepath
         CREATED_GRAPHS.labels(type='incidence').inc()
 
         fig, ax1 = self.setup_plot(current_date, f"7-Tage-Inzidenz {district_name}", "7-Tage-Inzidenz")
         # Plot data
-        plt.xticks(x_data, rotation='30', ha='right')
 
         # Add a label every 7 days
-        plt.plot(x_data, y_data, color="#1fa2de", zorder=3, linewidth=3)
+        ax1.plot(x_data, y_data, color="#1fa2de", zorder=3, linewidth=3)
         ax1.set_ylim(bottom=0)
 
         if duration < 70:
@@ -427,11 +520,15 @@ class Visualization:
             self.set_monthly_formatter(ax1)
 
         # Save to file
-        plt.savefig(filepath, format='JPEG')
-        self.teardown_plt(fig)
-        return filepath
+        return self.store_graph(fig, key, "incidence", alias)
 
     def icu_graph(self, district_id: int) -> Optional[str]:
+        # Without reading the data if it did not change
+        alias, filepath = self.get_current_graph("icu", DataVersions.ICU, district_id)
+        if filepath:
+            CACHED_GRAPHS.labels(type='icu').inc()
+            return filepath
+
         current_date = None
         colors = ['#911425', '#DE354B', '#1fa2de', '']
         y_data = {'covid-ventilated': [],
@@ -440,31 +537,46 @@ class Visualization:
                   }
         x_data = []
 
-        with self.connection.cursor(dictionary=True) as cursor:
-            cursor.execute(
-                'SELECT date, (clear + occupied) as total, clear, occupied, occupied_covid, covid_ventilated FROM icu_beds WHERE district_id=%s ORDER BY date',
-                [district_id])
-            for row in cursor.fetchall():
-                if row['occupied_covid'] is None or row['covid_ventilated'] is None or row['total'] == 0:
-                    continue
+        if self.timeseries and self.timeseries.is_available(district_id):
+            dates, (clear, occupied, occupied_covid, covid_ventilated) = self.timeseries.get_rows(
+                ["icu_clear", "icu_occupied", "icu_occupied_covid", "icu_covid_ventilated"], district_id)
+            total = clear + occupied
+            valid = ~numpy.isnan(occupied_covid) & ~numpy.isnan(covid_ventilated) & (total != 0)
+            dates, total = dates[valid], total[valid]
+            occupied, occupied_covid, covid_ventilated = occupied[valid], occupied_covid[valid], covid_ventilated[valid]
+
+            y_data['no-covid'] = ((occupied - occupied_covid) / total * 100).tolist()
+            y_data['covid-not-ventilated'] = ((occupied_covid - covid_ventilated) / total * 100).tolist()
+            y_data['covid-ventilated'] = (covid_ventilated / total * 100).tolist()
+            x_data = TimeSeriesStore.to_dates(dates)
+            if x_data:
+                current_date = x_data[-1]
+            district_name = self.timeseries.get_district(district_id)[0]
+        else:
+            with self.connection.cursor(dictionary=True) as cursor:
+                cursor.execute(
+                    'SELECT date, (clear + occupied) as total, clear, occupied, occupied_covid, covid_ventilated FROM icu_beds WHERE district_id=%s ORDER BY date',
+                    [district_id])
+                for row in cursor.fetchall():
+                    if row['occupied_covid'] is None or row['covid_ventilated'] is None or row['total'] == 0:
+                        continue
 
-                y_data['no-covid'].append((row['occupied'] - row['occupied_covid']) / row['total'] * 100)
-                y_data['covid-not-ventilated'].append(
-                    (row['occupied_covid'] - row['covid_ventilated']) / row['total'] * 100)
-                y_data['covid-ventilated'].append(row['covid_ventilated'] / row['total'] * 100)
+                    y_data['no-covid'].append((row['occupied'] - row['occupied_covid']) / row['total'] * 100)
+                    y_data['covid-not-ventilated'].append(
+                        (row['occupied_covid'] - row['covid_ventilated']) / row['total'] * 100)
+                    y_data['covid-ventilated'].append(row['covid_ventilated'] / row['total'] * 100)
 
-                x_data.append(row['date'])
+                    x_data.append(row['date'])
 
-                if not current_date or current_date < row['date']:
-                    current_date = row['date']
-            cursor.execute('SELECT county_name FROM counties WHERE rs=%s', [district_id])
-            district_name = cursor.fetchall()[0]['county_name']
+                    if not current_date or current_date < row['date']:
+                        current_date = row['date']
+                cursor.execute('SELECT county_name FROM counties WHERE rs=%s', [district_id])
+                district_name = cursor.fetchall()[0]['county_name']
 
-        filepath = os.path.abspath(
-            os.path.join(self.graphics_dir, f"icu-{current_date.isoformat()}-{district_id}.jpg"))
+        key, filepath = self.get_cached_graph("icu", district_name, current_date, x_data, y_data, alias=alias)
 
         # Do not draw new graphic if its cached
-        if not self.disable_cache and os.path.isfile(filepath):
+        if filepath:
             CACHED_GRAPHS.labels(type='icu').inc()
             return filepath
         CREATED_GRAPHS.labels(type='icu').inc()
@@ -473,11 +585,10 @@ class Visualization:
                                    source="DIVI-Intensivregister")
 
         # Plot data
-        plt.xticks(x_data, rotation='30', ha='right')
         ax1.stackplot(x_data, y_data.values(), colors=colors,
                       labels=['Covid (beatmet)', 'Covid (ohne Beatmung)', 'Andere'], zorder=0)
         # Add legend
-        plt.legend(loc='upper left')
+        ax1.legend(loc='upper left')
 
         ax1.set_ylim(bottom=0, top=100)
 
@@ -486,42 +597,49 @@ class Visualization:
         ax1.yaxis.set_major_formatter(matplotlib.ticker.PercentFormatter())
 
         # Save to file
-        # plt.show()
-        plt.savefig(filepath, format='JPEG')
-        self.teardown_plt(fig)
-        return filepath
+        return self.store_graph(fig, key, "icu", alias)
 
     def hospitalization_graph(self, district_id: int, duration: int = 60, quadratic: bool = False) -> str:
+        # Without reading the data if it did not change
+        alias, filepath = self.get_current_graph("hospitalization", DataVersions.HOSPITALISATION, district_id,
+                                                 duration, quadratic)
+        if filepath:
+            CACHED_GRAPHS.labels(type="hospitalization").inc()
+            return filepath
+
         x_data, y_data, current_date = [], [], None
-        with self.connection.cursor(dictionary=True) as cursor:
-            cursor.execute('SELECT date, incidence, updated FROM hospitalisation WHERE age=\'00+\' AND district_id=%s ORDER BY date DESC LIMIT %s', [district_id, duration])
-            for row in cursor.fetchall():
-                x_data.append(row['date'])
-                y_data.append(row['incidence'])
+        if self.timeseries and self.timeseries.is_available(district_id):
+            dates, (incidence,) = self.timeseries.get_rows(["hospitalisation_incidence"], district_id)
+            x_data = TimeSeriesStore.to_dates(dates[::-1][:duration])
+            y_data = incidence[::-1][:duration].tolist()
+            current_date = self.timeseries.get_hospitalisation_updated(district_id)
+            district_name, population = self.timeseries.get_district(district_id)
+        else:
+            with self.connection.cursor(dictionary=True) as cursor:
+                cursor.execute('SELECT date, incidence, updated FROM hospitalisation WHERE age=\'00+\' AND district_id=%s ORDER BY date DESC LIMIT %s', [district_id, duration])
+                for row in cursor.fetchall():
+                    x_data.append(row['date'])
+                    y_data.append(row['incidence'])
 
-                if current_date is None or current_date < row['updated']:
-                    current_date = row['updated']
+                    if current_date is None or current_date < row['updated']:
+                        current_date = row['updated']
 
-            cursor.execute('SELECT county_name, population FROM counties WHERE rs=%s', [district_id])
-            row = cursor.fetchone()
-            district_name = row['county_name']
-            population = row['population']
+            district_name, population = self._get_district(district_id)
 
-        filepath = os.path.abspath(
-            os.path.join(self.graphics_dir, f"hospitalization-{current_date.isoformat()}-{district_id}-{duration}-{quadratic}.jpg"))
+        key, filepath = self.get_cached_graph("hospitalization", district_name, population, current_date, x_data,
+                                              y_data, duration, quadratic, alias=alias)
 
         # Do not draw new graphic if its cached
-        if not self.disable_cache and os.path.isfile(filepath):
+        if filepath:
             CACHED_GRAPHS.labels(type="hospitalization").inc()
             return filepath
         CREATED_GRAPHS.labels(type="hospitalization").inc()
 
         fig, ax1 = self.setup_plot(current_date, f"Hospitalisierung {district_name}", "7-Tage-Hospitalisierungsinzidenz", "Robert-Koch-Institut", quadratic)
         # Plot data
-        plt.xticks(x_data, rotation='30', ha='right')
 
         # Add a label every 7 days
-        plt.plot(x_data, y_data, color="#1fa2de", zorder=3, linewidth=3)
+        ax1.plot(x_data, y_data, color="#1fa2de", zorder=3, linewidth=3)
         ax1.set_ylim(bottom=0)
         if duration < 70:
             self.set_weekday_formatter(ax1, current_date.weekday())
@@ -539,17 +657,27 @@ class Visualization:
 
         ax1.tick_params(axis="y", labelright=False)
         # Save to file
-        plt.savefig(filepath, format='JPEG')
-        self.teardown_plt(fig)
-        return filepath
+        return self.store_graph(fig, key, "hospitalization", alias)
 
     def _get_covid_data(self, field: str, district_id: int, duration: int) -> Tuple[
         str, datetime.date, List[datetime.date], List[int]]:
         district_name: Optional[str]
         current_date: Optional[datetime.date]
 
+        oldest_date = datetime.date.today() - datetime.timedelta(days=duration)
+        if self.timeseries and self.timeseries.is_available(district_id):
+            # Days without a row are shown as 0, like below
+            rows, _ = self.timeseries.get_rows(["new_cases", "new_deaths", "incidence"], district_id, oldest_date)
+            if not len(rows):
+                return None, None, [], []
+
+            dates, values = self.timeseries.get(field, district_id)
+            start, end = numpy.searchsorted(dates, [rows[0], rows[-1]])
+            x_data = TimeSeriesStore.to_dates(dates[start:end + 1])
+            y_data = numpy.nan_to_num(values[start:end + 1]).tolist()
+            return self.timeseries.get_district(district_id)[0], x_data[-1], x_data, y_data
+
         with self.connection.cursor(dictionary=True) as cursor:
-            oldest_date = datetime.date.today() - datetime.timedelta(days=duration)
             cursor.execute(
                 f"SELECT {field}, county_name, date FROM covid_data_calculated WHERE rs=%s AND date >= %s ORDER BY date",
                 [district_id, oldest_date])
@@ -580,6 +708,15 @@ class Visualization:
                     y_data.append(0)
         return district_name, current_date, x_data, y_data
 
+    def _get_district(self, district_id: int) -> Tuple[str, Optional[int]]:
+        if self.timeseries and self.timeseries.is_available(district_id):
+            return self.timeseries.get_district(district_id)
+
+        with self.connection.cursor(dictionary=True) as cursor:
+            cursor.execute('SELECT county_name, population FROM counties WHERE rs=%s', [district_id])
+            row = cursor.fetchone()
+        return row['county_name'], row['population']
+
     def set_weekday_formatter(self, ax1, weekday):
         # One tick every 7 days for easier comparison
         formatter = mdates.DateFormatter("%a, %d.%m.")
@@ -0,0 +1,312 @@
+import logging
+import threading
+import time
+from typing import Callable, List, Tuple, Optional
+
+from mysql.connector import MySQLConnection, Error, InterfaceError, OperationalError
+from mysql.connector.errors import PoolError
+
+from covidbot.metrics import DB_POOL_CONNECTIONS, DB_POOL_WAIT, DB_POOL_RECONNECTS, DB_POOL_CONNECT_ERRORS
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of MySQL connections. Connections are created lazily up to size, checked for liveness when they
+    have been idle for a while and replaced if they were dropped.
+    """
+    size: int
+    autocommit: bool
+    max_retries: int
+    retry_backoff: float
+    check_interval: float
+    timeout: float
+    log = logging.getLogger(__name__)
+
+    def __init__(self, connect: Callable[[], MySQLConnection], size: int = 5, autocommit: bool = False,
+                 max_retries: int = 3, retry_backoff: float = 0.5, check_interval: float = 30.0,
+                 timeout: float = 30.0):
+        """
+        :param connect: Creates a new connection
+        :param size: Maximum number of open connections
+        :param autocommit: Whether the connections created by connect use autocommit
+        :param max_retries: Number of retries if a connection can't be established
+        :param retry_backoff: Seconds to wait before the first retry, doubled on each retry
+        :param check_interval: Seconds a connection may be idle before it is pinged on checkout
+        :param timeout: Seconds to wait for a free connection before raising PoolError
+        """
+        self.connect = connect
+        self.size = size
+        self.autocommit = autocommit
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.check_interval = check_interval
+        self.timeout = timeout
+
+        self._idle: List[Tuple[MySQLConnection, float]] = []
+        self._open = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def acquire(self) -> MySQLConnection:
+        """
+        Checks out a live connection, waits if all connections are in use
+        :raises PoolError: if no connection got free within timeout
+        """
+        start = time.monotonic()
+        connection, last_used = None, None
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise PoolError("Connection pool is closed")
+
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                    DB_POOL_CONNECTIONS.labels(state='idle').dec()
+                    break
+
+                if self._open < self.size:
+                    self._open += 1
+                    break
+
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    raise PoolError(f"No free connection within {self.timeout}s, pool size is {self.size}")
+                self._condition.wait(remaining)
+        DB_POOL_WAIT.observe(time.monotonic() - start)
+
+        try:
+            if connection is None:
+                connection = self._connect()
+            elif time.monotonic() - last_used > self.check_interval and not self._is_alive(connection):
+                self.log.warning("Connection was dropped, reconnecting")
+                DB_POOL_RECONNECTS.inc()
+                self._close_quietly(connection)
+                connection = self._connect()
+        except Error:
+            self._remove()
+            raise
+
+        DB_POOL_CONNECTIONS.labels(state='in_use').inc()
+        return connection
+
+    def release(self, connection: MySQLConnection) -> None:
+        """
+        Returns a connection, open transactions are rolled back
+        """
+        DB_POOL_CONNECTIONS.labels(state='in_use').dec()
+        try:
+            if not self.autocommit and connection.in_transaction:
+                connection.rollback()
+        except Error as e:
+            self.log.warning(f"Discarding connection, rollback failed: {e}")
+            self._close_quietly(connection)
+            self._remove()
+            return
+
+        with self._condition:
+            if self._closed:
+                self._close_quietly(connection)
+                self._open -= 1
+                return
+            self._idle.append((connection, time.monotonic()))
+            DB_POOL_CONNECTIONS.labels(state='idle').inc()
+            self._condition.notify()
+
+    def discard(self, connection: MySQLConnection) -> None:
+        """
+        Closes a checked out connection that should not be used anymore, e.g. because it was dropped
+        """
+        DB_POOL_CONNECTIONS.labels(state='in_use').dec()
+        self._close_quietly(connection)
+        self._remove()
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            for connection, _ in self._idle:
+                self._close_quietly(connection)
+                self._open -= 1
+            DB_POOL_CONNECTIONS.labels(state='idle').dec(len(self._idle))
+            self._idle = []
+            self._condition.notify_all()
+
+    def _connect(self) -> MySQLConnection:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.connect()
+            except Error as e:
+                DB_POOL_CONNECT_ERRORS.inc()
+                if attempt == self.max_retries:
+                    raise e
+                delay = self.retry_backoff * 2 ** attempt
+                self.log.warning(f"Can't connect to database, retrying in {delay}s: {e}")
+                time.sleep(delay)
+
+    def _remove(self) -> None:
+        with self._condition:
+            self._open -= 1
+            self._condition.notify()
+
+    def _is_alive(self, connection: MySQLConnection) -> bool:
+        try:
+            return connection.is_connected()
+        except Error:
+            return False
+
+    def _close_quietly(self, connection: MySQLConnection) -> None:
+        try:
+            connection.close()
+        except Error:
+            pass
+
+
+class PooledCursor:
+    """
+    Cursor of a PooledConnection, hands the connection back when closed
+    """
+
+    def __init__(self, connection: 'PooledConnection', cursor, checkout: MySQLConnection):
+        self._connection = connection
+        self._cursor = cursor
+        self._checkout = checkout
+        self._closed = False
+
+    def execute(self, *args, **kwargs):
+        try:
+            return self._cursor.execute(*args, **kwargs)
+        except (InterfaceError, OperationalError):
+            self._connection.mark_broken(self._checkout)
+            raise
+
+    def executemany(self, *args, **kwargs):
+        try:
+            return self._cursor.executemany(*args, **kwargs)
+        except (InterfaceError, OperationalError):
+            self._connection.mark_broken(self._checkout)
+            raise
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._cursor.close()
+        except Error:
+            self._connection.mark_broken(self._checkout)
+        finally:
+            self._connection.cursor_closed(self._checkout)
+
+    def __getattr__(self, item):
+        return getattr(self._cursor, item)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class PooledConnection:
+    """
+    Can be used instead of a MySQLConnection. Each thread gets its own connection of the pool, which is checked out
+    on the first cursor and returned as soon as no cursor is open and no transaction is pending.
+    """
+    pool: ConnectionPool
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self._local = threading.local()
+
+    @property
+    def autocommit(self) -> bool:
+        return self.pool.autocommit
+
+    def _bound(self) -> Optional[MySQLConnection]:
+        return getattr(self._local, 'connection', None)
+
+    def cursor(self, *args, **kwargs) -> PooledCursor:
+        connection = self._bound()
+        if connection is None:
+            connection = self.pool.acquire()
+            self._local.connection = connection
+            self._local.cursors = 0
+            self._local.broken = False
+
+        try:
+            cursor = connection.cursor(*args, **kwargs)
+        except (InterfaceError, OperationalError):
+            self.mark_broken()
+            self._release()
+            raise
+
+        self._local.cursors += 1
+        return PooledCursor(self, cursor, connection)
+
+    def cursor_closed(self, checkout: MySQLConnection) -> None:
+        # Connection might have been discarded while the cursor was open
+        if self._bound() is not checkout:
+            return
+        self._local.cursors -= 1
+        self._release()
+
+    def mark_broken(self, checkout: Optional[MySQLConnection] = None) -> None:
+        connection = self._bound()
+        if connection is not None and (checkout is None or checkout is connection):
+            self._local.broken = True
+
+    def commit(self) -> None:
+        connection = self._bound()
+        if connection is None:
+            return
+        try:
+            connection.commit()
+        except (InterfaceError, OperationalError):
+            self.mark_broken()
+            raise
+        finally:
+            self._release()
+
+    def rollback(self) -> None:
+        connection = self._bound()
+        if connection is None:
+            return
+        try:
+            connection.rollback()
+        except (InterfaceError, OperationalError):
+            self.mark_broken()
+            raise
+        finally:
+            self._release()
+
+    def reconnect(self, *args, **kwargs) -> None:
+        """
+        Drops the connection of this thread, the next cursor will use a fresh one
+        """
+        self.mark_broken()
+        self._release(force=True)
+
+    def close(self) -> None:
+        """
+        Returns the connection of this thread to the pool
+        """
+        self._release(force=True)
+
+    def _release(self, force: bool = False) -> None:
+        connection = self._bound()
+        if connection is None:
+            return
+
+        if not self._local.broken and not force:
+            if self._local.cursors > 0:
+                return
+            if not self.pool.autocommit and connection.in_transaction:
+                return
+
+        self._local.connection = None
+        if self._local.broken:
+            self.pool.discard(connection)
+        else:
+            self.pool.release(connection)
@@ -34,7 +34,7 @@ class MastodonInterface(SingleCommandInterface):
         self.user_manager.set_platform_user_number(number)
 
     def upload_media(self, filename: str) -> str:
-        upload_resp = self.mastodon.media_post(filename, mime_type="image/jpeg")
+        upload_resp = self.mastodon.media_post(self.viz.read_graph(filename), mime_type="image/jpeg")
         if not upload_resp:
             raise ValueError(f"Could not upload media to Mastodon. API response {upload_resp.status_code}: "
                              f"{upload_resp.text}")
@@ -1,4 +1,5 @@
 import asyncio
+import io
 import logging
 import os
 from typing import List, Union, Optional
@@ -153,19 +154,19 @@ class MatrixInterface(MessengerInterface):
                 for image in message.images:
                     # Calculate metadata
                     mime_type = "image/jpeg"
-                    file_stat = os.stat(image)
+                    content = self.bot.visualization.read_graph(image)
 
-                    im = Image.open(image)
+                    im = Image.open(io.BytesIO(content))
                     (width, height) = im.size
 
-                    url = await self.upload_file(image, mime_type)
+                    url = await self.upload_file(image, mime_type, content)
 
                     image = {
                         "body": os.path.basename(image),
                         "msgtype": "m.image",
                         "url": url,
                         "info": {
-                            "size": file_stat.st_size,
+                            "size": len(content),
                             "mimetype": mime_type,
                             "w": width,  # width in pixel
                             "h": height,  # height in pixel
@@ -200,15 +201,25 @@ class MatrixInterface(MessengerInterface):
             else:
                 SENT_MESSAGE_COUNT.inc()
 
-    async def upload_file(self, path: str, mime_type: str) -> Optional[str]:
-        file_stat = os.stat(path)
-
-        async with aiofiles.open(path, "r+b") as f:
+    async def upload_file(self, path: str, mime_type: str, content: Optional[bytes] = None) -> Optional[str]:
+        """
+        :param content: Content of the file if it was already read
+        """
+        if content is not None:
             resp, maybe_keys = await self.matrix.upload(
-                f,
+                content,
                 content_type=mime_type,
                 filename=os.path.basename(path),
-                filesize=file_stat.st_size)
+                filesize=len(content))
+        else:
+            file_stat = os.stat(path)
+
+            async with aiofiles.open(path, "r+b") as f:
+                resp, maybe_keys = await self.matrix.upload(
+                    f,
+                    content_type=mime_type,
+                    filename=os.path.basename(path),
+                    filesize=file_stat.st_size)
 
         if not isinstance(resp, UploadResponse):
             self.log.error(f"Failed to upload file. Failure response: {resp}")
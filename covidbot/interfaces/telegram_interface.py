@@ -384,8 +384,7 @@ class TelegramInterface(MessengerInterface):
         if filename in self.cache.keys():
             return InputMediaPhoto(self.cache[filename])
 
-        with open(filename, "rb") as f:
-            return InputMediaPhoto(f, filename=filename)
+        return InputMediaPhoto(self.bot.visualization.read_graph(filename), filename=filename)
 
     def set_file_id(self, filename: str, file_id: str):
         self.cache[filename] = file_id
@@ -58,22 +58,21 @@ class TwitterInterface(SingleCommandInterface):
                 # Upload filenames
                 media_ids = []
                 for file in message.images:
-                    with open(file, "rb") as f:
-                        upload_resp = self.twitter.request('media/upload', None, {'media': f.read()})
-                        if upload_resp.status_code != 200:
-                            if upload_resp.status_code == 429: # Rate Limit exceed
-                                reset_time = int(upload_resp.headers.get("x-rate-limit-reset", 0))
-                                if reset_time:
-                                    sleep_time = (datetime.fromtimestamp(reset_time, timezone.utc) - datetime.now(
-                                        tz=timezone.utc)).seconds
-                                    self.log.warning(f"Rate Limit exceed: Wait for reset in {sleep_time}s")
-                                    time.sleep(sleep_time)
-                                    return False
-                            raise ValueError(
-                                f"Could not upload graph to twitter. API response {upload_resp.status_code}: "
-                                f"{upload_resp.text}")
-
-                        media_ids.append(upload_resp.json()['media_id'])
+                    upload_resp = self.twitter.request('media/upload', None, {'media': self.viz.read_graph(file)})
+                    if upload_resp.status_code != 200:
+                        if upload_resp.status_code == 429: # Rate Limit exceed
+                            reset_time = int(upload_resp.headers.get("x-rate-limit-reset", 0))
+                            if reset_time:
+                                sleep_time = (datetime.fromtimestamp(reset_time, timezone.utc) - datetime.now(
+                                    tz=timezone.utc)).seconds
+                                self.log.warning(f"Rate Limit exceed: Wait for reset in {sleep_time}s")
+                                time.sleep(sleep_time)
+                                return False
+                        raise ValueError(
+                            f"Could not upload graph to twitter. API response {upload_resp.status_code}: "
+                            f"{upload_resp.text}")
+
+                    media_ids.append(upload_resp.json()['media_id'])
 
                 data['media_ids'] = ",".join(map(str, media_ids))
 
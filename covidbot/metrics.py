@@ -1,7 +1,6 @@
 import logging
-from sqlite3 import OperationalError
 
-from mysql.connector import MySQLConnection
+from mysql.connector import MySQLConnection, OperationalError
 from prometheus_client.metrics import Counter, Gauge, Summary
 
 RECV_MESSAGE_COUNT = Counter('bot_recv_message_count', 'Received messages')
@@ -29,6 +28,25 @@ CREATED_GRAPHS = Counter('bot_viz_created_graph_count', 'Number of created graph
                          ['type'])
 CACHED_GRAPHS = Counter('bot_viz_cached_graph_count', 'Number of created graphs',
                         ['type'])
+EVICTED_GRAPHS = Counter('bot_viz_evicted_graph_count', 'Number of cached graphs deleted to stay within the cache size',
+                         ['type'])
+GRAPH_CACHE_BYTES = Gauge('bot_viz_graph_cache_bytes', 'Size of the cached graphs', ['tier'])
+
+# CovidData snapshot cache
+DATA_CACHE_HITS = Counter('bot_data_cache_hit_count', 'Number of data requests served from cache',
+                          ['type'])
+DATA_CACHE_MISSES = Counter('bot_data_cache_miss_count', 'Number of data requests fetched from the database',
+                            ['type'])
+
+# Database connection pool
+DB_POOL_CONNECTIONS = Gauge('bot_db_pool_connections', 'Number of pooled database connections', ['state'])
+DB_POOL_WAIT = Summary('bot_db_pool_wait', 'Time waited for a free database connection')
+DB_POOL_RECONNECTS = Counter('bot_db_pool_reconnect_count', 'Number of dropped database connections replaced')
+DB_POOL_CONNECT_ERRORS = Counter('bot_db_pool_connect_error_count', 'Number of failed database connection attempts')
+
+# Data updaters
+UNRESOLVED_DISTRICT_NAMES = Counter('bot_updater_unresolved_district_name_count',
+                                    'Number of district names from sources that could not be resolved')
 
 # Location Service
 LOCATION_OSM_LOOKUP = Summary('bot_location_osm_lookup', 'Duration of OSM Requests')
@@ -70,7 +88,7 @@ class MonitorMetrics:
         except OperationalError as e:
             self.log.exception(f"OperationalError: {e.msg}", exc_info=e)
             self.connection.reconnect()
-            return self.get_social_network_user_number(name)
+            return 0
 
     def get_user_number(self, name: str) -> int:
         try:
@@ -85,7 +103,7 @@ class MonitorMetrics:
         except OperationalError as e:
             self.log.exception(f"OperationalError: {e.msg}", exc_info=e)
             self.connection.reconnect()
-            return self.get_user_number(name)
+            return 0
 
     def get_average_subscriptions(self) -> float:
         try:
@@ -101,4 +119,4 @@ class MonitorMetrics:
         except OperationalError as e:
             self.log.exception(f"OperationalError: {e.msg}", exc_info=e)
             self.connection.reconnect()
-            return self.get_average_subscriptions()
+            return 1.0
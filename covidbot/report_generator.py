@@ -80,8 +80,9 @@ class ReportGenerator:
         # Start creating report
         graphs = []
         subscriptions = []
+        districts_data = self.covid_data.get_districts_data(user.subscriptions)
         for district_id in user.subscriptions:
-            base_data = self.covid_data.get_district_data(district_id)
+            base_data = districts_data.get(district_id)
             if base_data is not None:
                 subscriptions.append(base_data)
             else:
@@ -163,9 +164,10 @@ class ReportGenerator:
         # Start creating report
         graphs = []
         subscriptions = []
+        districts_data = self.covid_data.get_districts_data(user.subscriptions)
         for district_id in user.subscriptions:
-            district = self.covid_data.get_district_data(district_id)
-            if district.icu_data:
+            district = districts_data.get(district_id)
+            if district and district.icu_data:
                 subscriptions.append(district)
         subscriptions = self.sort_districts(subscriptions)
 
@@ -214,14 +216,17 @@ class ReportGenerator:
         # Start creating report
         graphs = []
         subscriptions = []
+        districts_data = self.covid_data.get_districts_data(user.subscriptions)
+        parents = [d.parent for d in districts_data.values() if not d.vaccinations and d.parent is not None]
+        districts_data.update(self.covid_data.get_districts_data(parents))
         for district_id in user.subscriptions:
-            district = self.covid_data.get_district_data(district_id)
+            district = districts_data[district_id]
 
             # Add parent, if no vaccination data available
             if not district.vaccinations:
                 if district.parent in [d.id for d in subscriptions]:
                     continue
-                district = self.covid_data.get_district_data(district.parent)
+                district = districts_data[district.parent]
 
             if district.vaccinations:
                 subscriptions.append(district)
@@ -0,0 +1,93 @@
+import datetime
+
+from mysql.connector import OperationalError
+
+from covidbot.covid_data.timeseries import TimeSeriesStore
+
+
+class FakeCursor:
+    def __init__(self, connection: 'FakeConnection'):
+        self.connection = connection
+        self.result = []
+        self.rowcount = 0
+
+    def execute(self, query, args=None):
+        self.connection.queries.append(query)
+        if not self.connection.connected:
+            raise OperationalError("Lost connection")
+        self.connection.in_transaction = not self.connection.autocommit
+
+        rows = next((rows for prefix, rows in self.connection.results.items() if query.startswith(prefix)), [])
+        self.result = list(rows(query, args) if callable(rows) else rows)
+        self.rowcount = len(self.result)
+
+    def executemany(self, query, seq_args):
+        for args in seq_args:
+            self.execute(query, args)
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+class FakeConnection:
+    """
+    Stands in for a MySQLConnection in tests. Queries are answered from results, which maps query prefixes to the
+    rows returned, or to a function of query and arguments returning them. Other queries return no rows.
+    """
+
+    def __init__(self, results=None, autocommit=True):
+        self.results = results if results is not None else {}
+        self.autocommit = autocommit
+        self.queries = []
+        self.connected = True
+        self.in_transaction = False
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.in_transaction = False
+
+    def rollback(self):
+        self.in_transaction = False
+
+    def is_connected(self):
+        return self.connected
+
+    def close(self):
+        self.connected = False
+
+
+def build_timeseries_store(directory: str, districts: int, days: int, vaccinations: bool = False) -> TimeSeriesStore:
+    """
+    Builds a TimeSeriesStore with generated cases, and optionally vaccinations, for districts 1 to districts over the
+    last days days
+    """
+    today = datetime.date.today()
+    cases, vaccination_rows = [], []
+    for rs in range(1, districts + 1):
+        for day in range(days):
+            date = today - datetime.timedelta(days=day)
+            cases.append((rs, date, (rs * 7 + day * 3) % 500, day % 3, (rs * 11 + day * 5) % 300 + 0.5))
+            if vaccinations:
+                vaccination_rows.append((rs, date, (days - day) * 1000, (days - day) * 800, (days - day) * 100,
+                                         (rs * 13 + day * 17) % 5000))
+    results = {
+        "SELECT rs, date, new_cases": cases,
+        "SELECT district_id, date, vaccinated_partial": vaccination_rows,
+        "SELECT rs, county_name": [(rs, f"Landkreis {rs}", 1000000 + rs) for rs in range(1, districts + 1)]}
+    store = TimeSeriesStore(directory, check_interval=0)
+    store.rebuild(FakeConnection(results))
+    return store
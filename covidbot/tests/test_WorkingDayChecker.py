@@ -1,4 +1,6 @@
 import datetime
+import os
+import tempfile
 from unittest import TestCase
 
 from covidbot.covid_data.WorkingDayChecker import WorkingDayChecker
@@ -16,3 +18,51 @@ class TestWorkingDayChecker(TestCase):
                                                                                           "days!")
         self.assertFalse(checker.check_holiday(datetime.date(year=2021, month=5, day=15)), "Saturdays are working "
                                                                                            "days!")
+
+    def test_count_working_days(self):
+        checker = WorkingDayChecker()
+
+        # Christmas holidays on Saturday and Sunday
+        self.assertEqual(5, checker.count_working_days(datetime.date(2021, 12, 20), datetime.date(2021, 12, 27)))
+        self.assertEqual(0, checker.count_working_days(datetime.date(2021, 12, 27), datetime.date(2021, 12, 20)))
+
+        # Epiphany is a holiday in BY, but not in HH
+        self.assertEqual([10, 9, 10], checker.count_working_days_bulk([datetime.date(2021, 12, 27)] * 3,
+                                                                     datetime.date(2022, 1, 8), ["HH", "BY", None]))
+
+        for_day = datetime.date(2021, 12, 1)
+        expected = 0
+        while for_day < datetime.date(2022, 2, 1):
+            if not checker.check_holiday(for_day, "BW"):
+                expected += 1
+            for_day += datetime.timedelta(days=1)
+        self.assertEqual(expected, checker.count_working_days(datetime.date(2021, 12, 1), datetime.date(2022, 2, 1),
+                                                              "BW"))
+
+    def test_calculate_holidays(self):
+        self.assertEqual(datetime.date(2021, 4, 4), WorkingDayChecker.get_easter_sunday(2021))
+        self.assertEqual(datetime.date(2022, 4, 17), WorkingDayChecker.get_easter_sunday(2022))
+        self.assertEqual(datetime.date(2024, 3, 31), WorkingDayChecker.get_easter_sunday(2024))
+
+        holidays = WorkingDayChecker.calculate_holidays(2021)
+        self.assertEqual("2021-04-02", holidays["NATIONAL"]["Karfreitag"]["datum"])
+        self.assertEqual("2021-06-03", holidays["NW"]["Fronleichnam"]["datum"])
+        self.assertEqual("2021-11-17", holidays["SN"]["Buß- und Bettag"]["datum"])
+        self.assertNotIn("Fronleichnam", holidays["NATIONAL"])
+        self.assertNotIn("Heilige Drei Könige", holidays["HH"])
+        self.assertEqual("2021-10-31", holidays["HH"]["Reformationstag"]["datum"])
+
+    def test_cache_dir(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            checker = WorkingDayChecker(cache_dir)
+            self.assertTrue(checker.check_holiday(datetime.date(2021, 1, 6), "BY"))
+            self.assertTrue(os.path.isfile(os.path.join(cache_dir, "holidays-2021.json")))
+
+            self.assertEqual(checker.holidays[2021], WorkingDayChecker(cache_dir)._data(2021))
+
+            # Truncated cache file is replaced
+            filepath = os.path.join(cache_dir, "holidays-2021.json")
+            with open(filepath, "w") as f:
+                f.write('{"NATIONAL": {"Neuj')
+            self.assertTrue(WorkingDayChecker(cache_dir).check_holiday(datetime.date(2021, 1, 6), "BY"))
+            self.assertEqual(checker.holidays[2021], WorkingDayChecker(cache_dir)._data(2021))
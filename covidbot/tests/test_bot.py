@@ -21,11 +21,17 @@ class TestBot(TestCase):
 
         with cls.conn.cursor(dictionary=True) as cursor:
             cursor.execute("DROP TABLE IF EXISTS covid_data;")
+            cursor.execute("DROP TABLE IF EXISTS covid_data_calculated;")
+            cursor.execute("DROP TABLE IF EXISTS district_threshold_crossings;")
+            cursor.execute("DROP TABLE IF EXISTS district_facts;")
             cursor.execute("DROP TABLE IF EXISTS covid_vaccinations;")
             cursor.execute("DROP TABLE IF EXISTS covid_r_value;")
             cursor.execute("DROP TABLE IF EXISTS hospitalisation;")
             cursor.execute("DROP TABLE IF EXISTS icu_beds;")
             cursor.execute("DROP TABLE IF EXISTS district_rules;")
+            cursor.execute("DROP TABLE IF EXISTS http_resources;")
+            cursor.execute("DROP TABLE IF EXISTS source_payloads;")
+            cursor.execute("DROP TABLE IF EXISTS county_ancestors;")
             cursor.execute("DROP TABLE IF EXISTS county_alt_names;")
             cursor.execute("DROP TABLE IF EXISTS counties;")
 
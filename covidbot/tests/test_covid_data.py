@@ -6,6 +6,7 @@ from covidbot.__main__ import parse_config, get_connection
 from covidbot.covid_data import CovidData, RKIKeyDataUpdater, RKIHistoryUpdater, \
     RulesGermanyUpdater, ICUGermanyUpdater, VaccinationGermanyUpdater, \
     RValueGermanyUpdater, HospitalisationRKIUpdater, ICUGermanyHistoryUpdater
+from covidbot.covid_data.models import DistrictFacts
 
 
 class CovidDataTest(TestCase):
@@ -18,10 +19,15 @@ class CovidDataTest(TestCase):
 
         with cls.conn.cursor() as cursor:
             cursor.execute("TRUNCATE TABLE covid_data;")
+            cursor.execute("TRUNCATE TABLE covid_data_calculated;")
+            cursor.execute("TRUNCATE TABLE district_threshold_crossings;")
+            cursor.execute("TRUNCATE TABLE district_facts;")
             cursor.execute("TRUNCATE TABLE covid_vaccinations;")
             cursor.execute("TRUNCATE TABLE covid_r_value;")
             cursor.execute("TRUNCATE TABLE hospitalisation;")
             cursor.execute("TRUNCATE TABLE icu_beds;")
+            cursor.execute("DROP TABLE IF EXISTS http_resources;")
+            cursor.execute("DROP TABLE IF EXISTS source_payloads;")
             cursor.execute("TRUNCATE TABLE district_rules;")
             cursor.execute("TRUNCATE TABLE county_alt_names;")
             # noinspection SqlWithoutWhere
@@ -94,3 +100,26 @@ class CovidDataTest(TestCase):
 
     def test_get_root_district_data(self):
         self.data.get_district_data(0)
+
+    def test_get_district_data_cached(self):
+        data = self.data.get_district_data(3151)
+        self.assertIs(data, self.data.get_district_data(3151), "Second request should be served from cache")
+
+        self.data.warm_up([0, 1, 3151])
+        self.assertIs(data, self.data.get_districts_data([3151, 0])[3151])
+
+        self.data._version_checked = None
+        self.data._cache_version = None
+        self.assertIsNot(data, self.data.get_district_data(3151), "Cache should be invalidated on new data")
+
+    def test_get_district_facts(self):
+        facts = self.data.get_district_facts(0)
+        self.assertIsNotNone(facts.highest_cases, "Highest cases must be available")
+        self.assertIsNotNone(facts.highest_incidence_date, "Date of highest incidence must be available")
+        self.assertIsNotNone(facts.first_case_date, "Date of first case must be available")
+
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT MAX(new_cases) FROM covid_data_calculated WHERE rs=0")
+            self.assertEqual(cursor.fetchone()[0], facts.highest_cases)
+
+        self.assertEqual(DistrictFacts(), self.data.get_district_facts(9999999999999))
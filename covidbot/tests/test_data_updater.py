@@ -25,11 +25,16 @@ class TestUpdater(TestCase):
     def test_update(self):
         with self.conn.cursor() as c:
             c.execute("DROP TABLE covid_data")
+            c.execute("DROP TABLE covid_data_calculated")
+            c.execute("DROP TABLE district_threshold_crossings")
+            c.execute("DROP TABLE district_facts")
             c.execute("DROP TABLE covid_vaccinations")
             c.execute("DROP TABLE covid_r_value")
             c.execute("DROP TABLE hospitalisation")
             c.execute("DROP TABLE district_rules")
             c.execute("DROP TABLE icu_beds")
+            c.execute("DROP TABLE IF EXISTS http_resources")
+            c.execute("DROP TABLE IF EXISTS source_payloads")
 
         for updater_class in [RKIKeyDataUpdater, RKIHistoryUpdater, RValueGermanyUpdater,
                               VaccinationGermanyUpdater, ICUGermanyUpdater,
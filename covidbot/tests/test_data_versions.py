@@ -0,0 +1,21 @@
+from unittest import TestCase
+
+from covidbot.covid_data.versions import DataVersions
+from covidbot.tests.fakes import FakeConnection
+
+
+class TestDataVersions(TestCase):
+    def test_get(self):
+        conn = FakeConnection({"SELECT source, version": [(DataVersions.CASES, 3), (DataVersions.ICU, 1)]})
+        versions = DataVersions(conn, check_interval=3600)
+        self.assertEqual(3, versions.get(DataVersions.CASES))
+        self.assertEqual(1, versions.get(DataVersions.ICU))
+        self.assertIsNone(versions.get(DataVersions.VACCINATIONS))
+        self.assertEqual(1, len(conn.queries), "Versions should be read once per interval")
+
+    def test_unavailable(self):
+        conn = FakeConnection({"SELECT source, version": [(DataVersions.CASES, 3)]})
+        versions = DataVersions(conn, check_interval=0)
+        self.assertEqual(3, versions.get(DataVersions.CASES))
+        conn.connected = False
+        self.assertIsNone(versions.get(DataVersions.CASES), "Versions should not be trusted if they can't be read")
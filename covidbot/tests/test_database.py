@@ -0,0 +1,103 @@
+import threading
+from unittest import TestCase
+
+from mysql.connector import OperationalError, InterfaceError
+from mysql.connector.errors import PoolError
+
+from covidbot.database import ConnectionPool, PooledConnection
+from covidbot.tests.fakes import FakeConnection
+
+
+class TestConnectionPool(TestCase):
+    def setUp(self) -> None:
+        self.created = []
+
+        def connect():
+            connection = FakeConnection()
+            self.created.append(connection)
+            return connection
+
+        self.pool = ConnectionPool(connect, size=2, autocommit=True, retry_backoff=0, timeout=0.1)
+
+    def test_reuse(self):
+        first = self.pool.acquire()
+        self.pool.release(first)
+        self.assertIs(first, self.pool.acquire(), "Idle connections should be reused")
+        self.assertEqual(1, len(self.created))
+
+    def test_exhausted(self):
+        self.pool.acquire()
+        self.pool.acquire()
+        self.assertRaises(PoolError, self.pool.acquire)
+
+    def test_liveness_check(self):
+        self.pool.check_interval = 0
+        connection = self.pool.acquire()
+        self.pool.release(connection)
+        connection.connected = False
+        self.assertIsNot(connection, self.pool.acquire(), "Dropped connections should be replaced")
+
+    def test_retry(self):
+        attempts = []
+
+        def connect():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise InterfaceError("Can't connect")
+            return FakeConnection()
+
+        pool = ConnectionPool(connect, max_retries=2, retry_backoff=0)
+        self.assertIsNotNone(pool.acquire())
+        self.assertEqual(3, len(attempts))
+
+        attempts.clear()
+        pool = ConnectionPool(connect, size=1, max_retries=1, retry_backoff=0, timeout=0.1)
+        self.assertRaises(InterfaceError, pool.acquire)
+        self.assertIsNotNone(pool.acquire(), "Failed connection attempts should not occupy the pool")
+
+    def test_pooled_connection(self):
+        connection = PooledConnection(self.pool)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            with connection.cursor() as inner:
+                inner.execute("SELECT 2")
+            self.assertEqual(0, len(self.pool._idle), "Connection has to be kept while a cursor is open")
+        self.assertEqual(1, len(self.pool._idle), "Connection should be returned after use")
+
+        # Broken connections are discarded
+        self.created[0].connected = False
+        with self.assertRaises(OperationalError):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        self.assertEqual(0, len(self.pool._idle))
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        self.assertEqual(2, len(self.created))
+
+    def test_pooled_transaction(self):
+        pool = ConnectionPool(lambda: FakeConnection(autocommit=False), size=2)
+        connection = PooledConnection(pool)
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO test VALUES (1)")
+        self.assertEqual(0, len(pool._idle), "Connection has to be kept until the transaction is finished")
+        connection.commit()
+        self.assertEqual(1, len(pool._idle))
+
+    def test_threads(self):
+        connection = PooledConnection(self.pool)
+        used = []
+
+        def worker():
+            cursor = connection.cursor()
+            used.append(cursor._checkout)
+            barrier.wait()
+            cursor.close()
+
+        barrier = threading.Barrier(2)
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIsNot(used[0], used[1], "Each thread should use its own connection")
@@ -0,0 +1,47 @@
+import datetime
+from unittest import TestCase, mock
+
+from covidbot.covid_data import covid_data
+from covidbot.covid_data.covid_data import CovidData
+from covidbot.covid_data.models import DistrictData
+from covidbot.covid_data.versions import DataVersions
+from covidbot.tests.fakes import FakeConnection
+
+
+class FakeDate(datetime.date):
+    current = datetime.date(2021, 5, 10)
+
+    @classmethod
+    def today(cls):
+        return cls.current
+
+
+class TestSnapshotCache(TestCase):
+    def setUp(self) -> None:
+        self.versions = [(DataVersions.CASES, 1), (DataVersions.HOSPITALISATION, 1)]
+        self.data = CovidData(FakeConnection({"SELECT source, version": lambda query, args: self.versions}),
+                              version_check_interval=0)
+        patch = mock.patch.object(covid_data, "date", FakeDate)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def tearDown(self) -> None:
+        FakeDate.current = datetime.date(2021, 5, 10)
+
+    def fill_cache(self):
+        self.data._check_data_version()
+        self.data._cache[1] = DistrictData(name="Flensburg", id=1)
+        self.data._check_data_version()
+        self.assertIn(1, self.data._cache, "Snapshot should be kept while nothing changed")
+
+    def test_next_day(self):
+        self.fill_cache()
+        FakeDate.current += datetime.timedelta(days=1)
+        self.data._check_data_version()
+        self.assertNotIn(1, self.data._cache, "Day counts have to be calculated again on the next day")
+
+    def test_data_version(self):
+        self.fill_cache()
+        self.versions = [(DataVersions.CASES, 1), (DataVersions.HOSPITALISATION, 2)]
+        self.data._check_data_version()
+        self.assertNotIn(1, self.data._cache, "Sources without a timestamp should invalidate the snapshots")
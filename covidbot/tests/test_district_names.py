@@ -0,0 +1,63 @@
+import logging
+from unittest import TestCase
+
+from covidbot.covid_data.updater import updater
+from covidbot.covid_data.updater.updater import DistrictNames, Updater
+from covidbot.tests.fakes import FakeConnection
+
+
+class NameUpdater(Updater):
+    def __init__(self, conn):
+        self.connection = conn
+        self.log = logging.getLogger(__name__)
+
+    def update(self) -> bool:
+        return False
+
+    def get_last_update(self):
+        return None
+
+
+class TestDistrictNames(TestCase):
+    def setUp(self) -> None:
+        updater._district_names = None
+        self.counties = [(0, "Deutschland"), (6, "Hessen"), (6431, "LK Bergstraße"), (6432, "LK Darmstadt-Dieburg"),
+                         (6411, "SK Darmstadt")]
+        self.alt_names = [(6, "HE")]
+        self.conn = FakeConnection({
+            "SELECT (SELECT COUNT(*)": lambda query, args: [(len(self.counties), len(self.alt_names))],
+            "SELECT rs, county_name": lambda query, args: self.counties,
+            "SELECT district_id, alt_name": lambda query, args: self.alt_names})
+        self.updater = NameUpdater(self.conn)
+
+    def tearDown(self) -> None:
+        updater._district_names = None
+
+    def test_resolve(self):
+        self.assertEqual(0, self.updater.get_district_id("Deutschland"))
+        self.assertEqual(6431, self.updater.get_district_id("bergstrasse"), "Compared like the collation does")
+        self.assertEqual(6411, self.updater.get_district_id("SK Darmstadt"), "Exact match if several match")
+        self.assertIsNone(self.updater.get_district_id("Darmstadt"))
+        self.assertEqual(6, self.updater.get_district_id("HE"), "Alternative names after counties")
+
+    def test_loaded_once(self):
+        for _ in range(3):
+            self.updater.get_district_id("Hessen")
+            NameUpdater(self.conn).get_district_id("Deutschland")
+        self.assertEqual(3, len(self.conn.queries))
+
+    def test_reload_on_miss(self):
+        self.assertIsNone(self.updater.get_district_id("Bayern"))
+        updater._district_names.checked -= 1
+
+        self.counties.append((9, "Bayern"))
+        self.assertEqual(9, self.updater.get_district_id("Bayern"))
+
+    def test_reload_after_interval(self):
+        self.assertEqual(6431, self.updater.get_district_id("LK Bergstraße"))
+        self.counties[2] = (6499, "LK Bergstraße")
+        self.alt_names.append((6499, "Bergstraße"))
+        self.assertEqual(6431, self.updater.get_district_id("LK Bergstraße"), "Cached until checked again")
+
+        updater._district_names.checked -= DistrictNames.CHECK_INTERVAL
+        self.assertEqual(6499, self.updater.get_district_id("LK Bergstraße"))
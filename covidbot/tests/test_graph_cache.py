@@ -0,0 +1,95 @@
+import datetime
+import os
+import tempfile
+from unittest import TestCase, mock
+
+import numpy
+
+from covidbot.covid_data.graph_cache import GraphCache
+
+
+def writer(size: int):
+    def write(filepath: str):
+        with open(filepath, "wb") as f:
+            f.write(b"x" * size)
+
+    return write
+
+
+class TestGraphCache(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = GraphCache(self.tmp.name, max_bytes=300, memory_bytes=250)
+        grace = mock.patch.object(GraphCache, "EVICTION_GRACE", 0)
+        grace.start()
+        self.addCleanup(grace.stop)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_key(self):
+        day = datetime.date(2021, 5, 1)
+        key = GraphCache.get_key("incidence", "Kiel", day, [day], [1.5])
+        self.assertEqual(key, GraphCache.get_key("incidence", "Kiel", day, [day], [1.5]))
+        self.assertNotEqual(key, GraphCache.get_key("infections", "Kiel", day, [day], [1.5]))
+        self.assertNotEqual(key, GraphCache.get_key("incidence", "Kiel", day, [day], [1.6]))
+        self.assertNotEqual(GraphCache.get_key("icu", numpy.array([1, 2])),
+                            GraphCache.get_key("icu", numpy.array([1.0, 2.0])))
+
+    def test_store(self):
+        self.assertIsNone(self.cache.get("a", "incidence"))
+        filepath = self.cache.store("a", "incidence", writer(100))
+        self.assertEqual(filepath, self.cache.get("a", "incidence"))
+        self.assertEqual(b"x" * 100, self.cache.read(filepath))
+
+        os.remove(filepath)
+        self.assertIsNone(self.cache.get("a", "incidence"), "Deleted files should be rendered again")
+
+    def test_evict(self):
+        first = self.cache.store("a", "incidence", writer(100))
+        second = self.cache.store("b", "incidence", writer(100))
+        self.cache.store("c", "infections", writer(100))
+        self.cache.get("a", "incidence")
+
+        self.cache.store("d", "infections", writer(100))
+        self.assertTrue(os.path.isfile(first), "Recently used graph should be kept")
+        self.assertFalse(os.path.isfile(second), "Least recently used graph should be evicted")
+        self.assertIsNone(self.cache.get("b", "incidence"))
+
+        # Index is shared with other processes
+        other = GraphCache(self.tmp.name, max_bytes=300)
+        self.assertEqual(first, other.get("a", "incidence"))
+        self.assertIsNone(other.get("b", "incidence"))
+
+    def test_evict_recently_used(self):
+        GraphCache.EVICTION_GRACE = 60
+        first = self.cache.store("a", "incidence", writer(200))
+        self.cache.store("b", "incidence", writer(200))
+        self.assertTrue(os.path.isfile(first), "Graph might be sent by another process")
+
+    def test_memory(self):
+        first = self.cache.store("a", "incidence", writer(100))
+        second = self.cache.store("b", "incidence", writer(100))
+        third = self.cache.store("c", "incidence", writer(100))
+        for filepath in [first, second, third]:
+            self.cache.read(filepath)
+
+        for filepath in [first, second, third]:
+            os.remove(filepath)
+        self.assertEqual(b"x" * 100, self.cache.read(third), "Recently read graphs should be served from memory")
+        self.assertEqual(b"x" * 100, self.cache.read(second))
+        with self.assertRaises(FileNotFoundError):
+            self.cache.read(first)
+
+    def test_alias(self):
+        self.assertIsNone(self.cache.get_alias("kiel", "1", "incidence"))
+        filepath = self.cache.store("a", "incidence", writer(100), alias=("kiel", "1"))
+        self.assertEqual(filepath, self.cache.get_alias("kiel", "1", "incidence"))
+        self.assertIsNone(self.cache.get_alias("kiel", "2", "incidence"), "Alias should only match its version")
+
+        self.cache.set_alias("kiel", "2", "a")
+        self.assertEqual(filepath, self.cache.get_alias("kiel", "2", "incidence"))
+
+        self.cache.store("b", "incidence", writer(100))
+        self.cache.store("c", "incidence", writer(150))
+        self.assertIsNone(self.cache.get_alias("kiel", "2", "incidence"), "Alias of evicted graph should be removed")
@@ -0,0 +1,93 @@
+import datetime
+import io
+from unittest import TestCase, mock
+
+import requests
+
+from covidbot.covid_data.updater import cases
+from covidbot.covid_data.updater.cases import RKIHistoryUpdater
+from covidbot.tests.fakes import FakeConnection
+
+
+class FakeSession:
+    """
+    Serves a growing CSV file and answers Range requests
+    """
+
+    def __init__(self):
+        self.body = b""
+        self.ranges = []
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        response = requests.Response()
+        response.status_code = 200
+        start = 0
+        if headers and "Range" in headers:
+            start = int(headers["Range"][len("bytes="):-1])
+            response.status_code = 206
+        self.ranges.append(start)
+        response.raw = io.BytesIO(self.body[start:])
+        response.encoding = "utf-8"
+        return response
+
+
+class FakeDate(datetime.date):
+    current = datetime.date(2021, 5, 10)
+
+    @classmethod
+    def today(cls):
+        return cls.current
+
+
+class TestHistoryAppended(TestCase):
+    def setUp(self) -> None:
+        self.state = {}
+        self.session = FakeSession()
+        self.conn = FakeConnection({
+            "SELECT length, tail_hash, header": lambda query, args: [self.state[args[0]]] if args[0] in self.state
+            else [],
+            "INSERT INTO http_resources (url_hash, url, length": self.set_state})
+        self.updater = RKIHistoryUpdater(self.conn)
+
+        self.add_days(datetime.date(2021, 2, 1), datetime.date(2021, 5, 9))
+        patches = [mock.patch.object(cases, "date", FakeDate),
+                   mock.patch("covidbot.covid_data.updater.updater.get_http_session", return_value=self.session)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def set_state(self, query, args):
+        self.state[args[0]] = (args[2], args[3], args[4])
+        return []
+
+    def add_days(self, first: datetime.date, last: datetime.date):
+        districts = range(1001, 1101)
+        if not self.session.body:
+            self.session.body = f"time_iso8601,{','.join(map(str, districts))},sum_cases\n".encode("utf-8")
+        while first <= last:
+            values = ",".join(str(rs + first.day) for rs in districts)
+            self.session.body += f"{first.isoformat()}T00:00:00+0000,{values},0\n".encode("utf-8")
+            first += datetime.timedelta(days=1)
+
+    def get_dates(self):
+        data = self.updater.get_history(RKIHistoryUpdater.CASES_URL, "total_cases")
+        return sorted(set(data['date']))
+
+    def test_appended_days(self):
+        dates = self.get_dates()
+        self.assertEqual(datetime.date(2021, 5, 8), dates[-1])
+        self.assertEqual(datetime.date(2021, 3, 12), dates[0])
+        self.assertEqual([0], self.session.ranges)
+
+        for day in [datetime.date(2021, 5, 10), datetime.date(2021, 5, 11)]:
+            FakeDate.current = day + datetime.timedelta(days=1)
+            self.add_days(day, day)
+            dates = self.get_dates()
+            self.assertEqual(day - datetime.timedelta(days=1), dates[-1], "Row of the previous day should be ingested")
+            self.assertEqual(FakeDate.current - datetime.timedelta(days=59), dates[0],
+                             "Whole window should be read again for corrections")
+            self.assertEqual(58, len(dates))
+            self.assertGreater(self.session.ranges[-1], 0, "Rows before the window should not be fetched again")
+
+    def tearDown(self) -> None:
+        FakeDate.current = datetime.date(2021, 5, 10)
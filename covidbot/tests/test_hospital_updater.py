@@ -0,0 +1,43 @@
+import datetime
+from decimal import Decimal
+from unittest import TestCase, mock
+
+from covidbot.covid_data.updater import updater
+from covidbot.covid_data.updater.hospital import HospitalisationRKIUpdater
+from covidbot.tests.fakes import FakeConnection
+
+CSV = ["Datum,Bundesland,Bundesland_Id,Altersgruppe,7T_Hospitalisierung_Faelle,7T_Hospitalisierung_Inzidenz",
+       "2021-11-02,Bundesgebiet,00,00+,5000,6.01",
+       "2021-11-02,Hessen,06,00+,400,6.36",
+       "2021-11-01,Hessen,06,00+,NA,NA"]
+
+
+class TestHospitalisationUpdater(TestCase):
+    def setUp(self) -> None:
+        updater._district_names = None
+        self.stored = []
+        self.conn = FakeConnection({
+            "SELECT (SELECT COUNT(*)": [(2, 0)],
+            "SELECT rs, county_name": [(0, "Deutschland"), (6, "Hessen")],
+            "SELECT district_id, date, age, number, incidence": lambda query, args: self.stored})
+        self.updater = HospitalisationRKIUpdater(self.conn)
+
+    def tearDown(self) -> None:
+        updater._district_names = None
+
+    def update(self) -> bool:
+        self.conn.queries.clear()
+        with mock.patch.object(self.updater, "get_resource_lines", return_value=iter(CSV)):
+            return self.updater.update()
+
+    def test_changes(self):
+        self.assertTrue(self.update())
+
+        day = datetime.date(2021, 11, 2)
+        self.stored = [(0, day, "00+", 5000, Decimal("6.01")), (6, day, "00+", 400, Decimal("6.36"))]
+        self.assertFalse(self.update(), "Unchanged rows are no new data")
+        upsert = next(query for query in self.conn.queries if query.startswith("INSERT INTO hospitalisation"))
+        self.assertIn("updated=CURRENT_TIMESTAMP()", upsert, "Fetch time should be kept for the throttle")
+
+        self.stored[1] = (6, day, "00+", 398, Decimal("6.33"))
+        self.assertTrue(self.update(), "Revised rows are new data")
@@ -0,0 +1,36 @@
+from unittest import TestCase
+
+from covidbot.covid_data import prerender
+from covidbot.covid_data.prerender import GraphPreRenderer
+from covidbot.tests.fakes import FakeConnection
+
+
+class FakeVisualization:
+    def infections_graph(self, district_id: int) -> str:
+        return f"infections-{district_id}.jpg"
+
+    def icu_graph(self, district_id: int) -> str:
+        raise AttributeError("'NoneType' object has no attribute 'isoformat'")
+
+
+class TestGraphPreRenderer(TestCase):
+    def test_get_jobs(self):
+        conn = FakeConnection({"SELECT c.rs": [(1001,), (0,), (1,)],
+                               "SELECT DISTINCT district_id FROM icu_beds": [(0,), (1001,)],
+                               "SELECT DISTINCT district_id FROM covid_vaccinations": [(0,), (1,)]})
+        jobs = GraphPreRenderer(conn, {}, ".").get_jobs()
+
+        self.assertEqual([("infections_graph", 1001), ("incidence_graph", 1001), ("icu_graph", 1001)], jobs[:3])
+        self.assertIn(("vaccination_speed_graph", 0), jobs)
+        self.assertIn(("vaccination_graph", 1), jobs)
+        self.assertNotIn(("icu_graph", 1), jobs)
+        self.assertEqual(12, len(jobs))
+
+    def test_render(self):
+        prerender._visualization = FakeVisualization()
+        try:
+            self.assertEqual((("infections_graph", 0), None), prerender._render(("infections_graph", 0)))
+            job, error = prerender._render(("icu_graph", 3))
+            self.assertIn("AttributeError", error)
+        finally:
+            prerender._visualization = None
@@ -0,0 +1,43 @@
+from unittest import TestCase
+
+from covidbot.covid_data.search_index import DistrictSearchIndex, edit_distance
+
+
+class TestDistrictSearchIndex(TestCase):
+    def setUp(self) -> None:
+        counties = [(0, "Deutschland", "Staat"), (6, "Hessen", "Bundesland"), (9, "Bayern", "Bundesland"),
+                    (5, "Nordrhein-Westfalen", "Bundesland"), (3159, "Göttingen", "Landkreis"),
+                    (5113, "Essen", "Kreisfreie Stadt"), (5913, "Dortmund", "Kreisfreie Stadt"),
+                    (6611, "Kassel, Stadt", "Kreisfreie Stadt"), (6633, "Kassel, Landkreis", "Landkreis"),
+                    (9162, "München", "Kreisfreie Stadt"), (9184, "München", "Landkreis"),
+                    (5315, "Köln", "Kreisfreie Stadt"), (8425, "Alb-Donau-Kreis", "Landkreis")]
+        alt_names = [(5, "Nordrhein-Westfalen", "NRW"), (6, "Hessen", "DE-HE"), (5315, "Köln", "Cologne")]
+        self.index = DistrictSearchIndex(sorted(counties), alt_names)
+
+    def test_search(self):
+        self.assertEqual([6611, 6633], [d.id for d in self.index.search("Kassel")])
+        self.assertEqual([6611], [d.id for d in self.index.search("Kassel Stadt")])
+        self.assertEqual([6611], [d.id for d in self.index.search("Stadt Kassel")])
+        self.assertEqual([6633], [d.id for d in self.index.search("Kassel Land")])
+        self.assertEqual([5113], [d.id for d in self.index.search("Essen")])
+        self.assertEqual([5315], [d.id for d in self.index.search("cologne")])
+        self.assertEqual([5], [d.id for d in self.index.search("nrw")])
+        self.assertEqual([3159], [d.id for d in self.index.search("3159")])
+        self.assertEqual([], self.index.search("1234"))
+
+    def test_collation(self):
+        self.assertEqual([3159], [d.id for d in self.index.search("Gottingen")])
+        self.assertEqual([5315], [d.id for d in self.index.search("KÖLN")])
+
+    def test_fuzzy(self):
+        self.assertEqual([9162, 9184], [d.id for d in self.index.search("Muenchen")])
+        self.assertEqual([5315], [d.id for d in self.index.search("Koeln")])
+        self.assertEqual([5913], [d.id for d in self.index.search("Dortmnd")])
+        self.assertEqual([], self.index.search("Hallo"), "Short words should not be matched fuzzy")
+        self.assertEqual([], self.index.search("den neuen Bericht finde ich super! 👍🏽"))
+
+    def test_edit_distance(self):
+        self.assertEqual(0, edit_distance("kassel", "kassel", 1))
+        self.assertEqual(1, edit_distance("dortmnd", "dortmund", 2))
+        self.assertIsNone(edit_distance("essen", "hessen", 0))
+        self.assertIsNone(edit_distance("bayern", "berlin", 2))
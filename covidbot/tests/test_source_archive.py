@@ -0,0 +1,89 @@
+import io
+import logging
+import os
+import tempfile
+from unittest import TestCase
+
+import requests
+
+from covidbot.covid_data.updater.archive import SourceArchive
+from covidbot.covid_data.updater.updater import Updater
+from covidbot.tests.fakes import FakeConnection
+
+URL = "https://example.org/data.csv"
+
+
+def archive_connection(payloads: list) -> FakeConnection:
+    """
+    :param payloads: Receives (url, content hash) of each payload recorded in source_payloads
+    """
+    def select(query, args):
+        return [(p[1],) for p in payloads if p[0] == args[0]][-1:]
+
+    def insert(query, args):
+        payloads.append((args[0], args[2]))
+        return []
+
+    return FakeConnection({"SELECT content_hash": select, "INSERT INTO source_payloads": insert})
+
+
+class ArchivingUpdater(Updater):
+    def __init__(self, conn):
+        self.connection = conn
+        self.log = logging.getLogger(__name__)
+
+    def update(self) -> bool:
+        return False
+
+    def get_last_update(self):
+        return None
+
+
+def make_response(body: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(body)
+    response.encoding = "utf-8"
+    return response
+
+
+class TestSourceArchive(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.archive = SourceArchive(self.tmp.name)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_store(self):
+        first = self.archive.store(URL, [b"a,b\n", b"1,2\n"])
+        second = self.archive.store(URL, [b"a,b\n1,2\n"])
+        self.assertEqual(first, second)
+        self.assertEqual(1, len(os.listdir(os.path.join(self.tmp.name, SourceArchive.source_key(URL)))))
+
+        with self.archive.open(URL, first) as f:
+            self.assertEqual(b"a,b\n1,2\n", f.read())
+        self.assertFalse(self.archive.exists(URL, "0" * 64))
+
+    def test_skip_ingested(self):
+        payloads = []
+        updater = ArchivingUpdater(archive_connection(payloads))
+        updater.archive = self.archive
+
+        response = updater._archive_response(URL, make_response(b"a,b\n1,2\n"))
+        self.assertEqual("a,b\n1,2\n", response.text)
+        self.assertIsNone(updater._archive_response(URL, make_response(b"a,b\n1,2\n")),
+                          "Unchanged payload should not be ingested again")
+
+        response = updater._archive_response(URL, make_response(b"a,b\n1,3\n"))
+        self.assertEqual(["a,b", "1,3"], list(updater._iter_lines(response)))
+        self.assertEqual(2, len(payloads))
+
+    def test_replay(self):
+        updater = ArchivingUpdater(archive_connection([]))
+        updater.archive = self.archive
+        content_hash = self.archive.store(URL, [b"a,b\n1,2\n"])
+
+        updater.replay = {URL: content_hash}
+        self.assertEqual("a,b\n1,2\n", updater.get_resource(URL))
+        self.assertEqual(content_hash, updater.get_ingested_payload(URL))
@@ -152,6 +152,9 @@ class TestSubscriptionManager(TestCase):
         with self.conn.cursor() as cursor:
             # noinspection SqlWithoutWhere
             cursor.execute("DELETE FROM covid_data")
+            cursor.execute("TRUNCATE TABLE covid_data_calculated;")
+            cursor.execute("TRUNCATE TABLE district_threshold_crossings;")
+            cursor.execute("TRUNCATE TABLE district_facts;")
             cursor.execute("TRUNCATE TABLE covid_vaccinations;")
             cursor.execute("TRUNCATE TABLE covid_r_value;")
             cursor.execute("TRUNCATE TABLE icu_beds;")
@@ -0,0 +1,82 @@
+import datetime
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy
+
+from covidbot.covid_data.timeseries import TimeSeriesStore
+from covidbot.covid_data.versions import DataVersions
+from covidbot.tests.fakes import FakeConnection
+
+
+class TestTimeSeriesStore(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        day = datetime.date(2021, 5, 1)
+        self.results = {
+            "SELECT rs, date, new_cases": [(1, day, 5, 0, 12.5), (1, day + datetime.timedelta(days=2), 7, 1, 15.0),
+                                           (2, day + datetime.timedelta(days=1), None, None, 3.0)],
+            "SELECT district_id, date, clear": [],
+            "SELECT district_id, date, vaccinated_partial": [(1, day + datetime.timedelta(days=3), 100, 50, None, 20)],
+            "SELECT district_id, date, incidence": [],
+            "SELECT rs, county_name": [(1, "Flensburg", 90000), (2, "Kiel", 250000)],
+            "SELECT district_id, MAX(updated)": []}
+        self.store = TimeSeriesStore(self.tmp.name, check_interval=0)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_rebuild(self):
+        self.assertFalse(self.store.is_available(1))
+        self.store.rebuild(FakeConnection(self.results))
+        self.assertTrue(self.store.is_available(1))
+        self.assertFalse(self.store.is_available(3))
+        self.assertEqual(("Kiel", 250000), self.store.get_district(2))
+
+        dates, values = self.store.get_rows(["new_cases", "incidence"], 1)
+        self.assertEqual([datetime.date(2021, 5, 1), datetime.date(2021, 5, 3)], TimeSeriesStore.to_dates(dates))
+        self.assertEqual([5, 7], values[0].tolist())
+        self.assertEqual([12.5, 15.0], values[1].tolist())
+
+        dates, values = self.store.get_rows(["new_cases"], 1, datetime.date(2021, 5, 1), strict=True)
+        self.assertEqual([datetime.date(2021, 5, 3)], TimeSeriesStore.to_dates(dates))
+
+        dates, values = self.store.get_rows(["vaccinated_partial", "vaccinated_booster"], 1)
+        self.assertEqual([datetime.date(2021, 5, 4)], TimeSeriesStore.to_dates(dates))
+        self.assertEqual(100, values[0][0])
+
+    def test_new_version(self):
+        self.store.rebuild(FakeConnection(self.results))
+        self.results["SELECT rs, county_name"] = [(1, "Flensburg", 91000)]
+        self.store.rebuild(FakeConnection(self.results))
+        self.store.rebuild(FakeConnection(self.results))
+
+        self.assertEqual(("Flensburg", 91000), self.store.get_district(1))
+        self.assertFalse(self.store.is_available(2))
+        self.assertEqual(2, len([d for d in os.listdir(self.tmp.name) if d.startswith("v")]),
+                         "Only the current and the previous version should be kept")
+
+    def test_unchanged_sources(self):
+        self.results["SELECT source, version"] = [(DataVersions.CASES, 1), (DataVersions.VACCINATIONS, 1)]
+        self.store.rebuild(FakeConnection(self.results))
+
+        # Vaccinations and older cases are unchanged, a new day of ICU data extends the store
+        day = datetime.date(2021, 5, 1)
+        self.results["SELECT rs, date, new_cases"] = [(1, day, 99, 0, 1.0)]
+        self.results["SELECT district_id, date, clear"] = [(2, day + datetime.timedelta(days=5), 10, 20, 3, 1)]
+        conn = FakeConnection(self.results)
+        self.store.rebuild(conn)
+        self.assertFalse(any(query.startswith("SELECT rs, date, new_cases") for query in conn.queries),
+                         "Unchanged sources should not be queried")
+
+        dates, values = self.store.get_rows(["new_cases", "vaccinated_partial", "icu_clear"], 1)
+        self.assertEqual([5, 7], values[0][~numpy.isnan(values[0])].tolist())
+        self.assertEqual([100], values[1][~numpy.isnan(values[1])].tolist())
+        dates, values = self.store.get_rows(["icu_clear"], 2)
+        self.assertEqual([datetime.date(2021, 5, 6)], TimeSeriesStore.to_dates(dates))
+
+        self.results["SELECT source, version"] = [(DataVersions.CASES, 2), (DataVersions.VACCINATIONS, 1)]
+        self.store.rebuild(FakeConnection(self.results))
+        dates, values = self.store.get_rows(["new_cases"], 1)
+        self.assertEqual([99], values[0].tolist())
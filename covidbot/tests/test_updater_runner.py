@@ -0,0 +1,94 @@
+import threading
+import time
+from unittest import TestCase
+
+from covidbot.covid_data.updater.runner import UpdaterRunner
+from covidbot.covid_data.updater.updater import Updater
+from covidbot.tests.fakes import FakeConnection
+
+
+def connect():
+    return FakeConnection(autocommit=False)
+
+
+class FakeUpdater(Updater):
+    calls = []
+    lock = threading.Lock()
+    duration = 0.0
+
+    def __init__(self, conn):
+        self.connection = conn
+
+    def update(self) -> bool:
+        with self.lock:
+            FakeUpdater.calls.append(("start", self.__class__.__name__))
+        time.sleep(self.duration)
+        with self.lock:
+            FakeUpdater.calls.append(("end", self.__class__.__name__))
+        return True
+
+    def get_last_update(self):
+        return None
+
+
+class Districts(FakeUpdater):
+    pass
+
+
+class SlowCases(FakeUpdater):
+    depends_on = [Districts]
+    duration = 0.3
+
+
+class SlowVaccinations(FakeUpdater):
+    depends_on = [Districts]
+    duration = 0.3
+
+
+class Broken(FakeUpdater):
+    depends_on = [Districts]
+
+    def update(self) -> bool:
+        raise ValueError("Invalid Data")
+
+
+class Dependent(FakeUpdater):
+    depends_on = [Broken]
+
+
+class TestUpdaterRunner(TestCase):
+    def setUp(self) -> None:
+        FakeUpdater.calls = []
+
+    def test_dependencies(self):
+        runner = UpdaterRunner(connect, [SlowCases, SlowVaccinations])
+        self.assertEqual([Districts, SlowCases, SlowVaccinations], runner.updaters)
+
+        start = time.monotonic()
+        results = runner.run()
+        self.assertLess(time.monotonic() - start, 0.55, "Independent updaters should run concurrently")
+
+        self.assertEqual(("end", "Districts"), FakeUpdater.calls[1])
+        self.assertTrue(all(result.updated and not result.error for result in results))
+        self.assertGreaterEqual(results[1].duration, 0.3)
+
+    def test_failure(self):
+        results = UpdaterRunner(connect, [Dependent, SlowCases]).run()
+        results = {result.updater: result for result in results}
+
+        self.assertIsInstance(results[Broken].error, ValueError)
+        self.assertTrue(results[Dependent].skipped)
+        self.assertEqual("Broken", results[Dependent].failed_dependency)
+        self.assertFalse(results[Dependent].updated)
+        self.assertTrue(results[SlowCases].updated)
+        self.assertNotIn(("start", "Dependent"), FakeUpdater.calls)
+
+    def test_circular(self):
+        class A(FakeUpdater):
+            pass
+
+        class B(FakeUpdater):
+            depends_on = [A]
+
+        A.depends_on = [B]
+        self.assertRaises(ValueError, UpdaterRunner, connect, [A])
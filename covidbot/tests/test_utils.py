@@ -118,3 +118,8 @@ class Test(TestCase):
         self.assertEqual(TrendValue.SAME, get_trend(100, 100))
         self.assertEqual(TrendValue.UP, get_trend(98, 101))
         self.assertEqual(TrendValue.DOWN, get_trend(102, 100))
+
+    def test_batched(self):
+        self.assertEqual([[0, 1, 2], [3, 4, 5], [6]], list(batched(iter(range(7)), 3)))
+        self.assertEqual([[0, 1]], list(batched([0, 1], 2)))
+        self.assertEqual([], list(batched([], 2)))
@@ -0,0 +1,36 @@
+import datetime
+from unittest import TestCase
+
+import pandas as pd
+
+from covidbot.covid_data.updater.vaccination import VaccinationGermanyUpdater
+
+
+class TestVaccinationGermanyUpdater(TestCase):
+    def setUp(self) -> None:
+        self.data = pd.DataFrame([("2021-01-01", 1, "Comirnaty", 1, 10),
+                                  ("2021-01-01", 17, "Comirnaty", 1, 5),
+                                  ("2021-01-02", 2, "Janssen", 1, 4),
+                                  ("2021-01-04", 1, "Comirnaty", 2, 6),
+                                  ("2021-01-04", 2, "Comirnaty", 3, 2)],
+                                 columns=["Impfdatum", "BundeslandId_Impfort", "Impfstoff", "Impfserie", "Anzahl"])
+        self.data['Impfdatum'] = pd.to_datetime(self.data['Impfdatum'])
+        self.population = {0: 1000, 1: 100, 2: 200}
+
+    def test_calculate_rows(self):
+        rows = VaccinationGermanyUpdater.calculate_rows(self.data, datetime.date(2021, 1, 1), self.population)
+        rows = {(row[0], row[1]): row[2:] for row in rows}
+        self.assertEqual(9, len(rows), "Germany and states 1 and 2 for each day after since")
+
+        self.assertEqual((10, 0, 0, 0.1, 0.0, 0.0, 0), rows[(1, datetime.date(2021, 1, 3))])
+        self.assertEqual((10, 6, 0, 0.1, 0.06, 0.0, 6), rows[(1, datetime.date(2021, 1, 4))])
+        self.assertEqual((4, 4, 0, 0.02, 0.02, 0.0, 4), rows[(2, datetime.date(2021, 1, 2))])
+        self.assertEqual((4, 4, 2, 0.02, 0.02, 0.01, 2), rows[(2, datetime.date(2021, 1, 4))])
+
+        # Germany includes vaccinations of the federal government, but full ones only after the first second dose
+        self.assertEqual((19, 0, 0, 0.019, 0.0, 0.0, 4), rows[(0, datetime.date(2021, 1, 2))])
+        self.assertEqual((19, 10, 2, 0.019, 0.01, 0.002, 8), rows[(0, datetime.date(2021, 1, 4))])
+
+    def test_no_new_days(self):
+        self.assertEqual([], VaccinationGermanyUpdater.calculate_rows(self.data, datetime.date(2021, 1, 4),
+                                                                      self.population))
@@ -1,9 +1,75 @@
-from unittest import TestCase
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase, mock
 
 from covidbot.covid_data import Visualization
+from covidbot.covid_data.versions import DataVersions
+from covidbot.tests.fakes import FakeConnection, build_timeseries_store
 
 
 class TestVisualization(TestCase):
     def test_tick_formatter_german_numbers(self):
         self.assertEqual("1,1 Mio.", Visualization.tick_formatter_german_numbers(1100000, 0))
         self.assertEqual("900.000", Visualization.tick_formatter_german_numbers(900000, 0))
+
+
+class TestConcurrentRendering(TestCase):
+    DISTRICTS = 25
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = build_timeseries_store(os.path.join(self.tmp.name, "timeseries"), self.DISTRICTS, 70)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def render(self, directory: str, jobs, workers: int):
+        os.makedirs(directory)
+        visualization = Visualization(None, directory, disable_cache=True, timeseries=self.store)
+        with ThreadPoolExecutor(workers) as executor:
+            return list(executor.map(lambda job: getattr(visualization, job[0])(*job[1:]), jobs))
+
+    def test_threads(self):
+        jobs = []
+        for rs in range(1, self.DISTRICTS + 1):
+            jobs.append(("infections_graph", rs, 49 if rs % 2 else 28))
+            jobs.append(("incidence_graph", rs))
+
+        serial = self.render(os.path.join(self.tmp.name, "serial"), jobs, 1)
+        threaded = self.render(os.path.join(self.tmp.name, "threaded"), jobs, 8)
+
+        self.assertEqual(50, len(set(serial)))
+        for serial_file, threaded_file in zip(serial, threaded):
+            with open(serial_file, "rb") as s, open(threaded_file, "rb") as t:
+                self.assertEqual(s.read(), t.read(), f"{os.path.basename(serial_file)} differs when rendered in threads")
+
+
+class TestCurrentGraph(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = build_timeseries_store(os.path.join(self.tmp.name, "timeseries"), 2, 70)
+        graphics_dir = os.path.join(self.tmp.name, "graphics")
+        os.makedirs(graphics_dir)
+        self.versions = {"SELECT source, version": [(DataVersions.CASES, 3)]}
+        self.visualization = Visualization(None, graphics_dir, timeseries=self.store)
+        self.visualization.data_versions = DataVersions(FakeConnection(self.versions), check_interval=0)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_unchanged_data(self):
+        filepath = self.visualization.infections_graph(1)
+        with mock.patch.object(self.store, "is_available", side_effect=AssertionError("Data was read")):
+            self.assertEqual(filepath, self.visualization.infections_graph(1))
+        self.assertNotEqual(filepath, self.visualization.infections_graph(1, 28))
+
+    def test_changed_data(self):
+        filepath = self.visualization.infections_graph(1)
+        self.versions["SELECT source, version"] = [(DataVersions.CASES, 4)]
+        with mock.patch.object(self.store, "is_available", wraps=self.store.is_available) as is_available:
+            self.assertEqual(filepath, self.visualization.infections_graph(1), "Same data should hit the cache")
+            self.assertTrue(is_available.called)
+
+        with mock.patch.object(self.store, "is_available", side_effect=AssertionError("Data was read")):
+            self.assertEqual(filepath, self.visualization.infections_graph(1))
@@ -299,7 +299,7 @@ class UserManager(object):
         except OperationalError as e:
             self.log.exception(f"OperationalError: {e.msg}", exc_info=e)
             self.connection.reconnect()
-            return self.get_user_number(platform)
+            return 0
 
     def get_ranked_subscriptions(self) -> List[Tuple[int, str]]:
         with self.connection.cursor(dictionary=True) as cursor:
@@ -327,7 +327,7 @@ class UserManager(object):
         except OperationalError as e:
             self.log.exception(f"OperationalError: {e.msg}", exc_info=e)
             self.connection.reconnect()
-            return self.get_mean_subscriptions()
+            return 1.0
 
     def get_most_subscriptions(self) -> int:
         with self.connection.cursor(dictionary=True) as cursor:
@@ -430,7 +430,7 @@ class UserManager(object):
         except OperationalError as e:
             self.log.exception(f"OperationalError: {e.msg}", exc_info=e)
             self.connection.reconnect()
-            return self.get_social_network_user_number(network)
+            return 0
 
     def set_user_setting(self, user_id: int, setting: BotUserSettings, value: bool):
         with self.connection.cursor(dictionary=True) as cursor:
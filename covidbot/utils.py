@@ -2,7 +2,7 @@ import re
 import string
 from datetime import timedelta
 from enum import Enum
-from typing import List, Optional, Union, Callable
+from typing import List, Optional, Union, Callable, Iterable, Iterator
 
 from covidbot.covid_data.models import TrendValue
 from covidbot.interfaces.bot_response import BotResponse
@@ -266,3 +266,17 @@ def get_trend(prev_value: Optional[Union[int, float]], current_value: Optional[U
 def date_range(start_date, end_date):
     for n in range(int((end_date - start_date).days)):
         yield start_date + timedelta(n)
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[List]:
+    """
+    Splits iterable into lists of at most size items, without reading it completely
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
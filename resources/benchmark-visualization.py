@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Measures the render time per graph of Visualization on generated data, no database needed.
+Run from the repository root: python resources/benchmark-visualization.py [--rounds N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from covidbot.covid_data.visualization import Visualization
+from covidbot.tests.fakes import build_timeseries_store
+
+DISTRICTS = 20
+DAYS = 400
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=3, help='Renders of each graph per district')
+    args = parser.parse_args()
+
+    graphs = [("infections_graph", ()), ("incidence_graph", ()), ("infections_graph", (140,)),
+              ("vaccination_graph", ()), ("vaccination_speed_graph", ())]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = build_timeseries_store(os.path.join(tmp, "timeseries"), DISTRICTS, DAYS, vaccinations=True)
+        graphics_dir = os.path.join(tmp, "graphics")
+        os.makedirs(graphics_dir)
+        visualization = Visualization(None, graphics_dir, disable_cache=True, timeseries=store)
+
+        # First graph loads fonts and resources, not part of the measurement
+        visualization.infections_graph(1)
+
+        print(f"{'Graph':<30} {'Mean':>8} {'Median':>8} {'Min':>8}")
+        total = []
+        for graph, graph_args in graphs:
+            durations = []
+            for _ in range(args.rounds):
+                for district_id in range(1, DISTRICTS + 1):
+                    start = time.perf_counter()
+                    getattr(visualization, graph)(district_id, *graph_args)
+                    durations.append(time.perf_counter() - start)
+            total += durations
+            name = graph + (f"({', '.join(map(str, graph_args))})" if graph_args else "")
+            print(f"{name:<30} {statistics.mean(durations) * 1000:>6.1f}ms "
+                  f"{statistics.median(durations) * 1000:>6.1f}ms {min(durations) * 1000:>6.1f}ms")
+        print(f"{'All':<30} {statistics.mean(total) * 1000:>6.1f}ms {statistics.median(total) * 1000:>6.1f}ms "
+              f"{min(total) * 1000:>6.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
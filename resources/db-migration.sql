@@ -8,4 +8,44 @@ alter table bot_user change added created datetime(6) default current_timestamp(
 
 DROP VIEW covid_data_calculated;
 
-INSERT IGNORE INTO report_subscriptions (user_id, report) SELECT user_id, 'cases-germany' FROM bot_user
\ No newline at end of file
+INSERT IGNORE INTO report_subscriptions (user_id, report) SELECT user_id, 'cases-germany' FROM bot_user;
+
+-- covid_data_calculated is a table instead of a view now, backfilled from covid_data
+DROP VIEW IF EXISTS covid_data_calculated;
+CREATE TABLE IF NOT EXISTS covid_data_calculated (rs INTEGER, county_name VARCHAR(255), type VARCHAR(30), parent INTEGER,
+    date DATE, total_cases INT, new_cases INT, total_deaths INT, new_deaths INT, incidence DECIMAL(7,2),
+    last_update DATETIME, PRIMARY KEY(rs, date));
+INSERT INTO covid_data_calculated (rs, county_name, type, parent, date, total_cases, new_cases, total_deaths, new_deaths, incidence, last_update)
+SELECT d.rs, c.county_name, c.type, c.parent, d.date, d.total_cases, d.total_cases - y.total_cases,
+       d.total_deaths, d.total_deaths - y.total_deaths, d.incidence, d.last_update
+FROM covid_data d
+    LEFT JOIN covid_data y ON y.rs = d.rs AND y.date = SUBDATE(d.date, 1)
+    LEFT JOIN counties c ON c.rs = d.rs;
+
+-- Last dates the incidence of a district was below/above a threshold, filled by CovidDatabaseCreator if missing
+CREATE TABLE IF NOT EXISTS district_threshold_crossings (rs INTEGER, threshold INTEGER,
+    last_below DATE NULL DEFAULT NULL, last_above DATE NULL DEFAULT NULL, PRIMARY KEY(rs, threshold));
+
+-- Records of each district, filled by CovidDatabaseCreator if missing or by --rebuild-facts
+CREATE TABLE IF NOT EXISTS district_facts (rs INTEGER PRIMARY KEY, highest_incidence DECIMAL(7,2),
+    highest_incidence_date DATE, highest_cases INT, highest_cases_date DATE, highest_deaths INT,
+    highest_deaths_date DATE, first_case_date DATE, first_death_date DATE);
+
+-- Ancestors of each county for the aggregation of states and Germany, filled by CovidDatabaseCreator if empty
+CREATE TABLE IF NOT EXISTS county_ancestors (ancestor INTEGER, descendant INTEGER, branch INTEGER,
+    PRIMARY KEY(ancestor, descendant), INDEX(descendant));
+
+-- ETag and Last-Modified of the last response of each data source
+CREATE TABLE IF NOT EXISTS http_resources (url_hash CHAR(40) PRIMARY KEY, url TEXT, etag VARCHAR(255),
+    last_modified VARCHAR(64), updated DATETIME DEFAULT NOW());
+
+-- Length, tail hash and header of sources that are only appended to
+alter table http_resources add length BIGINT, add tail_hash CHAR(40), add header TEXT;
+
+-- Payloads of the data sources that were ingested, the payloads are stored in GENERAL.ARCHIVE_DIR
+CREATE TABLE IF NOT EXISTS source_payloads (id INTEGER PRIMARY KEY AUTO_INCREMENT, url_hash CHAR(40), url TEXT,
+    content_hash CHAR(64), ingested DATETIME DEFAULT NOW(), INDEX(url_hash), INDEX(content_hash));
+
+-- Version of the data of each source, increased by the updaters whenever they got new data
+CREATE TABLE IF NOT EXISTS data_versions (source VARCHAR(32) PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0,
+    updated DATETIME DEFAULT NOW());